@@ -0,0 +1,227 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Iterator, Optional, TextIO, Tuple
+# append the path of the parent directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from core.query_patcher import QueryPatcher
+from core.query_rewriter import QueryRewriter
+from core.schema_catalog import SchemaCatalog
+
+
+# Bulk rewrite of a (large) query log against a rule set
+#   Usage: python -m core.bulk_rewriter queries.jsonl rewritten.jsonl --rule-keys remove_cast_date,remove_cast_text
+#
+#   - the input (CSV with a header, or JSONL) is streamed record by record,
+#   - records are rewritten by a pool of worker processes in bounded batches,
+#   - results are appended to the output JSONL and flushed after every batch,
+#       one line per input record: {"offset", "query", "rewritten_query", "rewriting_path"}
+#       or {"offset", "query", "error"} if the record could not be rewritten,
+#   - --resume continues after the last complete record of an existing output (otherwise the output is overwritten),
+#   - --schema (a DDL file or a SQLite database) makes rules apply only where their constraints hold.
+
+# records handed to the worker pool at once, per worker
+BATCH_SIZE_PER_WORKER = 256
+
+# seconds between two throughput reports
+REPORT_INTERVAL = 10.0
+
+# rules, database and schema catalog of the current (worker) process, set by BulkRewriter.init_worker()
+_worker_rules = []
+_worker_database = 'postgresql'
+_worker_catalog = None
+
+
+class BulkRewriter:
+
+    # Stream (offset, query) records of a CSV/JSONL query log, skipping the first `offset` records
+    #   a record that cannot be read yields a None query (reported as an error record)
+    #
+    @staticmethod
+    def read_queries(input_file: TextIO, input_format: str, column: str='query', offset: int=0) -> Iterator[Tuple[int, Optional[str]]]:
+        if input_format == 'csv':
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            reader = csv.DictReader(input_file)
+            if reader.fieldnames is None:
+                return
+            if column not in reader.fieldnames:
+                raise ValueError(f"Column {column!r} not found in CSV header {reader.fieldnames}")
+            records = (row[column] for row in reader)
+        elif input_format == 'jsonl':
+            records = (BulkRewriter.read_jsonl_query(line, column) for line in input_file if line.strip())
+        else:
+            raise ValueError(f"Unknown input format {input_format!r}, expected 'csv' or 'jsonl'")
+        for index, query in enumerate(records):
+            if index >= offset:
+                yield index, query
+
+    @staticmethod
+    def read_jsonl_query(line: str, field: str) -> Optional[str]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        query = record.get(field) if isinstance(record, dict) else None
+        return query if isinstance(query, str) else None
+
+    # Find the offset to resume from in an existing output file
+    #   a trailing partial line (e.g., from a killed run) is truncated
+    #
+    @staticmethod
+    def resume_offset(output_path: str) -> int:
+        if not os.path.exists(output_path):
+            return 0
+        with open(output_path, 'rb+') as output_file:
+            # scan backwards for the last complete line, without reading the whole file
+            end = output_file.seek(0, os.SEEK_END)
+            tail = b''
+            position = end
+            while position > 0:
+                step = min(65536, position)
+                position -= step
+                output_file.seek(position)
+                tail = output_file.read(step) + tail
+                lines = tail.split(b'\n')
+                # lines[-1] is the partial line after the last newline (b'' if none)
+                if len(lines) >= 3 or (position == 0 and len(lines) >= 2):
+                    break
+            lines = tail.split(b'\n')
+            if len(lines) < 2:
+                # no complete line at all
+                output_file.truncate(0)
+                return 0
+            output_file.truncate(end - len(lines[-1]))
+            return json.loads(lines[-2])['offset'] + 1
+
+    @staticmethod
+    def init_worker(rules: list, database: str, catalog: Optional[SchemaCatalog]=None) -> None:
+        global _worker_rules, _worker_database, _worker_catalog
+        _worker_rules = rules
+        _worker_database = database
+        _worker_catalog = catalog
+
+    # Rewrite one (offset, query) record the same way the server's rewrite command does
+    #
+    @staticmethod
+    def rewrite_record(record: Tuple[int, Optional[str]]) -> dict:
+        offset, query = record
+        if query is None:
+            return {'offset': offset, 'query': None, 'error': 'invalid record'}
+        try:
+            rewritten_query, rewriting_path = QueryRewriter.rewrite(query, _worker_rules, catalog=_worker_catalog)
+            rewritten_query = QueryPatcher.patch_rewriting(rewritten_query, rewriting_path, _worker_database)
+        except Exception as e:
+            return {'offset': offset, 'query': query, 'error': f'{type(e).__name__}: {e}'}
+        return {'offset': offset, 'query': query, 'rewritten_query': rewritten_query, 'rewriting_path': rewriting_path}
+
+    # Rewrite every query of input_path into output_path, returns the run's statistics
+    #
+    @staticmethod
+    def run(input_path: str, output_path: str, rules: list, database: str='postgresql',
+            input_format: Optional[str]=None, column: str='query', offset: int=0, resume: bool=False,
+            workers: int=1, report: Optional[TextIO]=sys.stderr, report_interval: float=REPORT_INTERVAL,
+            catalog: Optional[SchemaCatalog]=None) -> dict:
+        if input_format is None:
+            input_format = 'csv' if input_path.lower().endswith('.csv') else 'jsonl'
+        if resume:
+            offset = max(offset, BulkRewriter.resume_offset(output_path))
+        workers = max(1, workers)
+        batch_size = workers * BATCH_SIZE_PER_WORKER
+
+        stats = {'offset': offset, 'processed': 0, 'rewritten': 0, 'failed': 0, 'seconds': 0.0, 'queries_per_second': 0.0}
+        start = last_report = time.perf_counter()
+
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=BulkRewriter.init_worker, initargs=(rules, database, catalog))
+            rewrite = lambda batch: pool.imap(BulkRewriter.rewrite_record, batch, chunksize=max(1, BATCH_SIZE_PER_WORKER // 8))
+        else:
+            BulkRewriter.init_worker(rules, database, catalog)
+            rewrite = lambda batch: map(BulkRewriter.rewrite_record, batch)
+
+        try:
+            with open(input_path, encoding='utf-8', errors='replace', newline='') as input_file, \
+                 open(output_path, 'a' if resume else 'w', encoding='utf-8') as output_file:
+                records = BulkRewriter.read_queries(input_file, input_format, column, offset)
+                while True:
+                    batch = [record for _, record in zip(range(batch_size), records)]
+                    if not batch:
+                        break
+                    for result in rewrite(batch):
+                        output_file.write(json.dumps(result) + '\n')
+                        stats['processed'] += 1
+                        if 'error' in result:
+                            stats['failed'] += 1
+                        elif result['rewriting_path']:
+                            stats['rewritten'] += 1
+                    output_file.flush()
+                    now = time.perf_counter()
+                    if report is not None and now - last_report >= report_interval:
+                        BulkRewriter.report_progress(report, stats, now - start, batch[-1][0])
+                        last_report = now
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        stats['seconds'] = time.perf_counter() - start
+        stats['queries_per_second'] = stats['processed'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        if report is not None:
+            print(f"done: {stats['processed']} queries from offset {offset} "
+                  f"({stats['rewritten']} rewritten, {stats['failed']} failed) "
+                  f"in {stats['seconds']:.1f}s, {stats['queries_per_second']:.1f} queries/s", file=report)
+        return stats
+
+    @staticmethod
+    def report_progress(report: TextIO, stats: dict, seconds: float, last_offset: int) -> None:
+        print(f"offset {last_offset}: {stats['processed']} queries "
+              f"({stats['rewritten']} rewritten, {stats['failed']} failed), "
+              f"{stats['processed'] / seconds:.1f} queries/s", file=report, flush=True)
+
+    # Load the rule set: built-in rules by key (data/rules.py) and/or an application's enabled rules
+    #
+    @staticmethod
+    def load_rules(rule_keys: Optional[str]=None, appguid: Optional[str]=None) -> list:
+        rules = []
+        if rule_keys:
+            from data.rules import get_rule
+            for key in rule_keys.split(','):
+                rules.append(get_rule(key.strip()))
+        if appguid:
+            from management.data_manager import DataManager
+            from management.rule_manager import RuleManager
+            rules.extend(RuleManager(DataManager(init=False)).fetch_enabled_rules(appguid))
+        return rules
+
+
+def main(argv: Optional[list]=None) -> None:
+    parser = argparse.ArgumentParser(description='Rewrite a (large) query log against a rule set.')
+    parser.add_argument('input', help='query log, CSV with a header or JSONL')
+    parser.add_argument('output', help='output JSONL, one result per input record')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='input format (default: by file extension)')
+    parser.add_argument('--column', default='query', help='CSV column / JSONL field holding the query (default: query)')
+    parser.add_argument('--rule-keys', help='comma-separated keys of built-in rules (data/rules.py)')
+    parser.add_argument('--appguid', help="rewrite with this application's enabled rules in querybooster.db")
+    parser.add_argument('--database', default='postgresql', help='database to patch rewritten queries for (default: postgresql)')
+    parser.add_argument('--schema', help='DDL file (.sql) or SQLite database to check rule constraints against')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: CPU count)')
+    parser.add_argument('--offset', type=int, default=0, help='skip the first OFFSET input records')
+    parser.add_argument('--resume', action='store_true', help='continue after the last record in OUTPUT')
+    parser.add_argument('--report-interval', type=float, default=REPORT_INTERVAL, help='seconds between throughput reports')
+    args = parser.parse_args(argv)
+
+    if not args.rule_keys and not args.appguid:
+        parser.error('one of --rule-keys or --appguid is required')
+    rules = BulkRewriter.load_rules(args.rule_keys, args.appguid)
+    catalog = SchemaCatalog.load(args.schema) if args.schema else None
+    BulkRewriter.run(args.input, args.output, rules, database=args.database,
+                     input_format=args.format, column=args.column, offset=args.offset, resume=args.resume,
+                     workers=args.workers, report_interval=args.report_interval, catalog=catalog)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Tuple
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+
+# Leveled JSON logging of the server
+#   Usage: QUERYBOOSTER_LOG_LEVEL=DEBUG python wsgi.py
+#
+#   Each record is one JSON line {"timestamp", "level", "logger", "message", <extra fields>...},
+#     where the extra fields are the `extra` of the logging call, e.g.,
+#       logger.info('rewrite', extra={'appguid': appguid, 'guid': guid})
+#   Request threads only enqueue their records: formatting (including the Lazy values, e.g., pretty-printed SQL)
+#     and writing happen in a background listener thread.
+#   The module loggers of the package (logging.getLogger(__name__) in core/ and management/) write through
+#     the server's logger (see setup_logging()).
+
+LOG_LEVEL = os.environ.get('QUERYBOOSTER_LOG_LEVEL', 'INFO').upper()
+
+# attributes of every LogRecord, the others are the extra fields of a record
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+# the listener of the configured loggers by name (see setup_logging())
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+# packages whose module loggers write through the server's logger
+MODULE_LOGGERS = ('core', 'management')
+
+
+# A value computed only when a record is formatted, e.g., Lazy(QueryRewriter.beautify, sql)
+#
+class Lazy:
+
+    def __init__(self, func, *args) -> None:
+        self.func = func
+        self.args = args
+
+    def __str__(self) -> str:
+        return str(self.func(*self.args))
+
+
+# Format a record as one JSON line with its extra fields
+#
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# Enqueue records as they are, leaving their formatting to the listener thread
+#   Note: the stock QueueHandler.prepare() formats the record in the logging thread (to make it picklable),
+#         which is not needed for an in-process queue
+#
+class AsyncQueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# Configure (once) a logger writing JSON lines to stream (stdout by default) through a queue, returns the logger
+#   name:    its children (e.g., querybooster.server) share the configuration,
+#   level:   the level name, QUERYBOOSTER_LOG_LEVEL (INFO by default) if not given,
+#   modules: names of other loggers (and so their children) writing through it, e.g., MODULE_LOGGERS
+#
+def setup_logging(name: str = 'querybooster', level: Optional[str] = None, stream=None,
+                  modules: Tuple[str, ...] = ()) -> logging.Logger:
+    logger = logging.getLogger(name)
+    with _listeners_lock:
+        if name in _listeners:
+            return logger
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, handler, respect_handler_level=False)
+        listener.start()
+        atexit.register(listener.stop)
+        queue_handler = AsyncQueueHandler(log_queue)
+        for configured in [logger] + [logging.getLogger(module) for module in modules]:
+            configured.addHandler(queue_handler)
+            configured.setLevel(level or LOG_LEVEL)
+            configured.propagate = False
+        _listeners[name] = listener
+    return logger
+
+
+# Wait until the queued records of a logger configured by setup_logging() are written, and restart its listener
+#
+def flush_logging(name: str = 'querybooster') -> None:
+    with _listeners_lock:
+        listener = _listeners.get(name)
+        if listener is not None:
+            listener.stop()
+            listener.start()
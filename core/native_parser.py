@@ -0,0 +1,704 @@
+import re
+
+# Native tokenizer + recursive-descent parser for the SQL subset QueryParser
+# supports. It produces exactly the dict mo_sql_parsing.parse() would return,
+# so QueryParser's dict -> node conversion (and all of its quirks) is shared by
+# both backends. Anything outside the subset raises NativeParseError and
+# QueryParser falls back to mo_sql_parsing for that query.
+
+class NativeParseError(Exception):
+    pass
+
+
+# Single-word reserved keywords of mo_sql_parsing (keywords.RESERVED);
+#   they can never be a bare column, table or implicit alias
+RESERVED = frozenset([
+    'AND', 'AS', 'ASC', 'BEGIN', 'BETWEEN', 'BY', 'CASE', 'COLLATE', 'CONSTRAINT',
+    'CREATE', 'CROSS', 'DESC', 'DISTINCT', 'EXCEPT', 'ELSE', 'END', 'FALSE', 'FETCH',
+    'FOREIGN', 'FOR', 'FROM', 'FULL', 'GROUP', 'HAVING', 'INTO', 'INNER', 'INTERSECT',
+    'IN', 'IS', 'JOIN', 'LATERAL', 'LEFT', 'LIKE', 'LIMIT', 'MINUS', 'NATURAL',
+    'NOCASE', 'NOT', 'NULL', 'OFFSET', 'ON', 'OR', 'ORDER', 'OUTER', 'OVER',
+    'PARTITION', 'PIVOT', 'QUALIFY', 'REFERENCES', 'RIGHT', 'RLIKE', 'SELECT', 'SET',
+    'STRAIGHT_JOIN', 'TABLESAMPLE', 'THEN', 'TRUE', 'UNION', 'UNIQUE', 'UNNEST',
+    'UNPIVOT', 'USING', 'WHEN', 'WHERE', 'WINDOW', 'WITH', 'WITHIN',
+])
+
+# Reserved words mo_sql_parsing still accepts as function names
+RESERVED_FUNCTIONS = frozenset(['LEFT', 'RIGHT'])
+
+# Identifiers that start a special (non-call) form in mo_sql_parsing
+SPECIAL_IDENTIFIERS = frozenset(['INTERVAL', 'NOCASE'])
+
+# Function names with a dedicated mo_sql_parsing grammar (or a collision with an
+#   associative operator key) that this parser leaves to mo_sql_parsing
+SPECIAL_FUNCTIONS = frozenset([
+    'safe_cast', 'try_cast', 'validate_conversion', 'convert',
+    'to_date', 'to_number', 'to_timestamp', 'to_timestamp_tz', 'to_yminterval', 'to_dsinterval',
+    'substring', 'trim', 'extract', 'stack', 'array', 'map', 'struct', 'interval', 'unnest',
+    'add', 'mul', 'and', 'or', 'concat', 'binary_and', 'binary_or',
+])
+
+# DATE 'x', TIMESTAMP now, ... are typed literals in mo_sql_parsing
+TIME_FUNCTIONS = frozenset(['DATE', 'DATETIME', 'TIME', 'TIMESTAMP', 'TIMESTAMPTZ', 'TIMETZ'])
+TIME_KEYWORDS = frozenset(['NOW', 'TODAY', 'TOMORROW', 'EOD'])
+
+# Column types accepted by CAST / ::, and those taking a size list
+CAST_TYPES = frozenset([
+    'int', 'integer', 'bigint', 'smallint', 'float', 'real', 'decimal', 'numeric',
+    'boolean', 'bool', 'char', 'varchar', 'text', 'date', 'time', 'timestamp',
+])
+SIZED_CAST_TYPES = frozenset(['char', 'varchar', 'decimal', 'numeric'])
+
+COMPARISON_OPERATORS = {'<': 'lt', '<=': 'lte', '>': 'gt', '>=': 'gte'}
+EQUALITY_OPERATORS = {'=': 'eq', '<>': 'neq', '!=': 'neq'}
+PATTERN_OPERATORS = {'LIKE': 'like', 'ILIKE': 'ilike'}
+JOIN_PREFIXES = frozenset(['CROSS', 'OUTER', 'INNER', 'NATURAL', 'FULL', 'LEFT', 'RIGHT'])
+
+# Token kinds
+NUM, STR, IDENT, STAR_IDENT, OP, EOF = range(6)
+
+_IDENT_PART = r'(?:[A-Za-z_][A-Za-z0-9_]*|"(?:[^"]|"")*"|`(?:[^`]|``)*`)'
+_TOKEN_RE = re.compile(
+    r'(?P<ws>[ \t\n]+)'
+    r'|(?P<num>(?:\d+\.\d*|\.\d+|\d+))'
+    r"|(?P<str>'(?:[^']|'')*')"
+    r'|(?P<ident>' + _IDENT_PART + r'(?:\.' + _IDENT_PART + r')*(?P<star>\.\*)?)'
+    r'|(?P<op><>|<=|>=|!=|\|\||::|[=<>+\-*/%(),;])'
+)
+_IDENT_PART_RE = re.compile(_IDENT_PART)
+# Characters that would extend an operator into one this parser does not know
+#   (<=>, =>, ->, ||| ...), or start a comment
+_OPERATOR_CONTINUATION = frozenset('=<>!|&~^#@:?[]{}')
+_WORD_KINDS = (NUM, STR, IDENT, STAR_IDENT)
+
+
+class NativeParser:
+
+    @staticmethod
+    def tokenize(sql: str) -> list:
+        """Split sql into (kind, value, keyword, parts) tuples, ending with an EOF token.
+
+        keyword is the upper-cased text of a plain (unquoted, undotted) identifier
+        and None otherwise; parts is the number of dotted identifier parts.
+        """
+        tokens = []
+        pos, end = 0, len(sql)
+        match = _TOKEN_RE.match
+        previous_word_end = -1
+        while pos < end:
+            m = match(sql, pos)
+            if m is None:
+                raise NativeParseError(f'unsupported character {sql[pos]!r} at {pos}')
+            kind = m.lastgroup
+            text = m.group()
+            start, pos = pos, m.end()
+            if kind == 'ws':
+                continue
+            if kind == 'op':
+                following = sql[pos:pos + 1]
+                if (text not in '(),' and following in _OPERATOR_CONTINUATION) \
+                        or (text == '-' and following == '-') or (text == '/' and following == '*'):
+                    raise NativeParseError(f'unsupported operator at {start}')
+                if text == ';':
+                    if sql[pos:].strip(' \t\n'):
+                        raise NativeParseError('multiple statements are not supported')
+                    break
+                tokens.append((OP, text, None, 0))
+                continue
+            # Words glued together (N'x', 1a, a"b") have dialect-specific meanings
+            if start == previous_word_end:
+                raise NativeParseError(f'unsupported token at {start}')
+            previous_word_end = pos
+            if kind == 'num':
+                if sql[pos:pos + 1] in ('e', 'E', '.'):
+                    raise NativeParseError(f'unsupported number at {start}')
+                tokens.append((NUM, float(text) if '.' in text else int(text), None, 0))
+            elif kind == 'str':
+                if '\\' in text or '\r' in text:
+                    raise NativeParseError(f'unsupported string escape at {start}')
+                tokens.append((STR, text[1:-1].replace("''", "'"), None, 0))
+            else:
+                tokens.append(NativeParser.identifier_token(text, m.group('star') is not None))
+        # Padding so lookahead never runs past the end
+        tokens.extend([(EOF, None, None, 0)] * 3)
+        return tokens
+
+    @staticmethod
+    def identifier_token(text: str, star: bool) -> tuple:
+        if star:
+            text = text[:-2]
+        parts = _IDENT_PART_RE.findall(text)
+        names = []
+        for part in parts:
+            if part[0] == '"' or part[0] == '`':
+                quote = part[0]
+                name = part[1:-1].replace(quote + quote, quote)
+                if '\\' in name or '\n' in name:
+                    raise NativeParseError(f'unsupported quoted identifier {part}')
+                # mo_sql_parsing escapes dots inside quoted names
+                names.append(name.replace('.', '..'))
+            else:
+                names.append(part)
+        keyword = None
+        if len(parts) == 1 and parts[0][0] != '"' and parts[0][0] != '`':
+            keyword = parts[0].upper()
+        return (STAR_IDENT if star else IDENT, '.'.join(names), keyword, len(parts))
+
+    def __init__(self, sql: str):
+        self.tokens = self.tokenize(sql)
+        self.pos = 0
+
+    @staticmethod
+    def parse(sql: str) -> dict:
+        """Parse sql into the dict mo_sql_parsing.parse(sql) returns."""
+        parser = NativeParser(sql)
+        if parser.peek_keyword() != 'SELECT':
+            raise NativeParseError('statement must start with SELECT')
+        query = parser.parse_query()
+        parser.expect_kind(EOF)
+        return query
+
+    # ------------------------------------------------------------------
+    # Token helpers
+    # ------------------------------------------------------------------
+
+    def peek_keyword(self, offset: int = 0):
+        return self.tokens[self.pos + offset][2]
+
+    def peek_op(self, offset: int = 0):
+        token = self.tokens[self.pos + offset]
+        return token[1] if token[0] == OP else None
+
+    def accept_keyword(self, keyword: str) -> bool:
+        if self.tokens[self.pos][2] == keyword:
+            self.pos += 1
+            return True
+        return False
+
+    def accept_op(self, op: str) -> bool:
+        token = self.tokens[self.pos]
+        if token[0] == OP and token[1] == op:
+            self.pos += 1
+            return True
+        return False
+
+    def expect_keyword(self, keyword: str):
+        if not self.accept_keyword(keyword):
+            self.error(f'expected {keyword}')
+
+    def expect_op(self, op: str):
+        if not self.accept_op(op):
+            self.error(f'expected {op!r}')
+
+    def expect_kind(self, kind: int):
+        if self.tokens[self.pos][0] != kind:
+            self.error('unexpected token')
+
+    def error(self, message: str):
+        raise NativeParseError(f'{message} at token {self.pos}: {self.tokens[self.pos][1]!r}')
+
+    def is_bare(self, start: int, kind: int, keywords=None) -> bool:
+        """True if exactly one token of the given kind (and keyword) was consumed since start."""
+        if self.pos != start + 1:
+            return False
+        token = self.tokens[start]
+        return token[0] == kind and (keywords is None or token[2] in keywords)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def parse_query(self):
+        query = self.parse_select_core()
+        if self.peek_keyword() != 'UNION':
+            self.parse_ordering(query)
+            return query
+
+        # Same-operator chains are flattened, a change of operator nests
+        #   the accumulated chain (mo_sql_parsing.utils.to_union_call)
+        last_op = None
+        while self.accept_keyword('UNION'):
+            op = 'union_all' if self.accept_keyword('ALL') else 'union'
+            if self.peek_keyword() != 'SELECT':
+                self.error('expected SELECT after UNION')
+            branch = self.parse_select_core()
+            if op == last_op:
+                query[op].append(branch)
+            else:
+                query = {op: [query, branch]}
+            last_op = op
+        if self.peek_keyword() in ('ORDER', 'LIMIT', 'OFFSET'):
+            self.error('ORDER BY / LIMIT / OFFSET on a UNION is not supported')
+        return query
+
+    def parse_select_core(self) -> dict:
+        self.expect_keyword('SELECT')
+        key = 'select'
+        if self.accept_keyword('DISTINCT'):
+            if self.peek_keyword() == 'ON':
+                self.error('DISTINCT ON is not supported')
+            key = 'select_distinct'
+        if key == 'select':
+            items = self.parse_list(self.parse_select_item)
+        else:
+            items = self.parse_list(self.parse_distinct_item)
+        query = {key: self.unwrap(items)}
+        if self.accept_keyword('FROM'):
+            query['from'] = self.parse_from()
+        if self.accept_keyword('WHERE'):
+            query['where'] = self.parse_expression()
+        if self.peek_keyword() == 'GROUP' and self.peek_keyword(1) == 'BY':
+            self.pos += 2
+            query['groupby'] = self.unwrap(self.parse_list(self.parse_group_by_item))
+        if self.accept_keyword('HAVING'):
+            query['having'] = self.parse_expression()
+        return query
+
+    def parse_ordering(self, query: dict):
+        if self.peek_keyword() == 'ORDER' and self.peek_keyword(1) == 'BY':
+            self.pos += 2
+            query['orderby'] = self.unwrap(self.parse_list(self.parse_order_by_item))
+        # LIMIT and OFFSET may come in either order; the dict always lists limit first
+        limit = offset = None
+        while True:
+            if limit is None and self.accept_keyword('LIMIT'):
+                limit = self.parse_expression()
+            elif offset is None and self.accept_keyword('OFFSET'):
+                offset = self.parse_expression()
+            else:
+                break
+        if limit is not None:
+            query['limit'] = limit
+        if offset is not None:
+            query['offset'] = offset
+
+    def parse_list(self, parse_item) -> list:
+        items = [parse_item()]
+        while self.accept_op(','):
+            items.append(parse_item())
+        return items
+
+    @staticmethod
+    def unwrap(items: list):
+        return items[0] if len(items) == 1 else items
+
+    def parse_select_item(self) -> dict:
+        token = self.tokens[self.pos]
+        if token[0] == OP and token[1] == '*':
+            self.pos += 1
+            return {'all_columns': {}}
+        if token[0] == STAR_IDENT:
+            self.pos += 1
+            return {'all_columns': token[1]}
+        if token[2] == 'TOP':
+            self.error('TOP is not supported')
+        value = self.parse_expression()
+        name = self.parse_alias()
+        if name is None:
+            return {'value': value}
+        return {'name': name, 'value': value}
+
+    def parse_distinct_item(self):
+        # SELECT DISTINCT parses its items as plain expressions
+        token = self.tokens[self.pos]
+        if token[0] == OP and token[1] == '*':
+            self.pos += 1
+            return '*'
+        if token[0] == STAR_IDENT:
+            self.pos += 1
+            return {'value': token[1] + '.*'}
+        return self.parse_select_item()
+
+    def parse_alias(self):
+        token = self.tokens[self.pos]
+        if token[2] == 'AS':
+            self.pos += 1
+            token = self.tokens[self.pos]
+            if token[0] != IDENT or token[2] in RESERVED:
+                self.error('unsupported alias')
+        elif token[0] != IDENT or token[2] in RESERVED:
+            if token[0] == STR:
+                self.error('string aliases are not supported')
+            return None
+        if token[3] > 1:
+            self.error('dotted aliases are not supported')
+        self.pos += 1
+        if self.peek_op() == '(':
+            self.error('alias column lists are not supported')
+        return token[1]
+
+    def parse_group_by_item(self) -> dict:
+        value = self.parse_expression()
+        if self.parse_alias() is not None:
+            self.error('GROUP BY aliases are not supported')
+        return {'value': value}
+
+    def parse_order_by_item(self) -> dict:
+        item = {'value': self.parse_expression()}
+        keyword = self.peek_keyword()
+        if keyword == 'ASC' or keyword == 'DESC':
+            self.pos += 1
+            item['sort'] = keyword.lower()
+        return item
+
+    def parse_from(self):
+        sources = self.parse_list(self.parse_table_source)
+        joined = False
+        while True:
+            op = self.parse_join_keyword(joined)
+            if op is None:
+                break
+            joined = True
+            source = self.parse_table_source()
+            if isinstance(source, dict) and 'name' in source:
+                join = {op: {'name': source['name'], 'value': source['value']}}
+            else:
+                join = {op: source}
+            if self.accept_keyword('ON'):
+                join['on'] = self.parse_expression()
+            elif self.peek_keyword() == 'USING':
+                self.error('JOIN ... USING is not supported')
+            sources.append(join)
+        return self.unwrap(sources)
+
+    def parse_join_keyword(self, joined: bool):
+        # After the first JOIN a comma is a cross join (mo_sql_parsing.keywords.joins)
+        if joined and self.accept_op(','):
+            return 'cross join'
+        words = []
+        keyword = self.peek_keyword()
+        if keyword in JOIN_PREFIXES:
+            words.append(keyword)
+            self.pos += 1
+            if keyword in ('FULL', 'LEFT', 'RIGHT') and self.peek_keyword() in ('INNER', 'OUTER'):
+                words.append(self.peek_keyword())
+                self.pos += 1
+            keyword = self.peek_keyword()
+        if keyword != 'JOIN':
+            if words:
+                self.error('expected JOIN')
+            return None
+        self.pos += 1
+        words.append('JOIN')
+        return ' '.join(words).lower()
+
+    def parse_table_source(self):
+        token = self.tokens[self.pos]
+        if token[0] == OP and token[1] == '(':
+            if self.peek_keyword(1) != 'SELECT':
+                self.error('only subqueries may be parenthesized in FROM')
+            self.pos += 1
+            value = self.parse_query()
+            self.expect_op(')')
+        elif token[0] == IDENT and token[2] not in RESERVED:
+            self.pos += 1
+            value = token[1]
+        else:
+            self.error('expected a table')
+        name = self.parse_alias()
+        if name is None:
+            return value
+        return {'value': value, 'name': name}
+
+    # ------------------------------------------------------------------
+    # Expressions (loosest to tightest binding, as in
+    #   mo_sql_parsing.keywords.KNOWN_OPS)
+    # ------------------------------------------------------------------
+
+    def parse_expression(self):
+        return self.parse_or()
+
+    @staticmethod
+    def associative(op: str, left, right) -> dict:
+        # and/or/add/mul/concat absorb operands of the same operator
+        operands = []
+        for operand in (left, right):
+            if isinstance(operand, dict) and operand.get(op):
+                nested = operand[op]
+                if isinstance(nested, list):
+                    operands.extend(nested)
+                else:
+                    operands.append(nested)
+            else:
+                operands.append(operand)
+        return {op: operands}
+
+    def parse_or(self):
+        left = self.parse_and()
+        while self.accept_keyword('OR'):
+            left = self.associative('or', left, self.parse_and())
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while self.accept_keyword('AND'):
+            left = self.associative('and', left, self.parse_not())
+        return left
+
+    def parse_not(self):
+        if self.accept_keyword('NOT'):
+            return {'not': self.parse_not()}
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        left = self.parse_equality()
+        keyword = self.peek_keyword()
+        negated = False
+        if keyword == 'NOT' and self.peek_keyword(1) in ('IN', 'LIKE', 'ILIKE', 'BETWEEN'):
+            negated = True
+            self.pos += 1
+            keyword = self.peek_keyword()
+
+        if keyword == 'IS':
+            self.pos += 1
+            is_not = self.accept_keyword('NOT')
+            if not self.accept_keyword('NULL'):
+                self.error('only IS [NOT] NULL is supported')
+            result = {'exists' if is_not else 'missing': left}
+        elif keyword == 'IN':
+            self.pos += 1
+            result = {'nin' if negated else 'in': [left, self.parse_equality()]}
+        elif keyword in PATTERN_OPERATORS:
+            self.pos += 1
+            op = PATTERN_OPERATORS[keyword]
+            result = {'not_' + op if negated else op: [left, self.parse_equality()]}
+        elif keyword == 'BETWEEN':
+            self.pos += 1
+            low = self.parse_equality()
+            self.expect_keyword('AND')
+            high = self.parse_equality()
+            result = {'not_between' if negated else 'between': [left, low, high]}
+        else:
+            return left
+
+        # Chained predicates bind by per-operator precedence levels; leave them to mo_sql_parsing
+        keyword = self.peek_keyword()
+        if keyword in ('IS', 'IN', 'LIKE', 'ILIKE', 'BETWEEN') or \
+                (keyword == 'NOT' and self.peek_keyword(1) in ('IN', 'LIKE', 'ILIKE', 'BETWEEN')):
+            self.error('chained predicates are not supported')
+        return result
+
+    def parse_equality(self):
+        start = self.pos
+        left = self.parse_comparison()
+        left_is_null = self.is_bare(start, IDENT, ('NULL',))
+        while True:
+            op = EQUALITY_OPERATORS.get(self.peek_op())
+            if op is None:
+                return left
+            self.pos += 1
+            start = self.pos
+            right = self.parse_comparison()
+            # x = NULL -> missing, x <> NULL -> exists (mo_sql_parsing.utils.to_json_operator)
+            if self.is_bare(start, IDENT, ('NULL',)):
+                left = {'missing' if op == 'eq' else 'exists': left}
+            elif left_is_null:
+                left = {'missing' if op == 'eq' else 'exists': right}
+            else:
+                left = {op: [left, right]}
+            left_is_null = False
+
+    def parse_comparison(self):
+        left = self.parse_additive()
+        while True:
+            op = COMPARISON_OPERATORS.get(self.peek_op())
+            if op is None:
+                return left
+            self.pos += 1
+            left = {op: [left, self.parse_additive()]}
+
+    def parse_additive(self):
+        left = self.parse_multiplicative()
+        while True:
+            op = self.peek_op()
+            if op == '+':
+                self.pos += 1
+                left = self.associative('add', left, self.parse_multiplicative())
+            elif op == '-':
+                self.pos += 1
+                left = {'sub': [left, self.parse_multiplicative()]}
+            else:
+                return left
+
+    def parse_multiplicative(self):
+        left = self.parse_unary()
+        while True:
+            op = self.peek_op()
+            if op == '*':
+                self.pos += 1
+                left = self.associative('mul', left, self.parse_unary())
+            elif op == '/':
+                self.pos += 1
+                left = {'div': [left, self.parse_unary()]}
+            elif op == '%':
+                self.pos += 1
+                left = {'mod': [left, self.parse_unary()]}
+            else:
+                return left
+
+    def parse_unary(self):
+        op = self.peek_op()
+        if op == '+' or (op == '-' and self.peek_op(1) in ('-', '+')):
+            self.error('unsupported unary operator')
+        if op != '-':
+            return self.parse_concat()
+        self.pos += 1
+        start = self.pos
+        operand = self.parse_unary()
+        # A bare numeric literal is negated in place: -1 -> -1, -(1) -> {'neg': 1}
+        if self.is_bare(start, NUM):
+            return -operand
+        return {'neg': operand}
+
+    def parse_concat(self):
+        left = self.parse_cast()
+        while self.accept_op('||'):
+            left = self.associative('concat', left, self.parse_cast())
+        return left
+
+    def parse_cast(self):
+        value = self.parse_primary()
+        while self.accept_op('::'):
+            value = {'cast': [value, self.parse_type()]}
+            # Multi-word types (double precision, timestamp without time zone, ...)
+            token = self.tokens[self.pos]
+            if token[0] in _WORD_KINDS and token[2] not in RESERVED:
+                self.error('unsupported cast type')
+        return value
+
+    def parse_type(self) -> dict:
+        token = self.tokens[self.pos]
+        name = token[2].lower() if token[0] == IDENT and token[2] is not None else None
+        if name not in CAST_TYPES:
+            self.error('unsupported cast type')
+        self.pos += 1
+        if not self.accept_op('('):
+            return {name: {}}
+        if name not in SIZED_CAST_TYPES:
+            self.error('unsupported type size')
+        sizes = self.parse_list(self.parse_type_size)
+        self.expect_op(')')
+        return {name: self.unwrap(sizes)}
+
+    def parse_type_size(self) -> int:
+        token = self.tokens[self.pos]
+        if token[0] != NUM or not isinstance(token[1], int):
+            self.error('expected an integer type size')
+        self.pos += 1
+        return token[1]
+
+    def parse_primary(self):
+        token = self.tokens[self.pos]
+        kind = token[0]
+        if kind == NUM:
+            self.pos += 1
+            return token[1]
+        if kind == STR:
+            self.pos += 1
+            return {'literal': token[1]}
+        if kind == OP:
+            if token[1] == '(':
+                return self.parse_parenthesized()
+            self.error('unexpected operator')
+        if kind != IDENT:
+            self.error('unexpected token')
+
+        keyword = token[2]
+        if keyword == 'NULL':
+            self.pos += 1
+            return {'null': {}}
+        if keyword == 'TRUE' or keyword == 'FALSE':
+            self.pos += 1
+            return keyword == 'TRUE'
+        if keyword == 'CASE':
+            return self.parse_case()
+        if self.peek_op(1) == '(':
+            return self.parse_call()
+        if keyword in RESERVED or keyword in SPECIAL_IDENTIFIERS:
+            self.error('unexpected keyword')
+        if keyword in TIME_FUNCTIONS:
+            following = self.tokens[self.pos + 1]
+            if following[0] == STR:
+                self.pos += 2
+                return {keyword.lower(): {'literal': following[1]}}
+            if following[2] in TIME_KEYWORDS:
+                self.error('relative time literals are not supported')
+        self.pos += 1
+        return token[1]
+
+    def parse_parenthesized(self):
+        self.pos += 1
+        if self.peek_keyword() == 'SELECT':
+            query = self.parse_query()
+            self.expect_op(')')
+            return query
+        values, bare = [], []
+        while True:
+            start = self.pos
+            values.append(self.parse_expression())
+            bare.append(self.is_bare(start, NUM) or self.is_bare(start, IDENT, ('TRUE', 'FALSE')))
+            if not self.accept_op(','):
+                break
+        self.expect_op(')')
+        if len(values) == 1:
+            return values[0]
+        # Tuples follow mo_sql_parsing.utils.to_tuple_call
+        if all(bare):
+            return values
+        literals = [self.as_literal(value) for value in values]
+        if all(literals):
+            return {'literal': literals}
+        return values
+
+    @staticmethod
+    def as_literal(value):
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, dict) and 'literal' in value:
+            return value['literal']
+        return None
+
+    def parse_case(self) -> dict:
+        self.pos += 1
+        if self.peek_keyword() != 'WHEN':
+            self.error('only searched CASE is supported')
+        cases = []
+        while self.accept_keyword('WHEN'):
+            when = self.parse_expression()
+            self.expect_keyword('THEN')
+            cases.append({'then': self.parse_expression(), 'when': when})
+        if self.accept_keyword('ELSE'):
+            cases.append(self.parse_expression())
+        self.expect_keyword('END')
+        return {'case': self.unwrap(cases)}
+
+    def parse_call(self) -> dict:
+        token = self.tokens[self.pos]
+        keyword = token[2]
+        if keyword is None or (keyword in RESERVED and keyword not in RESERVED_FUNCTIONS):
+            self.error('unsupported function name')
+        name = keyword.lower()
+        if name in SPECIAL_FUNCTIONS:
+            self.error(f'{name}() is not supported')
+        self.pos += 2
+        if name == 'cast':
+            value = self.parse_expression()
+            self.expect_keyword('AS')
+            cast = {'cast': [value, self.parse_type()]}
+            self.expect_op(')')
+            return cast
+
+        if self.accept_op(')'):
+            return {name: {}}
+        distinct = self.accept_keyword('DISTINCT')
+        if self.peek_op() == '*' and self.peek_op(1) == ')':
+            self.pos += 1
+            args = '*'
+        elif self.peek_keyword() == 'SELECT':
+            args = self.parse_query()
+        else:
+            args = self.unwrap(self.parse_list(self.parse_expression))
+        self.expect_op(')')
+        if distinct:
+            return {'distinct': True, name: args}
+        return {name: args}
@@ -1,28 +1,174 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Optional
+import threading
 import time
+import weakref
 
 profiles = {}
+profilesLock = threading.Lock()
+
+# start times of the functions currently timed by onFunctionStart() in this thread,
+#   a stack per function so that re-entrant calls do not overwrite each other's timer
+_timers = threading.local()
+
+# Rewrite pipeline metrics (see Profiler.observe() and Profiler.count())
+#   each thread records into its own counters and histograms, merged only by Profiler.metrics();
+#   when a thread exits, its metrics are folded into _retiredMetrics, so that _threadMetrics only holds live threads
+#
+# upper bounds (ms) of the latency histogram buckets, the last bucket is +Inf
+HISTOGRAM_BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+_local = threading.local()
+_threadMetrics = []
+_threadMetricsLock = threading.Lock()
+
+
+class _ThreadMetrics:
+
+    def __init__(self) -> None:
+        # only contended while Profiler.metrics() merges this thread's data
+        self.lock = threading.Lock()
+        # (name, rule) -> [count, total_ms, bucket counts...]
+        self.histograms = {}
+        # (name, rule) -> count
+        self.counters = {}
+
+
+# Held only by a thread's _local, so that it is finalized (see Profiler._retire()) when the thread exits
+class _ThreadToken:
+    pass
+
+
+_retiredMetrics = _ThreadMetrics()
+
 
 class Profiler:
 
     @staticmethod
     def onFunctionStart(function: str) -> None:
-        if function not in profiles.keys():
-            profiles[function] = {'calls': 0, 'total_time': 0}
-        profiles[function]['calls'] += 1
-        profiles[function]['timer'] = {'start': time.time()}
+        with profilesLock:
+            if function not in profiles.keys():
+                profiles[function] = {'calls': 0, 'total_time': 0}
+            profiles[function]['calls'] += 1
+        stacks = _timers.__dict__.setdefault('stacks', {})
+        stacks.setdefault(function, []).append(time.time())
         return
-    
+
     @staticmethod
     def onFunctionEnd(function: str) -> None:
-        if function not in profiles.keys():
+        stack = _timers.__dict__.get('stacks', {}).get(function)
+        if not stack:
             return
-        start_time = profiles[function]['timer']['start']
-        del profiles[function]['timer']
+        start_time = stack.pop()
         end_time = time.time()
         timing = end_time - start_time
-        profiles[function]['total_time'] += timing
+        with profilesLock:
+            profiles[function]['total_time'] += timing
         return
 
     @staticmethod
     def show() -> dict:
-        return profiles
+        with profilesLock:
+            return {function: dict(profile) for function, profile in profiles.items()}
+
+    @staticmethod
+    def _thread_metrics() -> _ThreadMetrics:
+        metrics = getattr(_local, 'metrics', None)
+        if metrics is None:
+            metrics = _local.metrics = _ThreadMetrics()
+            _local.token = _ThreadToken()
+            weakref.finalize(_local.token, Profiler._retire, metrics)
+            with _threadMetricsLock:
+                _threadMetrics.append(metrics)
+        return metrics
+
+    # Fold the metrics of an exited thread into _retiredMetrics
+    #
+    @staticmethod
+    def _retire(metrics: _ThreadMetrics) -> None:
+        with _threadMetricsLock:
+            _threadMetrics.remove(metrics)
+            with metrics.lock, _retiredMetrics.lock:
+                Profiler._merge(_retiredMetrics.histograms, _retiredMetrics.counters, metrics)
+
+    @staticmethod
+    def _merge(histograms: dict, counters: dict, metrics: _ThreadMetrics) -> None:
+        for key, histogram in metrics.histograms.items():
+            merged = histograms.setdefault(key, [0] * len(histogram))
+            for i, value in enumerate(histogram):
+                merged[i] += value
+        for key, count in metrics.counters.items():
+            counters[key] = counters.get(key, 0) + count
+
+    # Record one observation (in seconds) of a phase (e.g., 'parse', 'format'),
+    #   or of a rule's phase (e.g., 'match' of rule 'remove_cast_date')
+    #
+    @staticmethod
+    def observe(name: str, seconds: float, rule: Optional[Any]=None) -> None:
+        metrics = Profiler._thread_metrics()
+        ms = seconds * 1000.0
+        with metrics.lock:
+            histogram = metrics.histograms.get((name, rule))
+            if histogram is None:
+                histogram = metrics.histograms[(name, rule)] = [0, 0.0] + [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+            histogram[0] += 1
+            histogram[1] += ms
+            histogram[2 + bisect_left(HISTOGRAM_BUCKETS_MS, ms)] += 1
+
+    # Count an event (e.g., 'hits' of a rule)
+    #
+    @staticmethod
+    def count(name: str, rule: Optional[Any]=None, n: int=1) -> None:
+        metrics = Profiler._thread_metrics()
+        with metrics.lock:
+            metrics.counters[(name, rule)] = metrics.counters.get((name, rule), 0) + n
+
+    # Time the body of a with-statement as one observation of a phase
+    #
+    @staticmethod
+    @contextmanager
+    def phase(name: str, rule: Optional[Any]=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            Profiler.observe(name, time.perf_counter() - start, rule)
+
+    # Merge all threads' metrics, e.g.,
+    #   {
+    #     'phases': {'parse': {'count': 2, 'total_ms': 1.3, 'buckets': {'0.05': 0, ..., '+Inf': 0}}, ...},
+    #     'rules': {'remove_cast_date': {'match': {...histogram...}, 'hits': 1}, ...}
+    #   }
+    #   where a bucket counts the observations greater than the previous bound, up to its own
+    #
+    @staticmethod
+    def metrics() -> dict:
+        histograms = {}
+        counters = {}
+        # holding _threadMetricsLock, so that a thread retiring meanwhile is counted once
+        with _threadMetricsLock:
+            for metrics in _threadMetrics + [_retiredMetrics]:
+                with metrics.lock:
+                    Profiler._merge(histograms, counters, metrics)
+
+        bounds = [str(bound) for bound in HISTOGRAM_BUCKETS_MS] + ['+Inf']
+        result = {'phases': {}, 'rules': {}}
+        for (name, rule), histogram in sorted(histograms.items(), key=lambda item: (str(item[0][1]), item[0][0])):
+            target = result['phases'] if rule is None else result['rules'].setdefault(str(rule), {})
+            target[name] = {
+                'count': histogram[0],
+                'total_ms': round(histogram[1], 3),
+                'buckets': dict(zip(bounds, histogram[2:]))
+            }
+        for (name, rule), count in counters.items():
+            target = result['phases'] if rule is None else result['rules'].setdefault(str(rule), {})
+            target[name] = count
+        return result
+
+    @staticmethod
+    def reset() -> None:
+        with _threadMetricsLock:
+            for metrics in _threadMetrics + [_retiredMetrics]:
+                with metrics.lock:
+                    metrics.histograms.clear()
+                    metrics.counters.clear()
@@ -1,5 +1,8 @@
 import re
 import mo_sql_parsing as mosql
+from mo_sql_parsing.formatting import Formatter, escape, _should_quote, ordered_query_kwargs, unordered_clauses
+from mo_sql_parsing.keywords import precedence
+from mo_sql_parsing.utils import binary_ops
 from core.ast.node import (
     QueryNode,
     CompoundQueryNode,
@@ -17,16 +20,49 @@ from core.ast.enums import NodeType, JoinType
 from core.ast.node import Node
 from core.ast.utils import flatten_logical_operands
 
+# operator names in the AST -> mo_sql_parsing operator keys
+OPERATOR_KEYS = {
+    '>': 'gt',
+    '<': 'lt',
+    '>=': 'gte',
+    '<=': 'lte',
+    '=': 'eq',
+    '!=': 'neq',
+    'AND': 'and',
+    'OR': 'or',
+    'IN': 'in',
+    'LIKE': 'like',
+    '+': 'add',
+    '-': 'sub',
+    '*': 'mul',
+    '/': 'div',
+}
+
+# unary operator names in the AST -> mo_sql_parsing unary-operator keys
+#   (avoids ambiguity with binary '-' and keeps the JSON shape consistent with what `parse()` produces)
+UNARY_OPERATOR_KEYS = {
+    'NEG': 'neg',
+    '-': 'neg',
+    '+': '+',
+    'NOT': 'not',
+}
+
+
 class QueryFormatter:
     def format(self, query: Node) -> str:
-        # [1] AST -> JSON
-        json_query = ast_to_json(query)
+        try:
+            # [1] AST -> str, in a single pass
+            sql = SQLEmitter().emit(query)
+        except UnsupportedByEmitter:
+            # [1] AST -> JSON
+            json_query = ast_to_json(query)
 
-        # [2] Any (JSON) -> str
-        sql = mosql.format(json_query)
+            # [2] Any (JSON) -> str
+            sql = mosql.format(json_query)
 
         # Fixes edge case where formatting json with INTERVAL '0' SECOND into SQL adds quotes
-        sql = re.sub(r"INTERVAL '(\d+)'", r'INTERVAL \1', sql)  
+        if "INTERVAL '" in sql:
+            sql = re.sub(r"INTERVAL '(\d+)'", r'INTERVAL \1', sql)
               
         return sql
 
@@ -328,36 +364,11 @@ def format_expression(node: Node):
     
     elif node.type == NodeType.OPERATOR:
         # format: {'operator': [left, right]} or {'operator': operand} for unary ops
-        op_map = {
-            '>': 'gt',
-            '<': 'lt',
-            '>=': 'gte',
-            '<=': 'lte',
-            '=': 'eq',
-            '!=': 'neq',
-            'AND': 'and',
-            'OR': 'or',
-            'IN': 'in',
-            'LIKE': 'like',
-            '+': 'add',
-            '-': 'sub',
-            '*': 'mul',
-            '/': 'div',
-        }
-        
         children = list(node.children)
 
         if len(children) == 1:
             operand = format_expression(children[0])
-            # Use mo_sql_parsing's unary-operator keys to avoid ambiguity with binary '-'
-            # and to keep the JSON shape consistent with what `parse()` produces.
-            unary_op_map = {
-                'NEG': 'neg',
-                '-': 'neg',
-                '+': '+',
-                'NOT': 'not',
-            }
-            op_name = unary_op_map.get(node.name.upper(), node.name.lower())
+            op_name = UNARY_OPERATOR_KEYS.get(node.name.upper(), node.name.lower())
             return {op_name: operand}
         
         if node.name.upper() == 'IS' and len(children) == 2:
@@ -365,7 +376,7 @@ def format_expression(node: Node):
             if right.type == NodeType.LITERAL and right.value is None:
                 return {'missing': format_expression(children[0])}
         
-        op_name = op_map.get(node.name, op_map.get(node.name.upper(), node.name.lower()))
+        op_name = OPERATOR_KEYS.get(node.name, OPERATOR_KEYS.get(node.name.upper(), node.name.lower()))
         
         if op_name == 'sub' and len(children) == 2 and children[0].type == NodeType.LITERAL and children[0].value == 0:
             return {'neg': format_expression(children[1])}
@@ -409,4 +420,594 @@ def format_expression(node: Node):
         return {'interval': [value, unit]}
     
     else:
-        raise ValueError(f"Unsupported node type in expression: {node.type}")
\ No newline at end of file
+        raise ValueError(f"Unsupported node type in expression: {node.type}")
+
+# ============================================================================
+# Native SQL emitter
+# ============================================================================
+
+MAX_PRECEDENCE = 100
+
+# cap on cached identifier escapes (mo_sql_parsing checks each identifier against its keyword grammar)
+ESCAPE_CACHE_SIZE = 10000
+_escape_cache = {}
+
+# infix operators rendered by mo_sql_parsing's Formatter: key -> (SQL operator, ordered)
+INFIX_OPERATORS = {
+    'mul': ('*', False),
+    'div': ('/', True),
+    'mod': ('%', True),
+    'add': ('+', False),
+    'sub': ('-', True),
+    'neq': ('<>', True),
+    'gt': ('>', True),
+    'lt': ('<', True),
+    'gte': ('>=', True),
+    'lte': ('<=', True),
+    'eq': ('=', True),
+    'or': ('or', False),
+    'and': ('and', False),
+    'binary_and': ('&', False),
+    'binary_or': ('|', False),
+    'like': ('like', True),
+    'not_like': ('not like', True),
+    'rlike': ('rlike', True),
+    'not_rlike': ('not rlike', True),
+    'ilike': ('ilike', True),
+    'not_ilike': ('not ilike', True),
+}
+_INFIX = {
+    key: (' {0} '.format(op).replace('_', ' ').upper(), precedence[binary_ops[op]], ordered)
+    for key, (op, ordered) in INFIX_OPERATORS.items()
+}
+
+# keys that Formatter.dispatch() treats specially before rendering a dict as an operator/function call
+_DISPATCH_KEYS = {
+    'delete', 'literal', 'substring', 'generator', 'group_concat', 'value', 'join',
+    'insert', 'on_conversion_error', 'null', 'trim', 'extract',
+} | ordered_query_kwargs | set(unordered_clauses)
+
+# keys that Formatter.op() renders with a dedicated method instead of a plain function call
+_METHOD_KEYS = {name[1:] for name in dir(Formatter) if name.startswith('_') and not name.startswith('__')}
+
+# keys the emitter renders itself; any other special key is left to mo_sql_parsing
+_CALL_KEYS = set(_INFIX) | {'not', 'exists', 'missing', 'in', 'nin', 'between', 'not_between',
+                            'cast', 'try_cast', 'safe_cast', 'validate_conversion'}
+_UNSUPPORTED_CALL_KEYS = (_DISPATCH_KEYS | _METHOD_KEYS) - _CALL_KEYS
+
+# keys that change how Formatter.dispatch() renders a DISTINCT aggregate {'distinct': True, key: ...}
+_UNSUPPORTED_AGGREGATE_KEYS = _DISPATCH_KEYS - {'null', 'trim', 'extract'}
+
+_CLAUSE_KEYS = {
+    NodeType.FROM: 'from',
+    NodeType.WHERE: 'where',
+    NodeType.GROUP_BY: 'groupby',
+    NodeType.HAVING: 'having',
+    NodeType.ORDER_BY: 'orderby',
+    NodeType.LIMIT: 'limit',
+    NodeType.OFFSET: 'offset',
+}
+
+_JOIN_KEYWORDS = {
+    JoinType.JOIN: 'JOIN',
+    JoinType.INNER: 'INNER JOIN',
+    JoinType.LEFT: 'LEFT JOIN',
+    JoinType.RIGHT: 'RIGHT JOIN',
+    JoinType.FULL: 'FULL JOIN',
+    JoinType.CROSS: 'CROSS JOIN',
+}
+
+
+class UnsupportedByEmitter(Exception):
+    """Raised by SQLEmitter for AST shapes it does not model; QueryFormatter then falls back to mo_sql_parsing."""
+
+
+class SQLEmitter:
+    """Write SQL for a query AST in a single pass over core.ast nodes.
+
+    The output is byte-identical to ``mosql.format(ast_to_json(query))``:
+    every method mirrors how mo_sql_parsing's Formatter renders the JSON that
+    ast_to_json() would build for the node, including its precedence-based
+    parenthesization and identifier quoting, without materializing the JSON.
+    All pieces are appended to one shared buffer.
+    """
+
+    def __init__(self):
+        self.out = []
+
+    def emit(self, query: Node) -> str:
+        self.out = []
+        self.emit_query(query, MAX_PRECEDENCE)
+        return ''.join(self.out)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def emit_query(self, node: Node, prec: float) -> None:
+        if isinstance(node, CompoundQueryNode):
+            self.emit_compound(node, prec)
+            return
+        if not isinstance(node, QueryNode):
+            raise UnsupportedByEmitter(type(node).__name__)
+
+        # clause key -> node, last one wins (as in ast_to_json)
+        clauses = {}
+        for child in node.children:
+            if child.type == NodeType.SELECT:
+                if child.distinct_on is not None:
+                    clauses['distinct_on'] = child
+                clauses['select_distinct' if child.distinct else 'select'] = child
+            elif child.type in _CLAUSE_KEYS:
+                clauses[_CLAUSE_KEYS[child.type]] = child
+        if not clauses:
+            return
+
+        if 'orderby' in clauses or 'limit' in clauses or 'offset' in clauses:
+            # mo_sql_parsing renders ORDER BY/LIMIT/OFFSET without any other clause but FROM oddly
+            if not clauses.keys() & {'distinct_on', 'select_distinct', 'select', 'where', 'groupby', 'having'}:
+                raise UnsupportedByEmitter('ordered query without SELECT/WHERE/GROUP BY/HAVING')
+            wrap = prec < precedence['order']
+        else:
+            wrap = prec <= precedence['from']
+
+        out = self.out
+        if wrap:
+            out.append('(')
+        first = True
+        for key in ('distinct_on', 'select_distinct', 'select', 'from', 'where', 'groupby', 'having', 'orderby', 'limit', 'offset'):
+            if key not in clauses:
+                continue
+            mark = len(out)
+            if not first:
+                out.append(' ')
+            start = len(out)
+            self.emit_clause(key, clauses[key], clauses)
+            # clauses rendering to nothing are skipped
+            if any(out[start:]):
+                first = False
+            else:
+                del out[mark:]
+        if wrap:
+            out.append(')')
+
+    def emit_compound(self, node: CompoundQueryNode, prec: float) -> None:
+        out = self.out
+        wrap = prec <= precedence['from']
+        if wrap:
+            out.append('(')
+        separator = '\nUNION ALL\n' if node.is_all else '\nUNION\n'
+        for i, branch in enumerate(_collect_union_branches(node, node.is_all)):
+            if i:
+                out.append(separator)
+            self.emit_query(branch, MAX_PRECEDENCE)
+        if wrap:
+            out.append(')')
+
+    def emit_clause(self, key: str, node: Node, clauses: dict) -> None:
+        out = self.out
+        if key == 'distinct_on':
+            out.append('SELECT DISTINCT ON (')
+            self.emit_list(node.distinct_on.children, MAX_PRECEDENCE)
+            out.append(')')
+        elif key in ('select', 'select_distinct'):
+            if key == 'select_distinct':
+                out.append('SELECT DISTINCT ')
+            elif 'distinct_on' not in clauses:
+                out.append('SELECT ')
+            self.emit_select_items(node)
+        elif key == 'from':
+            self.emit_from(node)
+        elif key in ('where', 'having'):
+            out.append('WHERE ' if key == 'where' else 'HAVING ')
+            predicates = list(node.children)
+            if len(predicates) == 1:
+                self.emit_expression(predicates[0], MAX_PRECEDENCE)
+            else:
+                self.emit_call('and', predicates, MAX_PRECEDENCE)
+        elif key == 'groupby':
+            out.append('GROUP BY ')
+            self.emit_list(node.children, MAX_PRECEDENCE)
+        elif key == 'orderby':
+            out.append('ORDER BY ')
+            self.emit_order_by_items(node)
+        elif key == 'limit':
+            out.append('LIMIT ')
+            self.emit_raw(node.limit)
+        elif key == 'offset':
+            out.append('OFFSET ')
+            self.emit_raw(node.offset)
+
+    def emit_select_items(self, select_node: SelectNode) -> None:
+        out = self.out
+        children = list(select_node.children)
+        if select_node.distinct_on is not None:
+            children = children[:-1]
+        for i, child in enumerate(children):
+            if i:
+                out.append(', ')
+            self.emit_expression(child, precedence['select'])
+            if child.type in (NodeType.COLUMN, NodeType.FUNCTION) and child.alias:
+                out.append(' AS ')
+                out.append(self.escape(child.alias))
+
+    def emit_from(self, from_node: FromNode) -> None:
+        out = self.out
+        out.append('FROM ')
+        children = list(from_node.children)
+
+        # a single unaliased UNION is rendered by mo_sql_parsing as an infix set operator
+        if (
+            len(children) == 1
+            and isinstance(children[0], SubqueryNode)
+            and children[0].alias is None
+        ):
+            inner = list(children[0].children)[0]
+            if isinstance(inner, CompoundQueryNode):
+                operator = ' UNION ALL ' if inner.is_all else ' UNION '
+                op_prec = precedence['union_all' if inner.is_all else 'union']
+                out.append('(')
+                for i, branch in enumerate(_collect_union_branches(inner, inner.is_all)):
+                    if i:
+                        out.append(operator)
+                    self.emit_query(branch, op_prec)
+                out.append(')')
+                return
+
+        sources = []
+        for child in children:
+            if child.type == NodeType.JOIN:
+                self.collect_join_sources(child, sources)
+            else:
+                sources.append(child)
+        joiner = ' ' if any(source.type == NodeType.JOIN for source in sources) else ', '
+        for i, source in enumerate(sources):
+            if i:
+                out.append(joiner)
+            if source.type == NodeType.JOIN:
+                self.emit_join(source)
+            else:
+                self.emit_source(source, precedence['from'] - 1)
+
+    def collect_join_sources(self, join_node: JoinNode, sources: list) -> None:
+        """Flatten a (nested) JoinNode into [left source, join, join, ...] like format_join()."""
+        children = list(join_node.children)
+        if len(children) < 2:
+            raise UnsupportedByEmitter('JoinNode with less than 2 children')
+        if children[0].type == NodeType.JOIN:
+            self.collect_join_sources(children[0], sources)
+        else:
+            sources.append(children[0])
+        sources.append(join_node)
+
+    def emit_join(self, join_node: JoinNode) -> None:
+        out = self.out
+        children = list(join_node.children)
+        out.append(_JOIN_KEYWORDS.get(join_node.join_type, 'JOIN'))
+        out.append(' ')
+        self.emit_source(children[1], precedence['join'])
+        if len(children) > 2 and _is_truthy_json(children[2]):
+            out.append(' ON ')
+            self.emit_expression(children[2], MAX_PRECEDENCE)
+
+    def emit_source(self, node: Node, prec: float) -> None:
+        out = self.out
+        if node.type == NodeType.TABLE:
+            out.append(self.escape(node.name))
+        elif node.type == NodeType.SUBQUERY:
+            self.emit_query(list(node.children)[0], prec)
+        else:
+            raise UnsupportedByEmitter(f'source type {node.type}')
+        if node.alias:
+            out.append(' AS ')
+            out.append(self.escape(node.alias))
+
+    def emit_order_by_items(self, order_by_node: OrderByNode) -> None:
+        out = self.out
+        for i, child in enumerate(order_by_node.children):
+            if i:
+                out.append(', ')
+            if child.type == NodeType.ORDER_BY_ITEM:
+                column = list(child.children)[0]
+                sort_order = child.sort
+            else:
+                column = child
+                sort_order = None
+            # each item is stripped as a whole, so render it aside
+            outer, self.out = self.out, []
+            if hasattr(column, 'alias') and column.alias:
+                self.out.append(self.escape(column.alias))
+            else:
+                self.emit_expression(column, precedence['order'])
+            item = ''.join(self.out)
+            self.out = outer
+            if sort_order is not None:
+                item += ' ' + sort_order.value.lower().upper()
+            else:
+                item += ' '
+            out.append(item.strip())
+
+    # ------------------------------------------------------------------
+    # Expressions
+    # ------------------------------------------------------------------
+
+    def emit_expression(self, node: Node, prec: float) -> None:
+        out = self.out
+        node_type = node.type
+
+        if node_type == NodeType.COLUMN:
+            out.append(self.escape(f"{node.parent_alias}.{node.name}" if node.parent_alias else node.name))
+
+        elif node_type == NodeType.LITERAL:
+            value = node.value
+            if value is None:
+                out.append('NULL')
+            elif isinstance(value, str):
+                out.append("'" + value.replace("'", "''") + "'")
+            elif isinstance(value, (list, dict)):
+                raise UnsupportedByEmitter('non-scalar literal')
+            else:
+                out.append(str(value))
+
+        elif node_type == NodeType.FUNCTION:
+            func_name = node.name.lower()
+            children = list(node.children)
+            if len(children) == 1 and children[0].type == NodeType.FUNCTION and children[0].name.upper() == 'DISTINCT':
+                self.emit_distinct_aggregate(func_name, list(children[0].children))
+            elif func_name == 'extract':
+                self.emit_extract(children)
+            else:
+                self.emit_call(func_name, children[0] if len(children) == 1 else children, prec)
+
+        elif node_type == NodeType.SUBQUERY:
+            self.emit_query(list(node.children)[0], prec)
+
+        elif node_type == NodeType.OPERATOR:
+            children = list(node.children)
+            if len(children) == 1:
+                self.emit_call(UNARY_OPERATOR_KEYS.get(node.name.upper(), node.name.lower()), children[0], prec)
+                return
+            if node.name.upper() == 'IS' and len(children) == 2:
+                right = children[1]
+                if right.type == NodeType.LITERAL and right.value is None:
+                    self.emit_call('missing', children[0], prec)
+                    return
+            op_name = OPERATOR_KEYS.get(node.name, OPERATOR_KEYS.get(node.name.upper(), node.name.lower()))
+            if op_name == 'sub' and len(children) == 2 and children[0].type == NodeType.LITERAL and children[0].value == 0:
+                self.emit_call('neg', children[1], prec)
+            elif op_name in ('and', 'or'):
+                self.emit_call(op_name, flatten_logical_operands(node, node.name.upper()), prec)
+            elif len(children) == 2:
+                self.emit_call(op_name, children, prec)
+            else:
+                raise UnsupportedByEmitter(f'operator arity {len(children)}')
+
+        elif node_type == NodeType.TABLE:
+            self.emit_source(node, prec)
+
+        elif node_type == NodeType.DATA_TYPE:
+            key = node.name.lower()
+            if key in _DISPATCH_KEYS or key in _METHOD_KEYS:
+                raise UnsupportedByEmitter(f'data type {key}')
+            out.append(key.upper() + '()')
+
+        elif node_type == NodeType.LIST:
+            out.append('(')
+            self.emit_list(node.children, MAX_PRECEDENCE)
+            out.append(')')
+
+        elif node_type == NodeType.CASE:
+            out.append('CASE')
+            for wt in node.whens:
+                out.append(' WHEN ')
+                self.emit_expression(wt.when, MAX_PRECEDENCE)
+                out.append(' THEN ')
+                self.emit_expression(wt.then, MAX_PRECEDENCE)
+            if node.else_val is not None:
+                out.append(' ELSE ')
+                self.emit_expression(node.else_val, MAX_PRECEDENCE)
+            out.append(' END')
+
+        elif node_type == NodeType.INTERVAL:
+            out.append('INTERVAL ')
+            value = node.value
+            if isinstance(value, Node):
+                if value.type == NodeType.LITERAL and isinstance(value.value, (int, float)):
+                    # mo_sql_parsing quotes numeric amounts
+                    out.append(f"'{value.value}'")
+                else:
+                    self.emit_expression(value, precedence['interval'])
+            elif isinstance(value, (int, float)):
+                out.append(f"'{value}'")
+            else:
+                self.emit_raw(value)
+            out.append(' ')
+            out.append(self.escape(node.unit.name.lower()).upper())
+
+        else:
+            raise UnsupportedByEmitter(f'expression type {node_type}')
+
+    def emit_call(self, key: str, value, prec: float) -> None:
+        """Render {key: value} the way Formatter.op() does; value is a node or a list of nodes."""
+        out = self.out
+
+        if key in _INFIX:
+            operator, op_prec, ordered = _INFIX[key]
+            if not isinstance(value, list) and _is_dict_json(value):
+                # Formatter reads a single dict operand as {VARIABLE: VALUE}
+                raise UnsupportedByEmitter(f'single dict operand for {key}')
+            operands = _listwrap(value)
+            wrap = not (prec > op_prec or (prec == op_prec and not ordered))
+            if wrap:
+                out.append('(')
+            if ordered and len(operands) == 2:
+                self.emit_expression(operands[0], op_prec + 0.5)
+                out.append(operator)
+                self.emit_expression(operands[1], op_prec - 0.5)
+            else:
+                for i, operand in enumerate(operands):
+                    if i:
+                        out.append(operator)
+                    self.emit_expression(operand, op_prec)
+            if wrap:
+                out.append(')')
+
+        elif key in _UNSUPPORTED_CALL_KEYS:
+            raise UnsupportedByEmitter(f'call {key}')
+
+        elif key == 'not':
+            if prec >= precedence['not']:
+                out.append('NOT ')
+                self.emit_value(value, MAX_PRECEDENCE)
+            else:
+                out.append('NOT (')
+                self.emit_value(value, MAX_PRECEDENCE)
+                out.append(')')
+
+        elif key == 'exists':
+            if isinstance(value, list) or value.type != NodeType.SUBQUERY:
+                raise UnsupportedByEmitter('EXISTS without subquery')
+            query = list(value.children)[0]
+            has_from = isinstance(query, QueryNode) and any(child.type == NodeType.FROM for child in query.children)
+            if has_from:
+                out.append('EXISTS ')
+            self.emit_query(query, precedence['exists'])
+            if not has_from:
+                out.append(' IS NOT NULL')
+
+        elif key == 'missing':
+            self.emit_value(value, precedence['is'])
+            out.append(' IS NULL')
+
+        elif key in ('in', 'nin'):
+            if not isinstance(value, list) or len(value) != 2:
+                raise UnsupportedByEmitter(f'{key} arity')
+            member, members = value
+            wrap = prec < precedence['in']
+            if wrap:
+                out.append('(')
+            self.emit_expression(member, precedence['in'])
+            out.append(' IN (' if key == 'in' else ' NOT IN (')
+            if members.type == NodeType.LIST:
+                self.emit_list(members.children, MAX_PRECEDENCE)
+            else:
+                self.emit_expression(members, MAX_PRECEDENCE)
+            out.append(')')
+            if wrap:
+                out.append(')')
+
+        elif key in ('between', 'not_between'):
+            if not isinstance(value, list) and value.type != NodeType.LIST:
+                raise UnsupportedByEmitter(f'{key} operand')
+            operands = _listwrap(value)
+            if len(operands) < 3:
+                raise UnsupportedByEmitter(f'{key} arity')
+            self.emit_expression(operands[0], precedence['between'])
+            out.append(' BETWEEN ' if key == 'between' else ' NOT BETWEEN ')
+            self.emit_expression(operands[1], precedence['between'])
+            out.append(' AND ')
+            self.emit_expression(operands[2], precedence['between'])
+
+        elif key in ('cast', 'try_cast', 'safe_cast', 'validate_conversion'):
+            operands = _listwrap(value) if isinstance(value, list) or value.type == NodeType.LIST else None
+            if operands is None or len(operands) != 2 or operands[1].type != NodeType.DATA_TYPE:
+                raise UnsupportedByEmitter(f'{key} operands')
+            out.append(key.upper() + '(')
+            self.emit_expression(operands[0], MAX_PRECEDENCE)
+            out.append(' AS ')
+            out.append(self.escape(operands[1].name.lower().upper()))
+            out.append(')')
+
+        else:
+            # regular function call
+            out.append(key.upper() + '(')
+            self.emit_list(_listwrap(value), precedence['from'])
+            out.append(')')
+
+    def emit_distinct_aggregate(self, func_name: str, args: list) -> None:
+        """Render {'distinct': True, func_name: args}, e.g., COUNT(DISTINCT x)."""
+        if func_name in _UNSUPPORTED_AGGREGATE_KEYS:
+            raise UnsupportedByEmitter(f'distinct aggregate {func_name}')
+        self.out.append(func_name.upper() + '(DISTINCT ')
+        self.emit_value(args[0] if len(args) == 1 else args, precedence['order'])
+        self.out.append(')')
+
+    def emit_extract(self, children: list) -> None:
+        if len(children) < 2 or children[0].type != NodeType.LITERAL or not isinstance(children[0].value, str):
+            raise UnsupportedByEmitter('EXTRACT operands')
+        self.out.append('EXTRACT(' + self.escape(children[0].value.lower()).upper() + ' FROM ')
+        self.emit_expression(children[1], MAX_PRECEDENCE)
+        self.out.append(')')
+
+    def emit_value(self, value, prec: float) -> None:
+        """Render a node, or a list of nodes as a parenthesized list."""
+        if isinstance(value, list):
+            self.out.append('(')
+            self.emit_list(value, MAX_PRECEDENCE)
+            self.out.append(')')
+        else:
+            self.emit_expression(value, prec)
+
+    def emit_list(self, nodes, prec: float) -> None:
+        out = self.out
+        for i, node in enumerate(nodes):
+            if i:
+                out.append(', ')
+            self.emit_expression(node, prec)
+
+    def emit_raw(self, value) -> None:
+        """Render a plain Python value (e.g., LIMIT/OFFSET counts)."""
+        if isinstance(value, str):
+            self.out.append(self.escape(value))
+        elif value is None:
+            self.out.append('NULL')
+        elif isinstance(value, (list, dict)):
+            raise UnsupportedByEmitter('non-scalar value')
+        else:
+            self.out.append(str(value))
+
+    def escape(self, identifier: str) -> str:
+        """Quote an identifier if needed, exactly like mo_sql_parsing (cached)."""
+        sql = _escape_cache.get(identifier)
+        if sql is None:
+            if not isinstance(identifier, str):
+                raise UnsupportedByEmitter('non-string identifier')
+            sql = escape(identifier, '"', _should_quote)
+            if len(_escape_cache) >= ESCAPE_CACHE_SIZE:
+                _escape_cache.clear()
+            _escape_cache[identifier] = sql
+        return sql
+
+
+def _listwrap(value) -> list:
+    """Nodes a {key: value} call is applied to, like mo_sql_parsing's listwrap on the JSON value."""
+    if isinstance(value, list):
+        return value
+    if value.type == NodeType.LIST:
+        return list(value.children)
+    return [value]
+
+
+def _is_dict_json(node: Node) -> bool:
+    """Whether format_expression(node) is a dict."""
+    if node.type in (NodeType.COLUMN, NodeType.LIST):
+        return False
+    if node.type == NodeType.LITERAL:
+        return node.value is None or isinstance(node.value, str)
+    return True
+
+
+def _is_truthy_json(node: Node) -> bool:
+    """Whether format_expression(node) is truthy."""
+    if node.type == NodeType.COLUMN:
+        return bool(node.parent_alias or node.name)
+    if node.type == NodeType.LITERAL:
+        return node.value is None or isinstance(node.value, str) or bool(node.value)
+    if node.type == NodeType.LIST:
+        return bool(node.children)
+    if node.type == NodeType.SUBQUERY:
+        query = list(node.children)[0]
+        return not isinstance(query, QueryNode) or any(
+            child.type in _CLAUSE_KEYS or child.type == NodeType.SELECT for child in query.children
+        )
+    return True
@@ -8,8 +8,23 @@ from core.ast.node import (
 )
 # TODO: implement ElementVariableNode, SetVariableNode
 from core.ast.enums import JoinType, SortOrder
+from core.native_parser import NativeParser, NativeParseError
+from collections import OrderedDict
 import mo_sql_parsing as mosql
 import json
+import threading
+
+# parsed mo_sql_parsing dicts of SQL strings (see QueryParser.parse_to_dict()),
+#   shared by all the callers parsing the same SQL string with the same backend,
+#   so they must never be mutated (parse() builds a fresh node tree on every call)
+PARSE_CACHE_SIZE = 4096
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+# hash-consed subtrees of cached dicts: identical subtrees (e.g., a sub-select or
+#   predicate repeated within or across queries) are interned into one shared object
+INTERN_TABLE_SIZE = 100000
+_interned = {}
 
 class QueryParser:
     # mo_sql_parsing operator keys -> SQL display name
@@ -21,6 +36,15 @@ class QueryParser:
         'is': 'IS', 'missing': 'MISSING',
     }
     _LIST_OPERATOR_KEYS = frozenset(_OPERATOR_KEY_TO_NAME.keys())
+    # Backends turning SQL text into the mo_sql_parsing dict:
+    #   'native' - core.native_parser, falling back to mo_sql_parsing outside its subset
+    #   'mosql'  - always mo_sql_parsing
+    BACKENDS = ('native', 'mosql')
+
+    def __init__(self, backend: str = 'native'):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown parser backend {backend!r}, expected one of {self.BACKENDS}")
+        self.backend = backend
 
     @staticmethod
     def normalize_to_list(value):
@@ -46,9 +70,75 @@ class QueryParser:
             )
 
     def parse(self, query: str) -> Node:
-        # str -> mo_sql_parsing -> QueryNode or CompoundQueryNode
-        mosql_ast = mosql.parse(query)
+        # str -> mo_sql_parsing dict -> QueryNode or CompoundQueryNode
+        mosql_ast = self.parse_to_dict(query)
         return self.parse_top_level_dict(mosql_ast, aliases={})
+
+    def parse_to_dict(self, query: str) -> dict:
+        """Parse SQL text into the mo_sql_parsing dict (LRU-cached by SQL text).
+
+        The returned dict is shared with every other caller parsing the same text,
+        so it must not be mutated; copy it first if a mutable dict is needed.
+        """
+        key = (self.backend, query)
+        with _parse_cache_lock:
+            if key in _parse_cache:
+                _parse_cache.move_to_end(key)
+                return _parse_cache[key]
+        mosql_ast = self._parse_to_dict_uncached(query)
+        with _parse_cache_lock:
+            mosql_ast = self.intern_subtrees(mosql_ast)
+            _parse_cache[key] = mosql_ast
+            if len(_parse_cache) > PARSE_CACHE_SIZE:
+                _parse_cache.popitem(last=False)
+        return mosql_ast
+
+    def _parse_to_dict_uncached(self, query: str) -> dict:
+        if self.backend == 'native':
+            try:
+                return NativeParser.parse(query)
+            except NativeParseError:
+                pass
+        return mosql.parse(query)
+
+    @staticmethod
+    def clear_parse_cache() -> None:
+        with _parse_cache_lock:
+            _parse_cache.clear()
+            _interned.clear()
+
+    @staticmethod
+    def intern_subtrees(value):
+        """Hash-cons a freshly parsed dict bottom-up, in place (caller holds _parse_cache_lock).
+
+        A dict/list is keyed by its children's identities once they are interned,
+        which stay unique because the table keeps every interned child alive.
+        """
+        if isinstance(value, dict):
+            for k, v in value.items():
+                if isinstance(v, (dict, list)):
+                    value[k] = QueryParser.intern_subtrees(v)
+            key = (dict,) + tuple((k, QueryParser._intern_key(v)) for k, v in value.items())
+        elif isinstance(value, list):
+            for i, v in enumerate(value):
+                if isinstance(v, (dict, list)):
+                    value[i] = QueryParser.intern_subtrees(v)
+            key = (list,) + tuple(QueryParser._intern_key(v) for v in value)
+        else:
+            return value
+        shared = _interned.get(key)
+        if shared is None:
+            if len(_interned) >= INTERN_TABLE_SIZE:
+                _interned.clear()
+            _interned[key] = shared = value
+        return shared
+
+    @staticmethod
+    def _intern_key(value):
+        if isinstance(value, (dict, list)):
+            return id(value)
+        # typed, so that 1, 1.0 and True (or 0.0 and -0.0) never share a subtree
+        return (type(value), repr(value) if isinstance(value, float) else value)
    
     def parse_select(self, select_list: list, aliases: dict, distinct: bool = False, distinct_on_expr = None) -> SelectNode:
         items = []
@@ -1,16 +1,52 @@
 import re
+from core.profiler import Profiler
+
+
+# Patterns of the fixups (see QueryPatcher.patch_ilike() and QueryPatcher.patch_timestamp())
+ILIKE_PATTERN = re.compile(r"ILIKE\((.[^\,]*)\s*,\s*(.[^\)]*)\)")
+TIMESTAMP_PATTERN = re.compile(r"TIMESTAMP\(\s*(.[^\)]*)\s*\)")
 
 
 class QueryPatcher:
 
+    # Per-dialect registry of fixups, applied in order:
+    #   (trigger, pattern, replacement), where trigger is a literal that every match of pattern contains,
+    #   so that a fixup is skipped without a regex pass when its trigger is not in the SQL text
+    #   Note: to support another database, register its fixups here
+    #
+    DIALECT_FIXUPS = {
+        'postgresql': [
+            ('ILIKE(', ILIKE_PATTERN, r"\1 ILIKE \2"),
+            ('TIMESTAMP(', TIMESTAMP_PATTERN, r"(TIMESTAMP \1)"),
+        ],
+        'mysql': [],
+    }
+
     # Patch the SQL query based on specific database
     #
     @staticmethod
     def patch(sql: str, database: str='postgresql') -> str:
-        if database == 'postgresql':
-            sql = QueryPatcher.patch_ilike(sql)
-            sql = QueryPatcher.patch_timestamp(sql)
-        return sql
+        with Profiler.phase('patch'):
+            for trigger, pattern, replacement in QueryPatcher.DIALECT_FIXUPS.get(database, ()):
+                if trigger in sql:
+                    sql = pattern.sub(replacement, sql)
+            return sql
+
+    # Patch a rewritten query and its rewriting path in place,
+    #   where each distinct SQL text is patched only once
+    #   (the rewritten query is usually the last entry of the rewriting path)
+    #
+    @staticmethod
+    def patch_rewriting(rewritten_query: str, rewriting_path: list, database: str='postgresql') -> str:
+        patched = {}
+        for rewriting in rewriting_path:
+            sql = rewriting[1]
+            if sql not in patched:
+                patched[sql] = QueryPatcher.patch(sql, database)
+            rewriting[1] = patched[sql]
+        if rewritten_query not in patched:
+            patched[rewritten_query] = QueryPatcher.patch(rewritten_query, database)
+        return patched[rewritten_query]
 
     # Patch the SQL query with a trasnformation for ILIKE
     #   Note: This is needed only because the SQL Parser (mo_sql_parsing) 
@@ -22,7 +58,7 @@ class QueryPatcher:
     #         
     @staticmethod
     def patch_ilike(sql: str) -> str:
-        return re.sub(r"ILIKE\((.[^\,]*)\s*,\s*(.[^\)]*)\)", r"\1 ILIKE \2", sql)
+        return ILIKE_PATTERN.sub(r"\1 ILIKE \2", sql)
     
     # Patch the SQL query with a transformation for TIMESTAMP (postgresql)
     #   Note: PostgreSQL syntax for TIMESTAMP constant is the following:
@@ -33,4 +69,4 @@ class QueryPatcher:
     # 
     @staticmethod
     def patch_timestamp(sql: str) -> str:
-        return re.sub(r"TIMESTAMP\(\s*(.[^\)]*)\s*\)", r"(TIMESTAMP \1)", sql)
+        return TIMESTAMP_PATTERN.sub(r"(TIMESTAMP \1)", sql)
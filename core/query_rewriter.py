@@ -1,12 +1,20 @@
 from mo_sql_parsing import parse
 from mo_sql_parsing import format
 import copy
+import json
+import logging
 import numbers
 import sqlparse
-from typing import Any, Tuple
+import time
+from typing import Any, Optional, Tuple
 from enum import Enum
 
+from core.json_logger import Lazy
+from core.profiler import Profiler
+from core.query_parser import QueryParser
+from core.query_rewriter_v2 import RewriteBudget, RewriteBudgetExceeded
 from core.rule_parser import VarType, VarTypesInfo
+from core.schema_catalog import ConstraintEvaluator, SchemaCatalog
 
 
 class MatchingMode(Enum):
@@ -15,6 +23,8 @@ class MatchingMode(Enum):
     IN_PARTIAL = "in_partial"         # Already in partial context, no more partial matching
 
 
+logger = logging.getLogger(__name__)
+
 VarStart = VarTypesInfo[VarType.Var]['internalBase']
 VarListStart = VarTypesInfo[VarType.VarList]['internalBase']
 
@@ -45,7 +55,7 @@ class QueryRewriter:
     # 
     @staticmethod
     def reformat(query: str) -> str:
-        return format(parse(query))
+        return format(QueryParser().parse_to_dict(query))
 
     # Beautify a query string
     # 
@@ -64,11 +74,24 @@ class QueryRewriter:
     #       'rewrite': json.loads('"V1"'),
     #       'actions': ''
     #     }
+    #   If a schema catalog is given, a rule only applies to a match that satisfies its constraints
+    #     (see ConstraintEvaluator), otherwise constraints are not checked
+    #   If a budget is given (see RewriteBudget), the rewrite stops when it runs out and returns the query
+    #     reached by the last applied rule, with budget.exceeded telling which limit was hit; unbounded otherwise
     # 
     @staticmethod
-    def rewrite(query: str, rules: list, iterate=True) -> Tuple[str, list]:
+    def rewrite(query: str, rules: list, iterate=True, catalog: Optional[SchemaCatalog]=None, 
+                budget: Optional[RewriteBudget]=None) -> Tuple[str, list]:
+        if budget is None:
+            budget = RewriteBudget.unbounded()
+        with budget.running():
+            return QueryRewriter.__rewrite(query, rules, iterate, catalog, budget)
+
+    @staticmethod
+    def __rewrite(query: str, rules: list, iterate: bool, catalog: Optional[SchemaCatalog], budget: RewriteBudget) -> Tuple[str, list]:
         
-        query_ast = parse(query)
+        with Profiler.phase('parse'):
+            query_ast = parse(query)
 
         rewriting_path = []
 
@@ -82,52 +105,97 @@ class QueryRewriter:
             new_query = False
             # the current query has occurred before
             #
-            if format(query_ast) in query_trace:
+            with Profiler.phase('format'):
+                formatted = format(query_ast)
+            if formatted in query_trace:
                 cycle_found = True
-                print("@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@")
-                print("  [QueryRewriter] Cycle Found")
-                print("rewriting_path:")
-                print(rewriting_path)
-                print("@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@")
+                logger.warning('Cycle found after %d steps', len(rewriting_path),
+                               extra={'rewriting_path': Lazy(json.dumps, list(rewriting_path))})
             # otherwise, remember it
             else:
-                query_trace.add(format(query_ast))
+                query_trace.add(formatted)
             
             # store the rule and memo applied
             rule_applied = None
             memo_applied = None
             
-            # first pass: look for full matches (higher priority)
-            for rule in rules:
-                memo = {}
-                if QueryRewriter.match(query_ast, rule, memo, MatchingMode.FULL_ONLY) and memo.get('rule') is query_ast:
-                    rule_applied = rule
-                    memo_applied = memo
-                    break
-            
-            # second pass: if no full match found, look for partial matches (lower priority)
-            if rule_applied is None:
+            try:
+                budget.check_time()
+
+                # first pass: look for full matches (higher priority)
                 for rule in rules:
                     memo = {}
-                    if QueryRewriter.match(query_ast, rule, memo, MatchingMode.ALLOW_PARTIAL):
+                    if QueryRewriter.profiled_match(query_ast, rule, memo, MatchingMode.FULL_ONLY) and memo.get('rule') is query_ast \
+                       and QueryRewriter.satisfies_constraints(query_ast, rule, memo, catalog):
                         rule_applied = rule
                         memo_applied = memo
                         break
+                
+                # second pass: if no full match found, look for partial matches (lower priority)
+                if rule_applied is None:
+                    for rule in rules:
+                        memo = {}
+                        if QueryRewriter.profiled_match(query_ast, rule, memo, MatchingMode.ALLOW_PARTIAL) \
+                           and QueryRewriter.satisfies_constraints(query_ast, rule, memo, catalog):
+                            rule_applied = rule
+                            memo_applied = memo
+                            break
+
+                if rule_applied is not None:
+                    budget.charge_rewrite_step()
+            except RewriteBudgetExceeded:
+                break
             
             # apply the rule and found
+            previous_ast = query_ast
             try:
                 if rule_applied is not None:
-                    query_ast = QueryRewriter.take_actions(query_ast, rule_applied, memo_applied)
-                    query_ast = QueryRewriter.replace(query_ast, rule_applied, memo_applied)
-                    rewriting_path.append([rule_applied['id'], format(query_ast)])
-                    query_ast = parse(format(query_ast))
+                    Profiler.count('hits', rule_applied.get('key', rule_applied['id']))
+                    with Profiler.phase('take_actions'):
+                        query_ast = QueryRewriter.take_actions(query_ast, rule_applied, memo_applied)
+                    with Profiler.phase('replace'):
+                        query_ast = QueryRewriter.replace(query_ast, rule_applied, memo_applied)
+                    with Profiler.phase('format'):
+                        formatted = format(query_ast)
+                    rewriting_path.append([rule_applied['id'], formatted])
+                    with Profiler.phase('parse'):
+                        query_ast = parse(formatted)
                     if not cycle_found and iterate:
                         new_query = True
+            except RewriteBudgetExceeded:
+                # out of budget, not a failed rule: keep the query of the last applied rule
+                query_ast = previous_ast
+                break
             except:
-                print(f"Failed to rewrite with rule: {rule}")
+                logger.exception('Failed to rewrite with rule %s', rule_applied['id'],
+                                 extra={'rule': Lazy(json.dumps, rule_applied)})
                 continue
 
-        return format(query_ast), rewriting_path
+        with Profiler.phase('format'):
+            return format(query_ast), rewriting_path
+
+    # Match a rule against query AST (see match()), recording the rule's match time
+    #
+    @staticmethod
+    def profiled_match(query: Any, rule: dict, memo: dict, matching_mode: MatchingMode) -> bool:
+        start = time.perf_counter()
+        try:
+            return QueryRewriter.match(query, rule, memo, matching_mode)
+        finally:
+            Profiler.observe('match', time.perf_counter() - start, rule.get('key', rule['id']))
+    
+    # Check a match (memo) of a rule against the rule's constraints and the schema catalog (if any),
+    #   a rejected match is counted in the rule's metrics
+    #
+    @staticmethod
+    def satisfies_constraints(query: Any, rule: dict, memo: dict, catalog: Optional[SchemaCatalog]) -> bool:
+        if catalog is None:
+            return True
+        with Profiler.phase('constraints'):
+            satisfied = ConstraintEvaluator.evaluate(rule, memo, query, catalog)
+        if not satisfied:
+            Profiler.count('rejected', rule.get('key', rule['id']))
+        return satisfied
     
     # Traverse query AST tree, and check if rule->pattern matches any node of in query
     # 
@@ -158,6 +226,10 @@ class QueryRewriter:
     # 
     @staticmethod
     def match_node(query_node: Any, rule_node: Any, rule: dict, memo: dict, matching_mode: MatchingMode = MatchingMode.FULL_ONLY) -> bool:
+        budget = RewriteBudget.active()
+        if budget is not None:
+            budget.charge_match_attempt()
+
         # TODO - Do the escalation in RuleParser
         # Special case for value of 'select' and 'from':
         #   e.g., query_node = [{"value": "e1.name"}, {"value": "e1.age"}, {"value": "e2.salary"}]
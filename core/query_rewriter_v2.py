@@ -24,7 +24,9 @@ from __future__ import annotations
 import copy
 import logging
 import re
+import time
 from contextlib import contextmanager
+from contextvars import ContextVar
 from collections import deque
 from enum import Enum
 from typing import Any, Dict, List, Optional, Tuple
@@ -63,8 +65,10 @@ from core.ast.node import (
     WhenThenNode,
     WhereNode,
 )
+from core.profiler import Profiler
 from core.query_formatter import QueryFormatter
 from core.query_parser import QueryParser
+from core.schema_catalog import ConstraintEvaluator, SchemaCatalog
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +79,99 @@ class MatchingMode(Enum):
     IN_PARTIAL = "in_partial"
 
 
+# ============================================================================
+# Rewrite budgets
+# ============================================================================
+
+DEFAULT_TIME_BUDGET_MS = 2000
+DEFAULT_MAX_MATCH_ATTEMPTS = 200000
+DEFAULT_MAX_REWRITE_STEPS = 100
+
+# match attempts between two wall-clock checks
+_CLOCK_CHECK_INTERVAL = 256
+
+
+class RewriteBudgetExceeded(Exception):
+    """Raised inside the matcher when the active RewriteBudget runs out."""
+
+
+class RewriteBudget:
+    """Per-request limits of one rewrite() call (None disables a limit), of
+    QueryRewriterV2 or of the v1 core.query_rewriter.QueryRewriter.
+
+    Match attempts are charged by every node match of the matcher (_match_node(),
+    QueryRewriter.match_node()), including the backtracking ones, so an
+    exponential match is cut off like a long rewrite.
+    After the call, ``exceeded`` names the limit that stopped the rewrite
+    ('time', 'match_attempts' or 'rewrite_steps'), or is None if the rewrite ran
+    to completion; either way the rewrite returns the best query reached.
+    """
+
+    def __init__(
+        self,
+        time_ms: Optional[float] = DEFAULT_TIME_BUDGET_MS,
+        max_match_attempts: Optional[int] = DEFAULT_MAX_MATCH_ATTEMPTS,
+        max_rewrite_steps: Optional[int] = DEFAULT_MAX_REWRITE_STEPS,
+    ):
+        self.time_ms = time_ms
+        self.max_match_attempts = max_match_attempts
+        self.max_rewrite_steps = max_rewrite_steps
+        self.match_attempts = 0
+        self.rewrite_steps = 0
+        self.exceeded: Optional[str] = None
+        self._deadline: Optional[float] = None
+
+    def start(self) -> None:
+        self.match_attempts = 0
+        self.rewrite_steps = 0
+        self.exceeded = None
+        self._deadline = (time.perf_counter() + self.time_ms / 1000.0
+                          if self.time_ms is not None else None)
+
+    def charge_match_attempt(self) -> None:
+        self.match_attempts += 1
+        if self.max_match_attempts is not None and self.match_attempts > self.max_match_attempts:
+            self._exceed("match_attempts")
+        if self.match_attempts % _CLOCK_CHECK_INTERVAL == 0:
+            self.check_time()
+
+    def charge_rewrite_step(self) -> None:
+        if self.max_rewrite_steps is not None and self.rewrite_steps >= self.max_rewrite_steps:
+            self._exceed("rewrite_steps")
+        self.rewrite_steps += 1
+
+    def check_time(self) -> None:
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            self._exceed("time")
+
+    def _exceed(self, limit: str) -> None:
+        self.exceeded = limit
+        raise RewriteBudgetExceeded(limit)
+
+    @contextmanager
+    def running(self):
+        """Start the budget and make it the one the matchers charge in this context."""
+        self.start()
+        token = _active_budget.set(self)
+        try:
+            yield self
+        finally:
+            _active_budget.reset(token)
+
+    @staticmethod
+    def active() -> Optional["RewriteBudget"]:
+        """The budget of the rewrite running in this context, if any."""
+        return _active_budget.get()
+
+    @staticmethod
+    def unbounded() -> "RewriteBudget":
+        return RewriteBudget(time_ms=None, max_match_attempts=None, max_rewrite_steps=None)
+
+
+# Budget of the rewrite() running in the current thread/context, if any
+_active_budget: ContextVar[Optional[RewriteBudget]] = ContextVar("_active_budget", default=None)
+
+
 # ============================================================================
 # Logical-tree helpers
 # ============================================================================
@@ -164,6 +261,9 @@ def _match_node(
     q: Node, p: Node, memo: dict, mode: MatchingMode, mapping: dict
 ) -> bool:
     """Recursively match query node q against pattern node p."""
+    budget = _active_budget.get()
+    if budget is not None:
+        budget.charge_match_attempt()
 
     # --- variable nodes in pattern ---
     if isinstance(p, ElementVariableNode):
@@ -1106,41 +1206,210 @@ def _rule_key(rule: dict) -> Any:
     return rule.get("id")
 
 
+def _profiled_match(query_ast: Node, rule: dict, memo: dict, mode: MatchingMode) -> bool:
+    """QueryRewriterV2.match, recording the rule's match time."""
+    start = time.perf_counter()
+    try:
+        return QueryRewriterV2.match(query_ast, rule, memo, mode)
+    finally:
+        Profiler.observe("match", time.perf_counter() - start, _rule_key(rule))
+
+
+def _profiled_match_root(query_ast: Node, rule: dict, memo: dict) -> bool:
+    """QueryRewriterV2.match in FULL_ONLY mode restricted to the root.
+
+    match() tries the root first, so a full root match is found iff the root
+    itself matches; the BFS over the rest of the tree can be skipped.
+    """
+    start = time.perf_counter()
+    try:
+        attempt_memo: dict = {}
+        if not _match_node(query_ast, rule["pattern_ast"], attempt_memo,
+                           MatchingMode.FULL_ONLY, rule["mapping"]):
+            return False
+        if "_rule_node" not in attempt_memo:
+            attempt_memo["_rule_node"] = query_ast
+        memo.clear()
+        memo.update(attempt_memo)
+        return True
+    finally:
+        Profiler.observe("match", time.perf_counter() - start, _rule_key(rule))
+
+
+def _node_features(root: Node, mapping: dict) -> set:
+    """Names a match depends on: functions, operators, data types, join types,
+    and non-variable table/column names (case-insensitive, like _match_node).
+
+    Every non-variable pattern node is matched against a query node of the same
+    kind and name, so a rule whose pattern features are not all among the
+    query's features cannot match anywhere in the query.
+    """
+    features = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ElementVariableNode, SetVariableNode)):
+            continue
+        if isinstance(node, FunctionNode):
+            features.add(("function", node.name.upper()))
+        elif isinstance(node, OperatorNode):
+            features.add(("operator", node.name.upper()))
+        elif isinstance(node, DataTypeNode):
+            features.add(("type", node.name.upper()))
+        elif isinstance(node, JoinNode):
+            features.add(("join", node.join_type))
+        elif isinstance(node, (TableNode, ColumnNode)):
+            if isinstance(node.name, str) and not _is_var_name(node.name, mapping):
+                features.add((type(node).__name__, node.name.lower()))
+        if isinstance(node, Node):
+            stack.extend(child for child in node.children if isinstance(child, Node))
+    return features
+
+
+# Pattern features of the rules (see _rule_features): rule key -> (pattern_ast, features).
+# Kept out of the rule dicts, which are shared by the request threads; an entry
+# is only used for the very pattern_ast it was computed from.
+_pattern_features: Dict[Any, Tuple[Node, frozenset]] = {}
+
+
+def _rule_features(rule: dict) -> frozenset:
+    """Pattern features of a rule (see _node_features), cached by rule key."""
+    pattern = rule["pattern_ast"]
+    cached = _pattern_features.get(_rule_key(rule))
+    if cached is not None and cached[0] is pattern:
+        return cached[1]
+    features = frozenset(_node_features(pattern, rule["mapping"]))
+    _pattern_features[_rule_key(rule)] = (pattern, features)
+    return features
+
+
+def _satisfies_constraints(
+    query_ast: Node, rule: dict, memo: dict, catalog: Optional[SchemaCatalog],
+) -> bool:
+    """Whether a match satisfies the rule's ``constraints_json`` under ``catalog``.
+
+    Always true without a catalog. Rejected matches are counted per rule.
+    """
+    if catalog is None:
+        return True
+    with Profiler.phase("constraints"):
+        satisfied = ConstraintEvaluator.evaluate(rule, memo, query_ast, catalog)
+    if not satisfied:
+        Profiler.count("rejected", _rule_key(rule))
+    return satisfied
+
+
 def _pick_applicable_rule(
     query_ast: Node, rules: list, excluded: set,
+    catalog: Optional[SchemaCatalog] = None,
 ) -> Tuple[Optional[dict], dict]:
     """First full root match, else first partial match; skip guardrailed rules.
 
     Rules listed in ``excluded`` (by :func:`_rule_key`) are not returned. When
     :func:`_should_skip_partial_and_application` applies, the rule key is added to
     ``excluded`` and the search continues.
+
+    Rules are still tried in list order, which already evaluates the fewest rules
+    for first-match semantics; rules that cannot match the query's features are
+    skipped in both passes without matching.
+
+    With a schema ``catalog``, matches that do not satisfy the rule's constraints
+    are rejected (see :func:`_satisfies_constraints`).
     """
+    query_features = _node_features(query_ast, {})
+    candidates = []
     for rule in rules:
+        if _rule_features(rule) <= query_features:
+            candidates.append(rule)
+        else:
+            Profiler.count("skipped", _rule_key(rule))
+
+    for rule in candidates:
         rk = _rule_key(rule)
         if rk in excluded:
             continue
         memo: dict = {}
-        if (QueryRewriterV2.match(query_ast, rule, memo, MatchingMode.FULL_ONLY)
-                and memo.get("_rule_node") is query_ast):
+        if _profiled_match_root(query_ast, rule, memo):
             if _should_skip_partial_and_application(rule, memo):
                 excluded.add(rk)
                 continue
+            if not _satisfies_constraints(query_ast, rule, memo, catalog):
+                continue
             return rule, memo
 
-    for rule in rules:
+    for rule in candidates:
         rk = _rule_key(rule)
         if rk in excluded:
             continue
         memo = {}
-        if QueryRewriterV2.match(query_ast, rule, memo, MatchingMode.ALLOW_PARTIAL):
+        if _profiled_match(query_ast, rule, memo, MatchingMode.ALLOW_PARTIAL):
             if _should_skip_partial_and_application(rule, memo):
                 excluded.add(rk)
                 continue
+            if not _satisfies_constraints(query_ast, rule, memo, catalog):
+                continue
             return rule, memo
 
     return None, {}
 
 
+# ============================================================================
+# Rewriting path
+# ============================================================================
+
+class RewritingStep(list):
+    """One applied rule of a rewriting path: the ``[rule_id, sql]`` pair, plus
+    ``ast``, the snapshot of the rewritten (re-parsed) AST.
+
+    The SQL is the rendering the rewriter already made to re-parse the
+    rewritten AST (re-parsing it renders the same text), so a step is
+    rendered once; it is only formatted here if no SQL is given.  Being a
+    list, a step serializes (e.g., ``json.dumps``) and patches
+    (``step[1] = patched_sql``) like the plain pairs callers expect.
+    Snapshots are never mutated, so they are shared with the rewriter, not
+    copied.
+    """
+
+    def __init__(self, rule_id: Any, ast: Node, sql: Optional[str] = None):
+        super().__init__([rule_id, QueryFormatter().format(ast) if sql is None else sql])
+        self.ast = ast
+
+    @property
+    def rule_id(self) -> Any:
+        return self[0]
+
+    @property
+    def sql(self) -> str:
+        return self[1]
+
+
+class RewriteResult(tuple):
+    """The ``(final_sql, rewriting_path)`` pair returned by QueryRewriterV2.rewrite(),
+    with the ``budget`` the rewrite ran under.
+
+    ``exceeded`` names the budget limit that stopped the rewrite, in which case
+    the SQL is the best query reached so far, or is None if the rewrite ran to
+    completion.
+    """
+
+    def __new__(cls, sql: str, rewriting_path: list, budget: "RewriteBudget"):
+        result = super().__new__(cls, (sql, rewriting_path))
+        result.budget = budget
+        return result
+
+    @property
+    def sql(self) -> str:
+        return self[0]
+
+    @property
+    def rewriting_path(self) -> list:
+        return self[1]
+
+    @property
+    def exceeded(self) -> Optional[str]:
+        return self.budget.exceeded
+
+
 # ============================================================================
 # Public QueryRewriterV2 class
 # ============================================================================
@@ -1157,18 +1426,45 @@ class QueryRewriterV2:
         return sqlparse.format(query, reindent=True)
 
     @staticmethod
-    def rewrite(query: str, rules: list, iterate: bool = True) -> Tuple[str, list]:
+    def rewrite(
+        query: str, rules: list, iterate: bool = True,
+        budget: Optional[RewriteBudget] = None,
+        catalog: Optional[SchemaCatalog] = None,
+    ) -> RewriteResult:
         """Rewrite query using rules iteratively.
 
         Each rule dict must be produced by data.rules.get_rule_v2().
         Returns (final_sql, rewriting_path) where rewriting_path is a list of
-        [rule_id, formatted_sql] pairs.
+        RewritingStep, i.e. [rule_id, formatted_sql] lists.
+
+        The rewrite is bounded by ``budget`` (unbounded if None; the server
+        passes a ``RewriteBudget()`` per request). When it runs out, the query
+        reached by the last applied rule is returned and the result's
+        ``exceeded`` (its ``budget.exceeded``) tells which limit was hit; the
+        result unpacks as the (final_sql, rewriting_path) pair.
+
+        If a schema ``catalog`` is given, a rule only applies where its
+        constraints hold (see core.schema_catalog.ConstraintEvaluator).
         """
+        if budget is None:
+            budget = RewriteBudget.unbounded()
+        with budget.running():
+            sql, rewriting_path = QueryRewriterV2._rewrite(query, rules, iterate, budget, catalog)
+            return RewriteResult(sql, rewriting_path, budget)
+
+    @staticmethod
+    def _rewrite(
+        query: str, rules: list, iterate: bool, budget: RewriteBudget,
+        catalog: Optional[SchemaCatalog],
+    ) -> Tuple[str, list]:
         formatter = QueryFormatter()
         parser = QueryParser()
 
-        query_ast = parser.parse(query)
-        rewriting_path: list = []
+        with Profiler.phase("parse"):
+            query_ast = parser.parse(query)
+        rewriting_path: List[RewritingStep] = []
+        # The last step, whose snapshot is normally the current query_ast (its SQL is shared)
+        step: Optional[RewritingStep] = None
 
         # Cycle detection: track canonical SQL strings seen so far
         query_trace: set[str] = set()
@@ -1178,7 +1474,8 @@ class QueryRewriterV2:
         while new_query:
             new_query = False
 
-            formatted = formatter.format(query_ast)
+            with Profiler.phase("format"):
+                formatted = step.sql if step is not None and step.ast is query_ast else formatter.format(query_ast)
             if formatted in query_trace:
                 cycle_found = True
             else:
@@ -1189,23 +1486,44 @@ class QueryRewriterV2:
             # that rule and try another (same query_ast) instead of ending the round.
             excluded: set = set()
             while True:
-                rule_applied, memo_applied = _pick_applicable_rule(query_ast, rules, excluded)
+                try:
+                    budget.check_time()
+                    rule_applied, memo_applied = _pick_applicable_rule(query_ast, rules, excluded, catalog)
+                    if rule_applied is not None:
+                        budget.charge_rewrite_step()
+                except RewriteBudgetExceeded as exc:
+                    logger.warning("Rewrite budget exceeded (%s) after %d steps", exc, len(rewriting_path))
+                    new_query = False
+                    break
                 if rule_applied is None:
                     break
+                Profiler.count("hits", _rule_key(rule_applied))
+                previous_ast = query_ast
                 try:
-                    query_ast = QueryRewriterV2.take_actions(
-                        query_ast, rule_applied, memo_applied
-                    )
-                    query_ast = QueryRewriterV2.replace(
-                        query_ast, rule_applied, memo_applied
-                    )
-                    new_formatted = formatter.format(query_ast)
-                    rewriting_path.append([rule_applied["id"], new_formatted])
+                    with Profiler.phase("take_actions"):
+                        query_ast = QueryRewriterV2.take_actions(
+                            query_ast, rule_applied, memo_applied
+                        )
+                    with Profiler.phase("replace"):
+                        query_ast = QueryRewriterV2.replace(
+                            query_ast, rule_applied, memo_applied
+                        )
                     # Re-parse to normalise (mirrors old parse(format(...)))
-                    query_ast = parser.parse(new_formatted)
+                    with Profiler.phase("format"):
+                        new_formatted = formatter.format(query_ast)
+                    with Profiler.phase("parse"):
+                        query_ast = parser.parse(new_formatted)
+                    step = RewritingStep(rule_applied["id"], query_ast, new_formatted)
+                    rewriting_path.append(step)
                     if not cycle_found and iterate:
                         new_query = True
                     break
+                except RewriteBudgetExceeded as exc:
+                    # out of budget, not a failed rule: keep the query of the last applied rule
+                    logger.warning("Rewrite budget exceeded (%s) after %d steps", exc, len(rewriting_path))
+                    query_ast = previous_ast
+                    new_query = False
+                    break
                 except Exception as exc:
                     logger.warning(
                         "Failed to rewrite with rule %s: %s",
@@ -1215,7 +1533,10 @@ class QueryRewriterV2:
                     )
                     excluded.add(_rule_key(rule_applied))
 
-        return formatter.format(query_ast), rewriting_path
+        with Profiler.phase("format"):
+            if step is not None and step.ast is query_ast:
+                return step.sql, rewriting_path
+            return formatter.format(query_ast), rewriting_path
 
     @staticmethod
     def match(
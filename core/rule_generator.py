@@ -1,38 +1,99 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from typing import Any, Dict, Union, Tuple
-import copy
+import hashlib
 from core.profiler import Profiler
-from core.query_rewriter import QueryRewriter
+from core.query_parser import QueryParser
+from core.query_rewriter import QueryRewriter, VarStart, VarListStart
 from core.rule_parser import RuleParser, Scope, VarType, VarTypesInfo
 import json
 import mo_sql_parsing as mosql
 import numbers
 import re
+import threading
 import time
 
 
 
 MAX_INT = 2147483647
 
+# internal names of Vars/VarLists, e.g., V001, VL001
+InternalVarPattern = re.compile(r'\b(' + VarListStart + '|' + VarStart + r')\d+\b')
+
+# attributes cached in a rule or linking it into a rule graph,
+#   which are not copied into a new rule (see copy_a_rule())
+RuleCachedAttributes = ['fingerPrint', 'children', 'promisingScore', 'coveredExamples', 'transformed', 'visited']
+
+# parsed AST Jsons of rules' pattern_json/rewrite_json strings,
+#   shared by all the rules having the same json string,
+#   so they must never be mutated (transformations copy only the changed paths)
+ASTJSON_CACHE_SIZE = 10000
+astJsonCache = OrderedDict()
+astJsonCacheLock = threading.Lock()
+
+# features of rules' pattern_json/rewrite_json strings (see featuresOf()),
+#   cached the same way as parsed AST Jsons
+FEATURES_CACHE_SIZE = 10000
+featuresCache = OrderedDict()
+featuresCacheLock = threading.Lock()
+
+# keys under which a string or a {'value': ..., 'name': ...} dict is a table
+TableKeys = ['from', 'inner join', 'left outer join', 'left join', 'natural join', 'join']
+
+# default beam width for explore_candidates 'bs' (beam search)
+BEAM_WIDTH = 5
+
 class RuleGenerator:
 
     # Copy the given rule to a new rule
+    #   a rule's own attributes are immutable strings (e.g., pattern_json, mapping),
+    #   so a shallow copy without the cached attributes is enough
     #
     @staticmethod
     def copy_a_rule(rule: dict) -> dict:
-        
-        # create a new rule based on rule
-        new_rule = copy.deepcopy(rule)
-
-        # cleanup attributes
-        if 'fingerPrint' in new_rule:
-            del new_rule['fingerPrint']
-        if 'children' in new_rule:
-            del new_rule['children']
-        if 'promisingScore' in new_rule:
-            del new_rule['promisingScore']
-
-        return new_rule
+        return {key: value for key, value in rule.items() if key not in RuleCachedAttributes}
+    
+    # Load the AST Json of a given pattern_json/rewrite_json string
+    #   the returned AST Json is shared, and must not be mutated
+    #
+    @staticmethod
+    def loadASTJson(astJsonStr: str) -> Any:
+        with astJsonCacheLock:
+            if astJsonStr in astJsonCache:
+                astJsonCache.move_to_end(astJsonStr)
+                return astJsonCache[astJsonStr]
+        astJson = json.loads(astJsonStr)
+        RuleGenerator.cacheASTJson(astJsonStr, astJson)
+        return astJson
+    
+    # Dump a given AST Json into a pattern_json/rewrite_json string,
+    #   and cache the AST Json for later loadASTJson() calls
+    #
+    @staticmethod
+    def dumpASTJson(astJson: Any) -> str:
+        astJsonStr = json.dumps(astJson)
+        RuleGenerator.cacheASTJson(astJsonStr, astJson)
+        return astJsonStr
+    
+    @staticmethod
+    def cacheASTJson(astJsonStr: str, astJson: Any) -> None:
+        with astJsonCacheLock:
+            astJsonCache[astJsonStr] = astJson
+            astJsonCache.move_to_end(astJsonStr)
+            if len(astJsonCache) > ASTJSON_CACHE_SIZE:
+                astJsonCache.popitem(last=False)
+    
+    # Return the given original AST Json node if none of its children is changed in the new node,
+    #   so that unchanged subtrees stay shared between a rule and its transformed rules
+    #
+    @staticmethod
+    def shareUnchanged(node: Any, newNode: Any) -> Any:
+        if QueryRewriter.is_dict(node) and QueryRewriter.is_dict(newNode):
+            if node.keys() == newNode.keys() and all(newNode[key] is node[key] for key in node.keys()):
+                return node
+        elif QueryRewriter.is_list(node) and QueryRewriter.is_list(newNode):
+            if len(node) == len(newNode) and all(newChild is child for child, newChild in zip(node, newNode)):
+                return node
+        return newNode
 
     # Initialize the seed rule for a given rewriting pair q0 -> q1
     #
@@ -242,12 +303,14 @@ class RuleGenerator:
         elif not RuleGenerator.existKeywordInASTJson(node, 'SELECT') and \
             not RuleGenerator.existKeywordInASTJson(node, 'FROM'):
             scope = Scope.WHERE
+            node = dict(node)
             node['select'] = '*'
             node['from'] = 't'
             return node, scope
         # case-3: no SELECT but has FROM
         elif not RuleGenerator.existKeywordInASTJson(node, 'SELECT'):
             scope = Scope.FROM
+            node = dict(node)
             node['select'] = '*'
             return node, scope
         # case-4: has SELECT and has FROM
@@ -273,15 +336,67 @@ class RuleGenerator:
         else:
             return fullSQL.replace('SELECT * FROM t WHERE ', '')
     
+    # Canonical finger-print of a rule, cached in rule['fingerPrint']
+    #   traverse the rule's pattern and rewrite AST Jsons once (dict keys in sorted order),
+    #   rename the Vars/VarLists in their first-occurrence order, and hash the traversal
+    #   e.g., we want to treat these two generated rules as the same rule:
+    #         rule 1: SELECT e1.<x1>, e1.<x2> FROM employee e1 WHERE e1.<x1> > 17 AND e1.<x2> > 35000
+    #         rule 2: SELECT e1.<x2>, e1.<x1> FROM employee e1 WHERE e1.<x2> > 17 AND e1.<x1> > 35000
+    #     but not this one:
+    #         rule 3: SELECT e1.<x1>, e1.<x1> FROM employee e1 WHERE e1.<x1> > 17 AND e1.<x1> > 35000
+    #
     @staticmethod
     def fingerPrint(rule: dict) -> str:
-        # use rule['pattern'] string as finger-print
-        #   and get rid of the numbers inside each var/varList
-        #   e.g., we want to treat these two generated rules as the same rule:
-        #         rule 1: SELECT e1.<x1>, e1.<x2> FROM employee e1 WHERE e1.<x1> > 17 AND e1.<x2> > 35000
-        #         rule 2: SELECT e1.<x2>, e1.<x1> FROM employee e1 WHERE e1.<x2> > 17 AND e1.<x1> > 35000
-        # return RuleGenerator._fingerPrint(rule['pattern'])
-        return RuleGenerator._fingerPrint2(rule['pattern_json'])
+        if 'fingerPrint' not in rule.keys():
+            names = {}
+            tokens = []
+            RuleGenerator.canonicalTokensOfASTJson(RuleGenerator.loadASTJson(rule['pattern_json']), names, tokens)
+            tokens.append('=>')
+            RuleGenerator.canonicalTokensOfASTJson(RuleGenerator.loadASTJson(rule['rewrite_json']), names, tokens)
+            rule['fingerPrint'] = hashlib.sha1('\x1f'.join(tokens).encode('utf-8')).hexdigest()
+        return rule['fingerPrint']
+    
+    # recursively append the canonical tokens of a rule pattern/rewrite's AST Json into tokens
+    #   names keeps the canonical name of each Var/VarList internal name seen so far
+    #
+    @staticmethod
+    def canonicalTokensOfASTJson(astJson: Any, names: dict, tokens: list) -> None:
+        # Case-1: dict
+        #
+        if QueryRewriter.is_dict(astJson):
+            tokens.append('{')
+            for key in sorted(astJson.keys()):
+                tokens.append(RuleGenerator.canonicalName(key, names))
+                RuleGenerator.canonicalTokensOfASTJson(astJson[key], names, tokens)
+            tokens.append('}')
+        # Case-2: list
+        #
+        elif QueryRewriter.is_list(astJson):
+            tokens.append('[')
+            for child in astJson:
+                RuleGenerator.canonicalTokensOfASTJson(child, names, tokens)
+            tokens.append(']')
+        # Case-3: string (including Var, VarList and dot expression)
+        #
+        elif type(astJson) is str:
+            tokens.append('s' + RuleGenerator.canonicalName(astJson, names))
+        # Other cases: number, None
+        #
+        else:
+            tokens.append(repr(astJson))
+    
+    # rename Var/VarList internal names inside the given string in their first-occurrence order
+    #   e.g., 'V003' ==> 'V1', 'e1.V001' ==> 'e1.V2', '%V003%' ==> '%V1%'
+    #
+    @staticmethod
+    def canonicalName(name: str, names: dict) -> str:
+        if VarStart not in name:
+            return name
+        def rename(match: re.Match) -> str:
+            if match.group(0) not in names:
+                names[match.group(0)] = match.group(1) + str(len(names) + 1)
+            return names[match.group(0)]
+        return InternalVarPattern.sub(rename, name)
     
     @staticmethod
     def _fingerPrint(fingerPrint: str) -> str:
@@ -289,159 +404,313 @@ class RuleGenerator:
         fingerPrint = re.sub(r"<x(\d+)>", "<x>", fingerPrint)
         fingerPrint = re.sub(r"<<y(\d+)>>", "<<y>>", fingerPrint)
         return fingerPrint
+
+    # Get the features of a given pattern_json/rewrite_json string
+    #   features include:
+    #     columns       - set of columns, e.g., {'created_at'}
+    #     literals      - dict of literals with their counts, e.g., {'%iphone%': 1}
+    #     tables        - list of tables, e.g., [{'value': 'employee', 'name': 'e1'}]
+    #     subtrees      - list of subtrees, see comments in variablize_subtrees()
+    #     variableLists - list of variable lists, e.g., [['V001', 'V002']]
+    #     branches      - list of branches (starting from root), see comments in drop_branches()
+    #   they are extracted in a single traversal of the AST Json, and cached
+    #   the returned features (and the AST Json nodes inside them) are shared, and must not be mutated
+    #
+    @staticmethod
+    def featuresOf(astJsonStr: str) -> dict:
+        with featuresCacheLock:
+            if astJsonStr in featuresCache:
+                featuresCache.move_to_end(astJsonStr)
+                return featuresCache[astJsonStr]
+        features = RuleGenerator.extractFeatures(RuleGenerator.loadASTJson(astJsonStr))
+        with featuresCacheLock:
+            featuresCache[astJsonStr] = features
+            if len(featuresCache) > FEATURES_CACHE_SIZE:
+                featuresCache.popitem(last=False)
+        return features
     
     @staticmethod
-    def _fingerPrint2(fingerPrint: str) -> str:
-        #   get rid of the numbers inside each var/varList
-        fingerPrint = re.sub(r"V(\d+)", "V", fingerPrint)
-        fingerPrint = re.sub(r"VL(\d+)", "VL", fingerPrint)
-        return fingerPrint
-
-    # transformation function - variablize columns in a rule
-    #   generate a list of child rules 
+    def newFeatures() -> dict:
+        return {'columns': set(), 'literals': {}, 'tables': [], 'subtrees': [], 'variableLists': []}
+    
+    # merge the features of a child node into the features of its parent
     #
     @staticmethod
-    def variablize_columns(rule: dict) -> list:
-
-        Profiler.onFunctionStart('varialize_columns')
-
-        res = []
-
-        # 1. Get candidate columns from rule
-        #
-        columns = RuleGenerator.columns(rule['pattern_json'], rule['rewrite_json'])
-
-        # 2. Traverse candidate columns, make one of them variable, and generate a new rule
-        #
-        for column in columns:
-            res.append(RuleGenerator.variablize_column(rule, column))
-        
-        Profiler.onFunctionEnd('varialize_columns')
-
-        return res
-
-    # get list of common columns in a seed rule's pattern_json and rewrite_json
+    def mergeFeatures(features: dict, childFeatures: dict) -> None:
+        features['columns'].update(childFeatures['columns'])
+        for literal, count in childFeatures['literals'].items():
+            features['literals'][literal] = features['literals'].get(literal, 0) + count
+        features['tables'].extend(childFeatures['tables'])
+        features['subtrees'].extend(childFeatures['subtrees'])
+        features['variableLists'].extend(childFeatures['variableLists'])
+    
+    # extract the features of a rule pattern/rewrite's AST Json
+    #   the root's children are traversed into their own features,
+    #   which decide if they are branches before being merged into the root's features
     #
     @staticmethod
-    def columns(pattern_json: str, rewrite_json: str) -> list:
-        
-        patternASTJson = json.loads(pattern_json)
-        rewriteASTJson = json.loads(rewrite_json)
-
-        # traverse the AST jsons to get all columns
-        patternColumns = RuleGenerator.columnsOfASTJson(patternASTJson, [])
-        rewriteColumns = RuleGenerator.columnsOfASTJson(rewriteASTJson, [])
+    def extractFeatures(astJson: Any) -> dict:
+        features = RuleGenerator.newFeatures()
+        branches = []
 
-        # TODO - patternColumns should be superset of rewriteColumns
+        # a branch only occurs in a dict
         #
-        return list(patternColumns)
+        if QueryRewriter.is_dict(astJson):
+            # if the root itself is a subtree, do not look for subtrees inside it
+            #
+            skipSubtrees = RuleGenerator.isSubtree(astJson)
+            if skipSubtrees:
+                features['subtrees'].append(astJson)
+            for key, value in astJson.items():
+                skipColumns = type(key) is str and key.lower() in ['literal', 'all_columns']
+
+                # special case: there is only one key in the AST Json
+                #   and the value is a list, e.g., {'and': [{'gt': [...]}, {'eq':[...]}]}
+                #   each element in the children list is a branch
+                #
+                if len(astJson.keys()) == 1 and QueryRewriter.is_list(value):
+                    variableList = []
+                    for child in value:
+                        childFeatures = RuleGenerator.newFeatures()
+                        if type(key) is str and key.lower() == 'all_columns':
+                            childFeatures['columns'].add('*')
+                        var = RuleGenerator.varOfListElement(child)
+                        if var is not None:
+                            variableList.append(var)
+                        RuleGenerator.featuresOfASTJson(child, [key], childFeatures, skipColumns, var is not None, skipSubtrees)
+                        RuleGenerator.mergeFeatures(features, childFeatures)
+                        # the element alone in the list is a variable list
+                        #
+                        if var is not None and key in ['select', 'and']:
+                            childFeatures['variableLists'].append([var])
+                        if RuleGenerator.isBranch(childFeatures):
+                            branches.append({'key': key, 'value': child})
+                    if key in ['select', 'and'] and len(variableList) > 0:
+                        features['variableLists'].append(variableList)
+                else:
+                    childFeatures = RuleGenerator.newFeatures()
+                    if type(key) is str and key.lower() == 'all_columns':
+                        childFeatures['columns'].add('*')
+                    RuleGenerator.featuresOfASTJson(value, [key], childFeatures, skipColumns, False, skipSubtrees)
+                    RuleGenerator.mergeFeatures(features, childFeatures)
+                    # special case: there is only one key in the AST Json and the value is not a list
+                    #   e.g., {'select': {'gt': [{'strpos': [{'lower': 'V1'}, {'literal': 'V2'}]}, 0]}}
+                    #     we should remove the parent 'select' 
+                    #       by adding a branch {key: select, value: None}
+                    #
+                    if len(astJson.keys()) == 1:
+                        branches.append({'key': key, 'value': None})
+                    elif RuleGenerator.isBranch(childFeatures):
+                        branches.append({'key': key, 'value': value})
+            
+            # special cases: 
+            #   (1) if {'select': ...} and {'where': ...} present, remove {'from': ...} branch
+            #   (2) if only {'from': ...} presents, remove {'where': ...} branch
+            #
+            if len(astJson.keys()) > 1:
+                if 'select' in astJson.keys() and 'where' in astJson.keys():
+                    branches = [branch for branch in branches if branch['key'] != 'from']
+                if 'select' not in astJson.keys() and 'from' in astJson.keys():
+                    branches = [branch for branch in branches if branch['key'] != 'where']
+        else:
+            RuleGenerator.featuresOfASTJson(astJson, [], features)
+        
+        features['branches'] = branches
+        return features
     
-    # recursively get set of columns in a rule pattern/rewrite's AST Json
+    # recursively collect the features of a rule pattern/rewrite's AST Json into features
+    #   skipColumns - do not collect columns, e.g., under 'literal' key
+    #   skipVariableLists - do not collect variable lists, 
+    #                       e.g., under {'value': 'V001'} which is already in a variable list
+    #   skipSubtrees - do not collect subtrees, e.g., inside a subtree
     #
     @staticmethod
-    def columnsOfASTJson(astJson: Any, path: list) -> set:
-        res = set()
+    def featuresOfASTJson(astJson: Any, path: list, features: dict, skipColumns: bool=False, skipVariableLists: bool=False, skipSubtrees: bool=False) -> None:
 
         # Case-1: dict
         #
         if QueryRewriter.is_dict(astJson):
+            # table format is {'value': ..., 'name': ...}
+            #   e.g., {'from': {'value': 'employee', 'name': 'e1'}} 
+            #         or {'from': [{'value': 'employee', 'name': 'e1'}]}
+            #         or {'inner join': {'value': 'employee', 'name': 'e1'}}
+            #
+            if 'value' in astJson and 'name' in astJson and len(path) >= 1 and path[-1] in TableKeys:
+                features['tables'].append(astJson)
+            # if current node is the root of a subtree
+            #
+            if not skipSubtrees and RuleGenerator.isSubtree(astJson):
+                features['subtrees'].append(astJson)
+                skipSubtrees = True
+            # special case for single node under SELECT clause
+            #   e.g., 'select': {'value': 'V001'}
+            #     extract the variable from child['value']
+            #
+            if not skipVariableLists and len(path) >= 1 and path[-1] in ['select'] and 'value' in astJson and 'name' not in astJson and QueryRewriter.is_var(astJson['value']):
+                features['variableLists'].append([astJson['value']])
+            # recursively traverse the dict
+            #
             for key, value in astJson.items():
-                # skip value of 'literal' as key
+                # skip columns in value of 'literal' as key
                 if type(key) is str and key.lower() == 'literal':
-                    continue
+                    RuleGenerator.featuresOfASTJson(value, path + [key], features, True, skipVariableLists, skipSubtrees)
                 # special case: {'all_columns': 'e1'}
                 #  this is a new change in the mo_sql_parser library,
                 #  to make it compatible with our code, 
                 #  make it as before the '*' column name.
-                if type(key) is str and key.lower() == 'all_columns':
-                    res.add('*')
-                    continue
-                # note: key can not be column, only traverse each value
-                res.update(RuleGenerator.columnsOfASTJson(value, path + [key]))
+                elif type(key) is str and key.lower() == 'all_columns':
+                    if not skipColumns:
+                        features['columns'].add('*')
+                    RuleGenerator.featuresOfASTJson(value, path + [key], features, True, skipVariableLists, skipSubtrees)
+                else:
+                    RuleGenerator.featuresOfASTJson(value, path + [key], features, skipColumns, skipVariableLists, skipSubtrees)
 
         # Case-2: list
         # 
-        if QueryRewriter.is_list(astJson):
+        elif QueryRewriter.is_list(astJson):
+            variableList = []
             for child in astJson:
-                res.update(RuleGenerator.columnsOfASTJson(child, path))
+                var = RuleGenerator.varOfListElement(child)
+                # put Var into the candidate variable list
+                #
+                if var is not None:
+                    variableList.append(var)
+                    if QueryRewriter.is_dict(child):
+                        RuleGenerator.featuresOfASTJson(child, path, features, skipColumns, True, skipSubtrees)
+                # otherwise, recursively traverse the child
+                #
+                else:
+                    RuleGenerator.featuresOfASTJson(child, path, features, skipColumns, skipVariableLists, skipSubtrees)
+            # TODO - currently only consider the variable list under SELECT, AND keys
+            #
+            if not skipVariableLists and len(path) >= 1 and path[-1] in ['select', 'and'] and len(variableList) > 0:
+                features['variableLists'].append(variableList)
 
         # Case-3: string
-        if QueryRewriter.is_string(astJson):
-            # case-1: {'from': 'employee'}
-            #   path = ['from']
-            if len(path) >=1 and path[-1] == 'from':
-                pass
-            # case-2: {'from': [{'value': 'employee', 'name': 'e1'}]}
-            #   path = ['from', 'value']
-            #   path = ['from', 'name']
-            elif len(path) >= 2 and path[-2] == 'from' and path[-1] == 'value':
-                pass
-            elif len(path) >= 2 and path[-2] == 'from' and path[-1] == 'name':
-                pass
-            # case-3: {'from': [..., {'inner join': {'value': 'employee', 'name': 'e1'}}]}
-            #   path = ['inner join', 'value']
-            #   path = ['inner join', 'name']
-            elif len(path) >= 2 and path[-2] == 'inner join' and path[-1] == 'value':
-                pass
-            elif len(path) >= 2 and path[-2] == 'inner join' and path[-1] == 'name':
-                pass
-            # case-4: {'select': [{'value': 'e1.salary', 'name': 'sal'}]}
-            #   path = ['select', 'name']
-            elif len(path) >= 2 and path[-2] == 'select' and path[-1] == 'name':
-                pass
-            # case-5: {'orderby': {..., 'sort': 'asc'}}
-            #   path = ['sort']
-            elif len(path) >= 1 and path[-1] == 'sort':
-                pass
-            # treat '*' as a column for now
-            # # ignore '*'
-            # elif astJson != '*':
-            #     res.add(astJson)
-            else:
-                res.add(astJson)
+        #
+        elif QueryRewriter.is_string(astJson):
+            if not skipColumns and RuleGenerator.isColumnPath(path):
+                # treat '*' as a column for now
+                features['columns'].add(astJson)
+            # case: {'from': 'employee'}, {'inner join': 'employee'}, ...
+            #   treat the table name itself as the alias
+            #
+            if len(path) >= 1 and path[-1] in TableKeys:
+                features['tables'].append({'value': astJson, 'name': astJson})
+            # literal is the value of 'literal' key
+            #   special case for {'literal': '%iphone%'}
+            #   get rid of wildcard chars in a literal
+            #
+            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
+                literal = astJson.replace('%', '')
+                features['literals'][literal] = features['literals'].get(literal, 0) + 1
         
         # Case-4: dot expression
-        if QueryRewriter.is_dot_expression(astJson):
-            # case-1: {'from': 'employee'}
-            #   path = ['from']
-            if len(path) >=1 and path[-1] == 'from':
-                pass
-            # case-2: {'from': [{'value': 'employee', 'name': 'e1'}]}
-            #   path = ['from', 'value']
-            #   path = ['from', 'name']
-            elif len(path) >= 2 and path[-2] == 'from' and path[-1] == 'value':
-                pass
-            elif len(path) >= 2 and path[-2] == 'from' and path[-1] == 'name':
-                pass
-            # case-3: {'from': [..., {'inner join': {'value': 'employee', 'name': 'e1'}}]}
-            #   path = ['inner join', 'value']
-            #   path = ['inner join', 'name']
-            elif len(path) >= 2 and path[-2] == 'inner join' and path[-1] == 'value':
-                pass
-            elif len(path) >= 2 and path[-2] == 'inner join' and path[-1] == 'name':
-                pass
-            # case-4: {'select': [{'value': 'e1.salary', 'name': 'sal'}]}
-            #   path = ['select', 'name']
-            elif len(path) >= 2 and path[-2] == 'select' and path[-1] == 'name':
-                pass
-            # case-5: {'orderby': {..., 'sort': 'asc'}}
-            #   path = ['sort']
-            elif len(path) >= 1 and path[-1] == 'sort':
-                pass
-            else:
+        #
+        elif QueryRewriter.is_dot_expression(astJson):
+            if not skipColumns and RuleGenerator.isColumnPath(path):
                 candidate = astJson.split('.')[-1]
                 # skip case: e1.<a1>
                 #
                 if not QueryRewriter.is_var(candidate) and not QueryRewriter.is_varList(candidate):
-                    # treat '*' as a column for now
-                    # # ignore e1.* in SELECT clause
-                    # #
-                    # if candidate != '*':
-                    #     res.add(candidate)
-                    res.add(candidate)
+                    features['columns'].add(candidate)
+            # case: {'from': 'tablespace.employee'}, {'inner join': 'tablespace.employee'}, ...
+            #   treat the table name itself as the alias
+            #
+            if len(path) >= 1 and path[-1] in TableKeys:
+                features['tables'].append({'value': astJson, 'name': astJson})
+            # false positive, if it is value of 'literal' key
+            #   special case for {'literal': '%iphone.14%'}
+            #
+            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
+                literal = astJson.replace('%', '')
+                features['literals'][literal] = features['literals'].get(literal, 0) + 1
         
-        return res
+        # Case-5: number
+        #
+        elif QueryRewriter.is_number(astJson):
+            features['literals'][astJson] = features['literals'].get(astJson, 0) + 1
+        
+        # Case-6: var
+        #
+        elif QueryRewriter.is_var(astJson):
+            # special case for single Var under SELECT, WHERE, ON
+            #
+            if not skipVariableLists and len(path) >= 1 and path[-1] in ['select', 'where', 'on']:
+                features['variableLists'].append([astJson])
     
+    # get the Var of an element in a list that can be put into a variable list, otherwise None
+    #   e.g., 'V001', or {'value': 'V001'} in a list under SELECT clause
+    #
+    @staticmethod
+    def varOfListElement(child: Any) -> str:
+        if QueryRewriter.is_var(child):
+            return child
+        if QueryRewriter.is_dict(child) and 'value' in child and 'name' not in child and QueryRewriter.is_var(child['value']):
+            return child['value']
+        return None
+    
+    # check if a string or dot expression in a rule pattern/rewrite's AST Json can be a column given its path
+    #
+    @staticmethod
+    def isColumnPath(path: list) -> bool:
+        # case-1: {'from': 'employee'}
+        #   path = ['from']
+        if len(path) >= 1 and path[-1] == 'from':
+            return False
+        # case-2: {'from': [{'value': 'employee', 'name': 'e1'}]}
+        #   path = ['from', 'value']
+        #   path = ['from', 'name']
+        # case-3: {'from': [..., {'inner join': {'value': 'employee', 'name': 'e1'}}]}
+        #   path = ['inner join', 'value']
+        #   path = ['inner join', 'name']
+        if len(path) >= 2 and path[-2] in ['from', 'inner join'] and path[-1] in ['value', 'name']:
+            return False
+        # case-4: {'select': [{'value': 'e1.salary', 'name': 'sal'}]}
+        #   path = ['select', 'name']
+        if len(path) >= 2 and path[-2] == 'select' and path[-1] == 'name':
+            return False
+        # case-5: {'orderby': {..., 'sort': 'asc'}}
+        #   path = ['sort']
+        if len(path) >= 1 and path[-1] == 'sort':
+            return False
+        return True
+
+    # transformation function - variablize columns in a rule
+    #   generate a list of child rules 
+    #
+    @staticmethod
+    def variablize_columns(rule: dict) -> list:
+
+        Profiler.onFunctionStart('varialize_columns')
+
+        res = []
+
+        # 1. Get candidate columns from rule
+        #
+        columns = RuleGenerator.columns(rule['pattern_json'], rule['rewrite_json'])
+
+        # 2. Traverse candidate columns, make one of them variable, and generate a new rule
+        #
+        for column in columns:
+            res.append(RuleGenerator.variablize_column(rule, column))
+        
+        Profiler.onFunctionEnd('varialize_columns')
+
+        return res
+
+    # get list of common columns in a seed rule's pattern_json and rewrite_json
+    #
+    @staticmethod
+    def columns(pattern_json: str, rewrite_json: str) -> list:
+        
+        # get all columns from the features of the AST jsons
+        patternColumns = RuleGenerator.featuresOf(pattern_json)['columns']
+        rewriteColumns = RuleGenerator.featuresOf(rewrite_json)['columns']
+
+        # TODO - patternColumns should be superset of rewriteColumns
+        #
+        return list(patternColumns)
     
     # variablize the given column in given rule and generate a new rule
     #
@@ -459,12 +728,12 @@ class RuleGenerator:
 
         # Replace given column into newVarInternal in new rule
         #
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
         new_rule_pattern_json = RuleGenerator.replaceColumnsOfASTJson(new_rule_pattern_json, [], column, newVarInternal)
         new_rule_rewrite_json = RuleGenerator.replaceColumnsOfASTJson(new_rule_rewrite_json, [], column, newVarInternal)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
 
         # TODO - add newVarInternal is a column constraint into new rule's constraints
 
@@ -488,18 +757,20 @@ class RuleGenerator:
         # Case-1: dict
         #
         if QueryRewriter.is_dict(astJson):
+            res = {}
             for key, value in astJson.items():
                 # skip value of 'literal' as key
                 if type(key) is str and key.lower() == 'literal':
+                    res[key] = value
                     continue
                 # note: key can not be column, only traverse each value
-                astJson[key] = RuleGenerator.replaceColumnsOfASTJson(value, path + [key], column, var)
+                res[key] = RuleGenerator.replaceColumnsOfASTJson(value, path + [key], column, var)
             # special case for {'all_columns': {}} under 'select' key
             #   it can match '*', return {'value': var}
             #
             if 'all_columns' in astJson.keys() and astJson['all_columns'] == {}:
                 return {'value': var}
-            return astJson
+            return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-2: list
         # 
@@ -507,7 +778,7 @@ class RuleGenerator:
             res = []
             for child in astJson:
                 res.append(RuleGenerator.replaceColumnsOfASTJson(child, path, column, var))
-            return res
+            return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-3: string
         if QueryRewriter.is_string(astJson):
@@ -645,13 +916,10 @@ class RuleGenerator:
     #
     @staticmethod
     def literals(pattern_json: str, rewrite_json: str) -> list:
-        patternASTJson = json.loads(pattern_json)
-        rewriteASTJson = json.loads(rewrite_json)
-
-        # traverse the AST jsons to get all literals with their counts
+        # get all literals with their counts from the features of the AST jsons
         #   e.g. patternLiterals: {'%iphone%': 1}
-        patternLiterals = RuleGenerator.literalsOfASTJson(patternASTJson, {})
-        rewriteLiterals = RuleGenerator.literalsOfASTJson(rewriteASTJson, {})
+        patternLiterals = RuleGenerator.featuresOf(pattern_json)['literals']
+        rewriteLiterals = RuleGenerator.featuresOf(rewrite_json)['literals']
 
         # filter out literals that appear more than once in either patternLiterals or rewriteLiterals
         variablizeLiterals = [
@@ -666,49 +934,6 @@ class RuleGenerator:
         # return all literals that either appear more than once or appear in both patternLiterals and rewriteLiterals
         return list(set(variablizeLiterals).union(intersectLiterals))
     
-    # recursively get a dictionary of literals with their counts in a rule pattern/rewrite's AST Json
-    #
-    @staticmethod
-    def literalsOfASTJson(astJson: Any, literalCounts: Dict[str, int], path: list = []) -> Dict[str, int]:
-        # Case-1: dict
-        #
-        if QueryRewriter.is_dict(astJson):
-            for key, value in astJson.items():
-                # note: key can not be literal, only traverse each value
-                RuleGenerator.literalsOfASTJson(value, literalCounts, path + [key])
-
-        # Case-2: list
-        # 
-        if QueryRewriter.is_list(astJson):
-            for child in astJson:
-                RuleGenerator.literalsOfASTJson(child, literalCounts, path)
-
-        # Case-3: string
-        if QueryRewriter.is_string(astJson):
-            # literal is the value of 'literal' key
-            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
-                # special case for {'literal': '%iphone%'}
-                #   get rid of wildcard chars in a literal
-                #
-                literal = str(astJson).replace('%', '')
-                literalCounts[literal] = literalCounts.get(literal, 0) + 1
-
-        # Case-4: dot expression (false positive, if it is value of 'literal' key)
-        if QueryRewriter.is_dot_expression(astJson):
-            # literal is the value of 'literal' key
-            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
-                # special case for {'literal': '%iphone.14%'}
-                #   get rid of wildcard chars in a literal
-                #
-                literal = str(astJson).replace('%', '')
-                literalCounts[literal] = literalCounts.get(literal, 0) + 1
-
-        # Case-5: number
-        if QueryRewriter.is_number(astJson):
-            literalCounts[astJson] = literalCounts.get(astJson, 0) + 1
-
-        return literalCounts
-    
     # variablize the given literal in given rule and generate a new rule
     #
     @staticmethod
@@ -725,12 +950,12 @@ class RuleGenerator:
 
         # Replace given literal into newVarInternal in new rule
         #
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
         new_rule_pattern_json = RuleGenerator.replaceLiteralsOfASTJson(new_rule_pattern_json, [], literal, newVarInternal)
         new_rule_rewrite_json = RuleGenerator.replaceLiteralsOfASTJson(new_rule_rewrite_json, [], literal, newVarInternal)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
 
         # TODO - add newVarInternal is a literal constraint into new rule's constraints
 
@@ -754,267 +979,121 @@ class RuleGenerator:
         # Case-1: dict
         #
         if QueryRewriter.is_dict(astJson):
+            res = {}
             for key, value in astJson.items():
                 # note: key can not be literal, only traverse each value
-                astJson[key] = RuleGenerator.replaceLiteralsOfASTJson(value, path + [key], literal, var)
-            return astJson
+                res[key] = RuleGenerator.replaceLiteralsOfASTJson(value, path + [key], literal, var)
+            return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-2: list
         # 
         if QueryRewriter.is_list(astJson):
             res = []
-            for child in astJson:
-                res.append(RuleGenerator.replaceLiteralsOfASTJson(child, path, literal, var))
-            return res
-
-        # Case-3: string
-        if QueryRewriter.is_string(astJson):
-            # literal is the value of 'literal' key
-            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
-                if astJson == literal:
-                    return var
-                # note: handle special case with wildcard chars, e.g., {'literal': '%iphone%'}
-                #
-                if str(astJson).replace('%', '') == literal:
-                    return str(astJson).replace(literal, var)
-        
-        # Case-4: dot expression (false postive, if it is value of 'literal' key)
-        if QueryRewriter.is_dot_expression(astJson):
-            # literal is the value of 'literal' key
-            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
-                if astJson == literal:
-                    return var
-                # note: handle special case with wildcard chars, e.g., {'literal': '%iphone%'}
-                #
-                if str(astJson).replace('%', '') == literal:
-                    return str(astJson).replace(literal, var)
-        
-        # Case-5: number
-        if QueryRewriter.is_number(astJson):
-            if astJson == literal:
-                return var
-        
-        return astJson
-    
-    # transformation function - variablize tables in a rule
-    #   generate a list of child rules 
-    #
-    @staticmethod
-    def variablize_tables(rule: dict) -> list:
-
-        Profiler.onFunctionStart('varialize_tables')
-
-        res = []
-
-        # 1. Get candidate tables from rule
-        #
-        tables = RuleGenerator.tables(rule['pattern_json'], rule['rewrite_json'])
-
-        # 2. Traverse candidate tables, make one of them variable, and generate a new rule
-        #
-        for table in tables:
-            res.append(RuleGenerator.variablize_table(rule, table))
-        
-        Profiler.onFunctionEnd('varialize_tables')
-
-        return res
-
-    # get list of common tables in a seed rule's pattern_json and rewrite_json
-    #   a table is a dict with name and alias, e.g., {'value': 'employee', 'name': 'e1'}
-    #
-    @staticmethod
-    def tables(pattern_json: str, rewrite_json: str) -> list:
-        
-        patternASTJson = json.loads(pattern_json)
-        rewriteASTJson = json.loads(rewrite_json)
-
-        # traverse the AST jsons to get all tables
-        patternTables = RuleGenerator.tablesOfASTJson(patternASTJson, [])
-        rewriteTables = RuleGenerator.tablesOfASTJson(rewriteASTJson, [])
-
-        # patternTables should be superset of rewriteTables
-        #
-        # the patternSet and the rewriteSet are re-structured from patternTables and rewriteTables.
-        # they are dictioanries with key as table value and value as a list of alias names for that table value
-        #   e.g. patternTables: [{'value': 'employee', 'name': 'e1'}, {'value': 'employee', 'name': 'e2'}]
-        #        patternSet: {'employee': ['e1', 'e2']}
-        #
-        patternSet = defaultdict(list)
-        rewriteSet = defaultdict(list)
-
-        for table in patternTables:
-            if type(table['value']) is str and type(table['name']) is str and table['name'] not in patternSet[table['value']]:
-                patternSet[table['value']].append(table['name'])
-
-        for table in rewriteTables:
-            if type(table['value']) is str and type(table['name']) is str and table['name'] not in rewriteSet[table['value']]:
-                rewriteSet[table['value']].append(table['name'])      
-
-        superSet = []
-        for patternValue, patternNames in patternSet.items():
-            rewriteNames = rewriteSet.get(patternValue, [])
-            patternNames += [name for name in rewriteNames if name not in patternNames]
-            
-            superSet += [{'value': patternValue, 'name': name} for name in patternNames]
-
-        patternTables = superSet
-
-        # deduplicate the list
-        #
-        fingerprints = set()
-        ans = []
-        for table in patternTables:
-            fingerprint = table['value'] + '-' + table['name']
-            if fingerprint not in fingerprints:
-                ans.append(table)
-                fingerprints.add(fingerprint)
-        patternTables = ans
-
-        return patternTables
-    
-    # recursively get set of tables in a rule pattern/rewrite's AST Json
-    #   a table is a dict with name and alias, e.g., {'value': 'employee', 'name': 'e1'}
-    #
-    @staticmethod
-    def tablesOfASTJson(astJson: Any, path: list) -> list:
-        res = []
-
-        # Case-1: dict
-        #
-        if QueryRewriter.is_dict(astJson):
-            # format is {'value': ..., 'name': ...}
-            #
-            if 'value' in astJson and 'name' in astJson:
-                # case-1: {'from': {'value': 'employee', 'name': 'e1'}} 
-                #         or {'from': [{'value': 'employee', 'name': 'e1'}]}
-                #         path = ['from']
-                #
-                if len(path) >= 1 and path[-1] == 'from':
-                    res.append(astJson)
-                # case-2: {'inner join': {'value': 'employee', 'name': 'e1'}}
-                #         path = ['inner join']
-                #
-                elif len(path) >= 1 and path[-1] == 'inner join':
-                    res.append(astJson)
-                # case-3: {'left outer join': {'value': 'employee', 'name': 'e1'}}
-                #         path = ['left outer join']
-                #
-                elif len(path) >= 1 and path[-1] == 'left outer join':
-                    res.append(astJson)
-                # case-4: {'left join': {'value': 'employee', 'name': 'e1'}}
-                #         path = ['left join']
-                #
-                elif len(path) >= 1 and path[-1] == 'left join':
-                    res.append(astJson)
-                # case-5: {'natural join': 'tablespace.employee'}
-                #         path = ['natural join']
-                #
-                elif len(path) >=1 and path[-1] == 'natural join':
-                    res.append(astJson)
-                # case-6: {'join': {'value': 'employee', 'name': 'e1'}}
-                #         path = ['join']
-                #
-                elif len(path) >= 1 and path[-1] == 'join':
-                    res.append(astJson)
-            # recursively traverse the dict
-            #
-            for key, value in astJson.items():
-                # note: key can not be table, only traverse each value
-                res.extend(RuleGenerator.tablesOfASTJson(value, path + [key]))
-
-        # Case-2: list
-        # 
-        if QueryRewriter.is_list(astJson):
-            for child in astJson:
-                res.extend(RuleGenerator.tablesOfASTJson(child, path))
-
-        # Case-3: string
-        if QueryRewriter.is_string(astJson):
-            # case-1: {'from': 'employee'}
-            #         path = ['from']
-            #
-            if len(path) >=1 and path[-1] == 'from':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-2: {'inner join': 'employee'}
-            #         path = ['inner join']
-            #
-            elif len(path) >=1 and path[-1] == 'inner join':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-3: {'left outer join': 'employee'}
-            #         path = ['left outer join']
-            #
-            elif len(path) >=1 and path[-1] == 'left outer join':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-4: {'left join': 'employee'}
-            #         path = ['left join']
-            #
-            elif len(path) >= 1 and path[-1] == 'left join':
-                res.append({'value': astJson, 'name': astJson})
-            # case-5: {'natural join': 'tablespace.employee'}
-            #         path = ['natural join']
-            #
-            elif len(path) >=1 and path[-1] == 'natural join':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-6: {'join': 'employee'}
-            #         path = ['join']
-            #
-            elif len(path) >= 1 and path[-1] == 'join':
-                res.append({'value': astJson, 'name': astJson})
-        
-        # Case-4: dot expression
-        if QueryRewriter.is_dot_expression(astJson):
-            # case-1: {'from': 'tablespace.employee'}
-            #         path = ['from']
-            #
-            if len(path) >=1 and path[-1] == 'from':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-2: {'inner join': 'tablespace.employee'}
-            #         path = ['inner join']
-            #
-            elif len(path) >=1 and path[-1] == 'inner join':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-3: {'left outer join': 'tablespace.employee'}
-            #         path = ['left outer join']
-            #
-            elif len(path) >=1 and path[-1] == 'left outer join':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-4: {'left join': 'tablespace.employee'}
-            #         path = ['left join']
-            #
-            elif len(path) >=1 and path[-1] == 'left join':
-                # treat the table name itself as the alias
-                #
-                res.append({'value': astJson, 'name': astJson})
-            # case-5: {'natural join': 'tablespace.employee'}
-            #         path = ['natural join']
-            #
-            elif len(path) >=1 and path[-1] == 'natural join':
-                # treat the table name itself as the alias
+            for child in astJson:
+                res.append(RuleGenerator.replaceLiteralsOfASTJson(child, path, literal, var))
+            return RuleGenerator.shareUnchanged(astJson, res)
+
+        # Case-3: string
+        if QueryRewriter.is_string(astJson):
+            # literal is the value of 'literal' key
+            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
+                if astJson == literal:
+                    return var
+                # note: handle special case with wildcard chars, e.g., {'literal': '%iphone%'}
                 #
-                res.append({'value': astJson, 'name': astJson})
-            # case-6: {'join': 'tablespace.employee'}
-            #         path = ['join']
-            #
-            elif len(path) >=1 and path[-1] == 'join':
-                # treat the table name itself as the alias
+                if str(astJson).replace('%', '') == literal:
+                    return str(astJson).replace(literal, var)
+        
+        # Case-4: dot expression (false postive, if it is value of 'literal' key)
+        if QueryRewriter.is_dot_expression(astJson):
+            # literal is the value of 'literal' key
+            if len(path) >= 1 and type(path[-1]) is str and path[-1].lower() == 'literal':
+                if astJson == literal:
+                    return var
+                # note: handle special case with wildcard chars, e.g., {'literal': '%iphone%'}
                 #
-                res.append({'value': astJson, 'name': astJson})
+                if str(astJson).replace('%', '') == literal:
+                    return str(astJson).replace(literal, var)
+        
+        # Case-5: number
+        if QueryRewriter.is_number(astJson):
+            if astJson == literal:
+                return var
+        
+        return astJson
+    
+    # transformation function - variablize tables in a rule
+    #   generate a list of child rules 
+    #
+    @staticmethod
+    def variablize_tables(rule: dict) -> list:
+
+        Profiler.onFunctionStart('varialize_tables')
+
+        res = []
+
+        # 1. Get candidate tables from rule
+        #
+        tables = RuleGenerator.tables(rule['pattern_json'], rule['rewrite_json'])
+
+        # 2. Traverse candidate tables, make one of them variable, and generate a new rule
+        #
+        for table in tables:
+            res.append(RuleGenerator.variablize_table(rule, table))
         
+        Profiler.onFunctionEnd('varialize_tables')
+
         return res
+
+    # get list of common tables in a seed rule's pattern_json and rewrite_json
+    #   a table is a dict with name and alias, e.g., {'value': 'employee', 'name': 'e1'}
+    #
+    @staticmethod
+    def tables(pattern_json: str, rewrite_json: str) -> list:
+        
+        # get all tables from the features of the AST jsons
+        patternTables = RuleGenerator.featuresOf(pattern_json)['tables']
+        rewriteTables = RuleGenerator.featuresOf(rewrite_json)['tables']
+
+        # patternTables should be superset of rewriteTables
+        #
+        # the patternSet and the rewriteSet are re-structured from patternTables and rewriteTables.
+        # they are dictioanries with key as table value and value as a list of alias names for that table value
+        #   e.g. patternTables: [{'value': 'employee', 'name': 'e1'}, {'value': 'employee', 'name': 'e2'}]
+        #        patternSet: {'employee': ['e1', 'e2']}
+        #
+        patternSet = defaultdict(list)
+        rewriteSet = defaultdict(list)
+
+        for table in patternTables:
+            if type(table['value']) is str and type(table['name']) is str and table['name'] not in patternSet[table['value']]:
+                patternSet[table['value']].append(table['name'])
+
+        for table in rewriteTables:
+            if type(table['value']) is str and type(table['name']) is str and table['name'] not in rewriteSet[table['value']]:
+                rewriteSet[table['value']].append(table['name'])      
+
+        superSet = []
+        for patternValue, patternNames in patternSet.items():
+            rewriteNames = rewriteSet.get(patternValue, [])
+            patternNames += [name for name in rewriteNames if name not in patternNames]
+            
+            superSet += [{'value': patternValue, 'name': name} for name in patternNames]
+
+        patternTables = superSet
+
+        # deduplicate the list
+        #
+        fingerprints = set()
+        ans = []
+        for table in patternTables:
+            fingerprint = table['value'] + '-' + table['name']
+            if fingerprint not in fingerprints:
+                ans.append(table)
+                fingerprints.add(fingerprint)
+        patternTables = ans
+
+        return patternTables
     
     # variablize the given table in given rule and generate a new rule
     #
@@ -1032,12 +1111,12 @@ class RuleGenerator:
 
         # Replace given table into newVarInternal in new rule
         #
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
         new_rule_pattern_json = RuleGenerator.replaceTablesOfASTJson(new_rule_pattern_json, [], table, newVarInternal)
         new_rule_rewrite_json = RuleGenerator.replaceTablesOfASTJson(new_rule_rewrite_json, [], table, newVarInternal)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
 
         # TODO - add newVarInternal is a table constraint into new rule's constraints
 
@@ -1120,10 +1199,11 @@ class RuleGenerator:
                         return var
             # recursively traverse the dict
             #
+            res = {}
             for key, value in astJson.items():
                 # note: key can not be table, only traverse each value
-                astJson[key] = RuleGenerator.replaceTablesOfASTJson(value, path + [key], table, var)
-            return astJson
+                res[key] = RuleGenerator.replaceTablesOfASTJson(value, path + [key], table, var)
+            return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-2: list
         # 
@@ -1131,7 +1211,7 @@ class RuleGenerator:
             res = []
             for child in astJson:
                 res.append(RuleGenerator.replaceTablesOfASTJson(child, path, table, var))
-            return res
+            return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-3: string
         if QueryRewriter.is_string(astJson):
@@ -1260,12 +1340,10 @@ class RuleGenerator:
     @staticmethod
     def subtrees(pattern_json: str, rewrite_json: str) -> list:
         
-        patternASTJson = json.loads(pattern_json)
-        rewriteASTJson = json.loads(rewrite_json)
-
-        # traverse the AST jsons to get all subtrees
-        patternSubtrees = RuleGenerator.subtreesOfASTJson(patternASTJson, [])
-        rewriteSubtrees = RuleGenerator.subtreesOfASTJson(rewriteASTJson, [])
+        # get all subtrees from the features of the AST jsons
+        #   (copy the lists, since they are shared by the features cache)
+        patternSubtrees = list(RuleGenerator.featuresOf(pattern_json)['subtrees'])
+        rewriteSubtrees = list(RuleGenerator.featuresOf(rewrite_json)['subtrees'])
 
         # find the common subtrees in pattern and rewrite
         #
@@ -1324,38 +1402,6 @@ class RuleGenerator:
                     return False
         return True
     
-    # recursively get set of subtrees in a rule pattern/rewrite's AST Json
-    #
-    @staticmethod
-    def subtreesOfASTJson(astJson: Any, path: list) -> list:
-        res = []
-
-        # Case-1: dict
-        #
-        if QueryRewriter.is_dict(astJson):
-            # if current node is the root of a subtree
-            #
-            if RuleGenerator.isSubtree(astJson):
-                # put in result
-                #
-                res.append(astJson)
-            # otherwise
-            #
-            else:
-                # recursively traverse the dict
-                #
-                for key, value in astJson.items():
-                    # note: key can not be subtree, only traverse each value
-                    res.extend(RuleGenerator.subtreesOfASTJson(value, path + [key]))
-
-        # Case-2: list
-        # 
-        if QueryRewriter.is_list(astJson):
-            for child in astJson:
-                res.extend(RuleGenerator.subtreesOfASTJson(child, path))
-        
-        return res
-    
     # check if a node in rule pattern/rewrite's AST Json is a subtree
     #   see comments in variablize_subtrees() for the definition of a subtree
     #
@@ -1439,12 +1485,12 @@ class RuleGenerator:
 
         # Replace given subtree into newVarInternal in new rule
         #
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
         new_rule_pattern_json = RuleGenerator.replaceSubtreesOfASTJson(new_rule_pattern_json, [], subtree, newVarInternal)
         new_rule_rewrite_json = RuleGenerator.replaceSubtreesOfASTJson(new_rule_rewrite_json, [], subtree, newVarInternal)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
 
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -1487,10 +1533,11 @@ class RuleGenerator:
             else:
                 # recursively traverse the dict
                 #
+                res = {}
                 for key, value in astJson.items():
                     # note: key can not be subtree, only traverse each value
-                    astJson[key] = RuleGenerator.replaceSubtreesOfASTJson(value, path + [key], subtree, var)
-                return astJson
+                    res[key] = RuleGenerator.replaceSubtreesOfASTJson(value, path + [key], subtree, var)
+                return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-2: list
         # 
@@ -1498,7 +1545,7 @@ class RuleGenerator:
             res = []
             for child in astJson:
                 res.append(RuleGenerator.replaceSubtreesOfASTJson(child, path, subtree, var))
-            return res
+            return RuleGenerator.shareUnchanged(astJson, res)
         
         return astJson
     
@@ -1533,12 +1580,9 @@ class RuleGenerator:
     @staticmethod
     def variable_lists(pattern_json: str, rewrite_json: str) -> list:
         
-        patternASTJson = json.loads(pattern_json)
-        rewriteASTJson = json.loads(rewrite_json)
-
-        # traverse the AST jsons to get all variable lists
-        patternVariableLists = RuleGenerator.variableListsOfASTJson(patternASTJson, [])
-        rewriteVariableLists = RuleGenerator.variableListsOfASTJson(rewriteASTJson, [])
+        # get all variable lists from the features of the AST jsons
+        patternVariableLists = RuleGenerator.featuresOf(pattern_json)['variableLists']
+        rewriteVariableLists = RuleGenerator.featuresOf(rewrite_json)['variableLists']
 
         # find the common variable lists in pattern and rewrite
         #   and for each common variable list, find the common variables
@@ -1557,64 +1601,6 @@ class RuleGenerator:
 
         return ans
     
-    # recursively get set of variable lists in a rule pattern/rewrite's AST Json
-    #
-    @staticmethod
-    def variableListsOfASTJson(astJson: Any, path: list) -> list:
-        res = []
-
-        # Case-1: dict
-        #
-        if QueryRewriter.is_dict(astJson):
-            # special case for single node under SELECT clause
-            #   e.g., 'select': {'value': 'V001'}
-            #     extract the variable from child['value']
-            #
-            if len(path) >= 1 and path[-1] in ['select'] and 'value' in astJson and 'name' not in astJson and QueryRewriter.is_var(astJson['value']):
-                res.append([astJson['value']])
-            # recursively traverse the dict
-            #
-            for key, value in astJson.items():
-                # note: key can not be variable list, only traverse each value
-                res.extend(RuleGenerator.variableListsOfASTJson(value, path + [key]))
-
-        # Case-2: list
-        # 
-        if QueryRewriter.is_list(astJson):
-            # traverse the chidlren
-            #
-            variableList = []
-            for child in astJson:
-                # put Var into the candidate variable list
-                #
-                if QueryRewriter.is_var(child):
-                    variableList.append(child)
-                # special case for list under SELECT clause
-                #   e.g., 'select': [{'value': 'V001'}, {'value': 'V002'}, ...]
-                #     extract the variable from child['value']
-                #
-                elif QueryRewriter.is_dict(child) and 'value' in child and 'name' not in child and QueryRewriter.is_var(child['value']):
-                    variableList.append(child['value'])
-                # otherwise, recursively traverse the child
-                #
-                else:
-                    res.extend(RuleGenerator.variableListsOfASTJson(child, path))
-            # TODO - currently only consider the variable list under SELECT, AND keys
-            #
-            if len(path) >= 1 and path[-1] in ['select', 'and'] and len(variableList) > 0:
-                res.append(variableList)
-        
-        # Case-3: var
-        #
-        if QueryRewriter.is_var(astJson):
-            # special case for single Var under SELECT, WHERE, ON
-            #
-            if len(path) >= 1 and path[-1] in ['select', 'where', 'on']:
-            #if len(path) >= 1 and path[-1] in ['select', 'where']:
-                res.append([astJson])
-        
-        return res
-    
     # merge the given variable list in given rule and generate a new rule
     #
     @staticmethod
@@ -1631,12 +1617,12 @@ class RuleGenerator:
 
         # Replace given variable list into newVarListInternal in new rule
         #
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
         new_rule_pattern_json = RuleGenerator.replaceVariableListsOfASTJson(new_rule_pattern_json, [], variableList, newVarListInternal)
         new_rule_rewrite_json = RuleGenerator.replaceVariableListsOfASTJson(new_rule_rewrite_json, [], variableList, newVarListInternal)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
 
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -1670,10 +1656,11 @@ class RuleGenerator:
                     return {'value': varList}
             # recursively traverse the dict
             #
+            res = {}
             for key, value in astJson.items():
                 # note: key can not be variable list, only traverse each value
-                astJson[key] = RuleGenerator.replaceVariableListsOfASTJson(value, path + [key], variableList, varList)
-            return astJson
+                res[key] = RuleGenerator.replaceVariableListsOfASTJson(value, path + [key], variableList, varList)
+            return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-2: list
         # 
@@ -1730,7 +1717,7 @@ class RuleGenerator:
                 else:
                     res.append(RuleGenerator.replaceVariableListsOfASTJson(child, path, variableList, varList))
 
-            return res
+            return RuleGenerator.shareUnchanged(astJson, res)
 
         # Case-3: var
         #
@@ -1779,12 +1766,10 @@ class RuleGenerator:
     @staticmethod
     def branches(pattern_json: str, rewrite_json: str) -> list:
         
-        patternASTJson = json.loads(pattern_json)
-        rewriteASTJson = json.loads(rewrite_json)
-
-        # traverse the AST jsons to get all branches (starting from root)
-        patternBranches = RuleGenerator.branchesOfASTJson(patternASTJson, [])
-        rewriteBranches = RuleGenerator.branchesOfASTJson(rewriteASTJson, [])
+        # get all branches (starting from root) from the features of the AST jsons
+        #   (copy the lists, since they are shared by the features cache)
+        patternBranches = list(RuleGenerator.featuresOf(pattern_json)['branches'])
+        rewriteBranches = list(RuleGenerator.featuresOf(rewrite_json)['branches'])
 
         # find the common branches (starting from root) in pattern and rewrite
         #
@@ -1933,96 +1918,41 @@ class RuleGenerator:
         
         return True
     
-    # get set of branches (starting from root) in a rule pattern/rewrite's AST Json
-    #   output format: [{'key': key, 'value': value}, ...]
-    @staticmethod
-    def branchesOfASTJson(astJson: Any, path: list) -> list:
-        res = []
-
-        # Case-1: dict
-        #
-        # a branch only occurs in a dict
-        if QueryRewriter.is_dict(astJson):
-
-            # special case: there is only one key in the AST Json
-            #
-            if len(astJson.keys()) == 1:
-                key = list(astJson.keys())[0]
-                children = astJson[key]
-
-                # special case (a): the value is a list
-                #   e.g., {'and': [{'gt': [...]}, {'eq':[...]}]}
-                #
-                if QueryRewriter.is_list(children):
-                    # each element in the children list is a branch
-                    #
-                    for child in children:
-                        if RuleGenerator.isBranch({key: [child]}):
-                            res.append({'key': key, 'value': child})
-                # special case (b): the value is not a list
-                #   e.g., {'select': {'gt': [{'strpos': [{'lower': 'V1'}, {'literal': 'V2'}]}, 0]}}
-                #     we should remove the parent 'select' 
-                #       by adding a branch {key: select, value: None}
-                #
-                else:
-                    res.append({'key': key, 'value': None})
-            else:
-                for key, value in astJson.items():
-                    if RuleGenerator.isBranch({key: value}):
-                        res.append({'key': key, 'value': value})
-                
-                # special cases: 
-                #   (1) if {'select': ...} and {'where': ...} present, remove {'from': ...} branch
-                #   (2) if only {'from': ...} presents, remove {'where': ...} branch
-                #
-                if 'select' in astJson.keys() and 'where' in astJson.keys():
-                    res = [branch for branch in res if branch['key'] != 'from']
-                if 'select' not in astJson.keys() and 'from' in astJson.keys():
-                    res = [branch for branch in res if branch['key'] != 'where']
-            
-        
-        return res
-    
-    # check if a subtree (starting from root) in rule pattern/rewrite's AST Json is a branch
+    # check if a subtree (starting from root) in rule pattern/rewrite's AST Json is a branch, given its features
     #   see comments in drop_branches() for the definition of a branch
     #
     @staticmethod
-    def isBranch(astJson: dict) -> bool:
+    def isBranch(features: dict) -> bool:
 
         # check if it has un-variablized tables
         #
-        tables = RuleGenerator.tablesOfASTJson(astJson, [])
-        if len(tables) > 0:
+        if len(features['tables']) > 0:
             return False
 
         # check if it has un-variablized columns
         #
-        columns = RuleGenerator.columnsOfASTJson(astJson, [])
         # special case for {'select': {'all_columns': {}}}, which should be a branch
         #   columns = {'*'}
         #
-        if len(columns) > 0:
-            if len(columns) == 1 and list(columns)[0] == '*':
+        if len(features['columns']) > 0:
+            if len(features['columns']) == 1 and list(features['columns'])[0] == '*':
                 return True
             return False
         
         # check if it has un-variablized literals
         #
-        literals = RuleGenerator.literalsOfASTJson(astJson, {})
-        if len(literals.keys()) > 0:
+        if len(features['literals'].keys()) > 0:
             return False
         
         # ignore this check for now
         # check if it has un-variablized subtrees
         #
-        # subtrees = RuleGenerator.subtreesOfASTJson(astJson, [])
-        # if len(subtrees) > 0:
+        # if len(features['subtrees']) > 0:
         #     return False
 
         # check if it has un-merged variable lists
         #
-        variableLists = RuleGenerator.variableListsOfASTJson(astJson, [])
-        if len(variableLists) > 0:
+        if len(features['variableLists']) > 0:
             return False
 
         return True
@@ -2037,12 +1967,12 @@ class RuleGenerator:
 
         # Drop given branch in new rule
         #
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
         new_rule_pattern_json = RuleGenerator.dropBranchOfASTJson(new_rule_pattern_json, [], branch)
         new_rule_rewrite_json = RuleGenerator.dropBranchOfASTJson(new_rule_rewrite_json, [], branch)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
 
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -2066,10 +1996,10 @@ class RuleGenerator:
         #
         if QueryRewriter.is_dict(astJson):
             # if there are > 2 keys in the AST Json
-            #   remove the branch key directly
+            #   remove the branch key directly (in a new dict, the given AST Json is shared)
             #
             if len(astJson.keys()) > 1:
-                del astJson[branch['key']]
+                astJson = {key: value for key, value in astJson.items() if key != branch['key']}
 
                 # special case: after removing the branch, the root has only one child which is not a list
                 #   e.g., {'where': {'gt': [{'strpos': [{'lower': 'V1'}, {'literal': 'V2'}]}, 0]}}
@@ -2090,7 +2020,7 @@ class RuleGenerator:
                 #   remove the branch value from the children list
                 #
                 if QueryRewriter.is_list(children):
-                    astJson[branch['key']] = [value for value in children if not RuleGenerator.sameBranch(value, branch['value'])]
+                    astJson = {branch['key']: [value for value in children if not RuleGenerator.sameBranch(value, branch['value'])]}
                 
                     # special case: after removing the branch, the chidlren list has only one element
                     #   e.g., {'and': [{'gt': [{'strpos': [{'lower': 'V1'}, {'literal': 'V2'}]}, 0] }] }
@@ -2324,8 +2254,8 @@ class RuleGenerator:
             q0 = example['q0']
             q1 = example['q1']
             q1_test, _ = QueryRewriter.rewrite(q0, [parsed_rule])
-            formatted_q1 = mosql.format(mosql.parse(q1))
-            formatted_q1_test = mosql.format(mosql.parse(q1_test))
+            formatted_q1 = mosql.format(QueryParser().parse_to_dict(q1))
+            formatted_q1_test = mosql.format(QueryParser().parse_to_dict(q1_test))
             if formatted_q1 == formatted_q1_test:
                 ans.append(index)
         
@@ -2399,8 +2329,8 @@ class RuleGenerator:
         # create a new rule based on rule
         new_rule = RuleGenerator.copy_a_rule(rule)
         new_rule_mapping = json.loads(new_rule['mapping'])
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
 
         # Traverse all columns
         for column in columns:
@@ -2417,8 +2347,8 @@ class RuleGenerator:
             # TODO - add newVarInternal is a column constraint into new rule's constraints
         
         new_rule['mapping'] = json.dumps(new_rule_mapping)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
         
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -2453,8 +2383,8 @@ class RuleGenerator:
         # create a new rule based on rule
         new_rule = RuleGenerator.copy_a_rule(rule)
         new_rule_mapping = json.loads(new_rule['mapping'])
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
 
         # Traverse all literals
         for literal in literals:
@@ -2471,8 +2401,8 @@ class RuleGenerator:
             # TODO - add newVarInternal is a literal constraint into new rule's constraints
         
         new_rule['mapping'] = json.dumps(new_rule_mapping)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
         
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -2507,8 +2437,8 @@ class RuleGenerator:
         # create a new rule based on rule
         new_rule = RuleGenerator.copy_a_rule(rule)
         new_rule_mapping = json.loads(new_rule['mapping'])
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
 
         for table in tables:
             # Find a variable name for the given table
@@ -2523,8 +2453,8 @@ class RuleGenerator:
             # TODO - add newVarInternal is a table constraint into new rule's constraints
 
         new_rule['mapping'] = json.dumps(new_rule_mapping)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
         
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -2559,8 +2489,8 @@ class RuleGenerator:
         # create a new rule based on rule
         new_rule = RuleGenerator.copy_a_rule(rule)
         new_rule_mapping = json.loads(new_rule['mapping'])
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
 
         for subtree in subtrees:
             # Find a variable name for the given subtree
@@ -2576,8 +2506,8 @@ class RuleGenerator:
         #
         if (new_rule['pattern_json'] != json.dumps(new_rule_pattern_json)) and (new_rule['rewrite_json'] != json.dumps(new_rule_rewrite_json)):
             new_rule['mapping'] = json.dumps(new_rule_mapping)
-            new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-            new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+            new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+            new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
         
             # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
             #
@@ -2612,8 +2542,8 @@ class RuleGenerator:
         # create a new rule based on rule
         new_rule = RuleGenerator.copy_a_rule(rule)
         new_rule_mapping = json.loads(new_rule['mapping'])
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
 
         for variableList in variableLists:
             # Find a VarList name for the given variable list
@@ -2626,8 +2556,8 @@ class RuleGenerator:
             new_rule_rewrite_json = RuleGenerator.replaceVariableListsOfASTJson(new_rule_rewrite_json, [], variableList, newVarListInternal)
 
         new_rule['mapping'] = json.dumps(new_rule_mapping)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
         
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -2662,8 +2592,8 @@ class RuleGenerator:
         # create a new rule based on rule
         new_rule = RuleGenerator.copy_a_rule(rule)
         new_rule_mapping = json.loads(new_rule['mapping'])
-        new_rule_pattern_json = json.loads(new_rule['pattern_json'])
-        new_rule_rewrite_json = json.loads(new_rule['rewrite_json'])
+        new_rule_pattern_json = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+        new_rule_rewrite_json = RuleGenerator.loadASTJson(new_rule['rewrite_json'])
 
         for branch in branches:
 
@@ -2673,8 +2603,8 @@ class RuleGenerator:
             new_rule_rewrite_json = RuleGenerator.dropBranchOfASTJson(new_rule_rewrite_json, [], branch)
 
         new_rule['mapping'] = json.dumps(new_rule_mapping)
-        new_rule['pattern_json'] = json.dumps(new_rule_pattern_json)
-        new_rule['rewrite_json'] = json.dumps(new_rule_rewrite_json)
+        new_rule['pattern_json'] = RuleGenerator.dumpASTJson(new_rule_pattern_json)
+        new_rule['rewrite_json'] = RuleGenerator.dumpASTJson(new_rule_rewrite_json)
         
         # Deparse new rule's pattern_json/rewrite_json into pattern/rewrite strings
         #
@@ -2735,10 +2665,17 @@ class RuleGenerator:
     #                            }
     #                         ]
     #
+    #   exp - explore_candidates approach: 'bf', 'khn', 'mpn', 'bs'
+    #   w   - beam width for 'bs'
+    #   t   - wall-clock budget in seconds (None means unbounded),
+    #         when it expires the best rule set found so far is returned
+    #
     @staticmethod
-    def suggest_rules(examples: list, exp: str='bf', k: int=1, m: int=5, profile: dict={}) -> list:
+    def suggest_rules(examples: list, exp: str='bf', k: int=1, m: int=5, w: int=BEAM_WIDTH, t: float=None, profile: dict={}) -> list:
 
         start = time.time()
+        deadline = start + t if t is not None else None
+        timeout = False
 
         ans = []
 
@@ -2751,9 +2688,15 @@ class RuleGenerator:
         cnts_candidates = []
         while True:
 
+            # stop when the time budget expires
+            #
+            if deadline is not None and time.time() >= deadline:
+                timeout = True
+                break
+
             # Explore candidates based on current answer
             #
-            candidates = RuleGenerator.explore_candidates(baseRules=ans, exp=exp, k=k, m=m)
+            candidates = RuleGenerator.explore_candidates(baseRules=ans, exp=exp, k=k, m=m, w=w, deadline=deadline)
             cnt_iterations += 1
             cnts_candidates.append(len(candidates))
 
@@ -2762,6 +2705,12 @@ class RuleGenerator:
 
             for i in range(len(candidates)):
 
+                # only consider the candidates evaluated so far when the time budget expires
+                #
+                if deadline is not None and time.time() >= deadline:
+                    timeout = True
+                    break
+
                 candidate = candidates[i]
 
                 # find rules in answer that can be replaced by candidate
@@ -2784,11 +2733,15 @@ class RuleGenerator:
 
             ans = [r for r in ans if r not in to_be_replaced_rules[imax]]
             ans.append(icandidate)
+
+            if timeout:
+                break
         
         end = time.time()
         profile['time'] = end - start
         profile['cnt_iterations'] = cnt_iterations
         profile['cnts_candidates'] = cnts_candidates
+        profile['timeout'] = timeout
         
         return ans
     
@@ -2919,13 +2872,15 @@ class RuleGenerator:
     # explore candidate rules for a given list of base rules
     #
     @staticmethod
-    def explore_candidates(baseRules: list, exp: str, k: int, m: int) -> list:
+    def explore_candidates(baseRules: list, exp: str, k: int, m: int, w: int=BEAM_WIDTH, deadline: float=None) -> list:
         if exp == 'bf':
             return RuleGenerator.explore_candidates_bf(baseRules)
         elif exp == 'khn':
             return RuleGenerator.explore_candidates_khn(baseRules, k=k)
         elif exp == 'mpn':
             return RuleGenerator.explore_candidates_mpn(baseRules, m=m)
+        elif exp == 'bs':
+            return RuleGenerator.explore_candidates_bs(baseRules, w=w, deadline=deadline)
         
         return RuleGenerator.explore_candidates_bf(baseRules)
     
@@ -3159,6 +3114,84 @@ class RuleGenerator:
         
         return ans
     
+    # explore candidate rules for a given list of base rules
+    #   (4) beam search
+    #
+    # Starting from the base rules, expand one level of the rule graph at a time 
+    #   and only keep the w most promising new rules (ties broken by shorter description length) 
+    #   as the beam for the next level.
+    # Stop when the beam is empty or the deadline (time.time() based) is reached,
+    #   and return the candidates found so far.
+    #
+    @staticmethod
+    def explore_candidates_bs(baseRules: list, w: int, deadline: float=None) -> list:
+
+        ans = []
+
+        # Initialize ans and the first beam with all the base rules
+        #
+        visited = {}
+        for baseRule in baseRules:
+            # Cache finger print in rule
+            #
+            if 'fingerPrint' not in baseRule.keys():
+                baseRule['fingerPrint'] = RuleGenerator.fingerPrint(baseRule)
+            visited[baseRule['fingerPrint']] = baseRule
+            # Put base rule in the candidate set
+            #
+            ans.append(baseRule)
+        
+        # Promising scores depend on the given base rules, 
+        #   so they are computed per exploration instead of cached in rules
+        #
+        scores = {}
+
+        # Beam Search
+        #   stop when the beam is empty or reaching the deadline
+        #
+        beam = list(baseRules)
+        while len(beam) > 0:
+            frontier = []
+            for baseRule in beam:
+                if deadline is not None and time.time() >= deadline:
+                    break
+                # First time transform a rule
+                #
+                if 'children' not in baseRule.keys():
+                    baseRule['children'] = []
+                    # generate children from the baseRule
+                    #   by applying each transformation on baseRule
+                    #
+                    for transform in RuleGenerator.RuleTransformations.keys():
+                        childrenRules = getattr(RuleGenerator, transform)(baseRule)
+                        for childRule in childrenRules:
+                            # Cache finger print in rule
+                            #
+                            childRule['fingerPrint'] = RuleGenerator.fingerPrint(childRule)
+                            # reuse childRule if it has been visited (generated from an ealier baseRule)
+                            #
+                            if childRule['fingerPrint'] in visited.keys():
+                                childRule = visited[childRule['fingerPrint']]
+                            baseRule['children'].append(childRule)
+                    baseRule['transformed'] = True
+                # Collect children that have not been visited into the frontier
+                #
+                for childRule in baseRule['children']:
+                    if childRule['fingerPrint'] not in visited.keys():
+                        visited[childRule['fingerPrint']] = childRule
+                        scores[childRule['fingerPrint']] = (- RuleGenerator.promisingScore(childRule, baseRules), RuleGenerator.description_length(childRule))
+                        frontier.append(childRule)
+            
+            # Keep the w most promising rules in the frontier as the next beam
+            #
+            beam = sorted(frontier, key=lambda x: scores[x['fingerPrint']])[:w]
+            ans.extend(beam)
+
+            if deadline is not None and time.time() >= deadline:
+                break
+        
+        return ans
+    
     # Compute the promising score of a given rule on the given set of base rules
     #
     @staticmethod
@@ -3604,21 +3637,35 @@ class RuleGenerator:
 #    Function is used to check common mispellings of words. Used to see if
 #    Used to see if query has mispelled key words such as SELECT, FROM or WHERE
     @staticmethod
-    def levDistance(a: str, b: str) -> int:
+    def levDistance(a: str, b: str, maxDistance: int=None) -> int:
+        #    Iterative dynamic programming keeping only the previous row of the matrix,
+        #    O(len(a) * len(b)) time and O(len(b)) space
+        #    If maxDistance is given, stop as soon as the distance must exceed it,
+        #    and return maxDistance + 1
+        if maxDistance is not None and abs(len(a) - len(b)) > maxDistance:
+            return maxDistance + 1
         #    If b is empty, all characters in a are different from b
         if len(b) == 0:
             return len(a)
         #    If a is empty, all character in b are different from a
         if len(a) == 0:
             return len(b)
-        #    If the first character is the same, no difference
-        if a[0] == b[0]:
-            #    recursivley check the next characters
-            return RuleGenerator.levDistance(a[1:], b[1:])
-        
-        #   add 1 to the difference and recursivley check the next characters by removing two or one 
-        #    character to see which one causes the minimum difference 
-        return 1 + min(RuleGenerator.levDistance(a[1:], b), RuleGenerator.levDistance(a, b[1:]), RuleGenerator.levDistance(a[1:], b[1:]))
+        #    previous[j] is the distance between the first i characters of a and the first j characters of b
+        previous = list(range(len(b) + 1))
+        for i, ca in enumerate(a, 1):
+            current = [i]
+            for j, cb in enumerate(b, 1):
+                #    If the characters are the same, no difference,
+                #    otherwise add 1 to the minimum of removing, inserting or substituting a character
+                if ca == cb:
+                    current.append(previous[j - 1])
+                else:
+                    current.append(1 + min(previous[j], current[j - 1], previous[j - 1]))
+            #    every path to the end passes through this row, so its minimum is a lower bound
+            if maxDistance is not None and min(current) > maxDistance:
+                return maxDistance + 1
+            previous = current
+        return previous[-1]
 
     # Case 1: Check for spelling erros in first word that defines the scope of the query 
     #    Uses levDistance to see if there is a mispelling in SELECT, FROM or WHERE
@@ -3663,9 +3710,9 @@ class RuleGenerator:
         #case 1, check if there is a mispelling with keywords that define scope
         for value in ScopeInfo.values():
             if value != "CONDITION":
-                if RuleGenerator.levDistance(value, pattern_split[0]) == 1:
+                if RuleGenerator.levDistance(value, pattern_split[0], 1) == 1:
                     return False, "possible spelling error at query 1" +  pattern_split[0] + " instead of " + value, 0
-                if RuleGenerator.levDistance(value, rewrite_split[0]) == 1:
+                if RuleGenerator.levDistance(value, rewrite_split[0], 1) == 1:
                     return False, "possible spelling error at query 2" +  pattern_split[0] + " instead of " + value, 0
 
         #replace variables so mosql can parse
@@ -3748,7 +3795,7 @@ class RuleGenerator:
         #case 1, check if there is a mispelling with keywords that define scope
         for value in ScopeInfo.values():
             if value != "CONDITION":
-                if RuleGenerator.levDistance(value, pattern_split[0]) == 1:
+                if RuleGenerator.levDistance(value, pattern_split[0], 1) == 1:
                     return False, "possible spelling error at query 1" +  pattern_split[0] + " instead of " + value, 0
             
         #replace variables so mosql can parse
@@ -0,0 +1,437 @@
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Optional
+import mo_sql_parsing as mosql
+import os
+import sqlite3
+import sqlparse
+import threading
+
+from core.ast.node import ColumnNode, DataTypeNode, FunctionNode, LiteralNode, Node, SubqueryNode, TableNode
+
+
+# loaded catalogs (see SchemaCatalog.load()), keyed by the source file's absolute path
+#   and invalidated when the file's modification time or size changes
+CATALOG_CACHE_SIZE = 64
+_catalog_cache = OrderedDict()
+_catalog_cache_lock = threading.Lock()
+
+# literal variables of the rules (see ConstraintEvaluator._literal_vars()): rule id -> (pattern_json, variables),
+#   kept out of the rule dicts, which are shared by the request threads (see RuleManager.fetch_enabled_rules()),
+#   an entry is only used for the very pattern_json it was computed from
+_literal_vars = {}
+_literal_vars_lock = threading.Lock()
+
+# SQL type name -> type family that rule constraints compare, e.g., TYPE(x)=TEXT holds for a VARCHAR column
+#   a type not listed here is its own family
+TYPE_FAMILIES = {
+    'string': 'string', 'text': 'string', 'varchar': 'string', 'char': 'string', 'character': 'string',
+    'character_varying': 'string', 'nvarchar': 'string', 'nchar': 'string', 'bpchar': 'string', 'clob': 'string',
+    'tinytext': 'string', 'mediumtext': 'string', 'longtext': 'string',
+    'date': 'date',
+    'timestamp': 'timestamp', 'datetime': 'timestamp', 'timestamptz': 'timestamp',
+    'timestamp_with_time_zone': 'timestamp', 'timestamp_without_time_zone': 'timestamp',
+    'int': 'integer', 'integer': 'integer', 'smallint': 'integer', 'bigint': 'integer', 'tinyint': 'integer',
+    'int2': 'integer', 'int4': 'integer', 'int8': 'integer', 'serial': 'integer', 'bigserial': 'integer',
+    'numeric': 'numeric', 'decimal': 'numeric', 'real': 'numeric', 'float': 'numeric', 'double': 'numeric',
+    'double_precision': 'numeric', 'float4': 'numeric', 'float8': 'numeric',
+    'bool': 'boolean', 'boolean': 'boolean',
+}
+
+
+# Schema catalog of one application's database: column types, unique keys and foreign keys of its tables,
+#   e.g., catalog.tables['tweets'] = {
+#           'columns': {'id': 'integer', 'created_at': 'date', 'text': 'text'},
+#           'unique_keys': [('id',)],
+#           'foreign_keys': [(('user_id',), 'users', ('id',))]
+#         }
+#   Note: identifiers are case-insensitive (lower-cased), types are normalized names such as
+#         'varchar' or 'timestamp_with_time_zone' (see TYPE_FAMILIES)
+#
+class SchemaCatalog:
+
+    def __init__(self) -> None:
+        self.tables = {}
+
+    def add_table(self, table: str) -> dict:
+        return self.tables.setdefault(table.lower(), {'columns': {}, 'unique_keys': [], 'foreign_keys': []})
+
+    def column_type(self, table: str, column: str) -> Optional[str]:
+        entry = self.tables.get(table.lower())
+        return entry['columns'].get(column.lower()) if entry is not None else None
+
+    # Whether the given columns of the table are unique, i.e., a unique key (or the primary key) is a subset of them
+    #   returns None if the table is unknown
+    #
+    def is_unique(self, table: str, columns: list) -> Optional[bool]:
+        entry = self.tables.get(table.lower())
+        if entry is None:
+            return None
+        columns = {column.lower() for column in columns}
+        return any(set(key) <= columns for key in entry['unique_keys'])
+
+    # Whether the columns of the table reference the columns of ref_table through a foreign key
+    #   returns None if the table is unknown
+    #
+    def references(self, table: str, columns: list, ref_table: str, ref_columns: list) -> Optional[bool]:
+        entry = self.tables.get(table.lower())
+        if entry is None:
+            return None
+        target = (tuple(column.lower() for column in columns), ref_table.lower(), tuple(column.lower() for column in ref_columns))
+        return target in entry['foreign_keys']
+
+    # Load the catalog of a DDL file (.sql) or a SQLite database (any other extension),
+    #   each file is loaded once and then served from memory until it changes on disk
+    #
+    @staticmethod
+    def load(path: str) -> 'SchemaCatalog':
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with _catalog_cache_lock:
+            cached = _catalog_cache.get(path)
+            if cached is not None and cached[0] == version:
+                _catalog_cache.move_to_end(path)
+                return cached[1]
+        if path.lower().endswith('.sql'):
+            with open(path, encoding='utf-8') as ddl_file:
+                catalog = SchemaCatalog.from_ddl(ddl_file.read())
+        else:
+            catalog = SchemaCatalog.from_sqlite(path)
+        with _catalog_cache_lock:
+            _catalog_cache[path] = (version, catalog)
+            _catalog_cache.move_to_end(path)
+            while len(_catalog_cache) > CATALOG_CACHE_SIZE:
+                _catalog_cache.popitem(last=False)
+        return catalog
+
+    @staticmethod
+    def clear_cache() -> None:
+        with _catalog_cache_lock:
+            _catalog_cache.clear()
+
+    # Build a catalog from the CREATE TABLE statements of a DDL script,
+    #   other statements (and statements the SQL parser does not support) are skipped
+    #
+    @staticmethod
+    def from_ddl(ddl: str) -> 'SchemaCatalog':
+        catalog = SchemaCatalog()
+        for statement in sqlparse.split(ddl):
+            if not statement.lstrip().lower().startswith('create table'):
+                continue
+            try:
+                create = mosql.parse(statement)['create table']
+            except Exception:
+                continue
+            entry = catalog.add_table(create['name'])
+            for column in SchemaCatalog._as_list(create.get('columns')):
+                name = column['name'].lower()
+                entry['columns'][name] = SchemaCatalog.normalize_type(column.get('type'))
+                if column.get('primary_key') or column.get('unique'):
+                    entry['unique_keys'].append((name,))
+                if 'references' in column:
+                    SchemaCatalog._add_foreign_key(entry, name, column['references'])
+            for constraint in SchemaCatalog._as_list(create.get('constraint')):
+                if 'primary_key' in constraint:
+                    entry['unique_keys'].append(SchemaCatalog._columns(constraint['primary_key']['columns']))
+                elif 'index' in constraint and constraint['index'].get('unique'):
+                    entry['unique_keys'].append(SchemaCatalog._columns(constraint['index']['columns']))
+                elif 'foreign_key' in constraint:
+                    foreign_key = constraint['foreign_key']
+                    SchemaCatalog._add_foreign_key(entry, foreign_key['columns'], foreign_key['references'])
+        return catalog
+
+    # Build a catalog from the schema of a (local stand-in) SQLite database
+    #
+    @staticmethod
+    def from_sqlite(path: str) -> 'SchemaCatalog':
+        catalog = SchemaCatalog()
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            tables = [row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            for table in tables:
+                entry = catalog.add_table(table)
+                primary_key = []
+                # rows of (cid, name, type, notnull, dflt_value, pk)
+                for _, name, type, _, _, pk in connection.execute(f'PRAGMA table_info("{table}")'):
+                    entry['columns'][name.lower()] = SchemaCatalog.normalize_type(type)
+                    if pk:
+                        primary_key.append((pk, name.lower()))
+                if primary_key:
+                    entry['unique_keys'].append(tuple(name for _, name in sorted(primary_key)))
+                # rows of (seq, name, unique, origin, partial)
+                for index in connection.execute(f'PRAGMA index_list("{table}")'):
+                    if index[2] and not index[4]:
+                        entry['unique_keys'].append(tuple(
+                            row[2].lower() for row in connection.execute(f'PRAGMA index_info("{index[1]}")')))
+                # rows of (id, seq, table, from, to, on_update, on_delete, match), one per column of a key
+                foreign_keys = OrderedDict()
+                for row in connection.execute(f'PRAGMA foreign_key_list("{table}")'):
+                    foreign_keys.setdefault((row[0], row[2]), []).append((row[3], row[4]))
+                for (_, ref_table), pairs in foreign_keys.items():
+                    entry['foreign_keys'].append((
+                        tuple(column.lower() for column, _ in pairs),
+                        ref_table.lower(),
+                        tuple((ref_column or column).lower() for column, ref_column in pairs)))
+        finally:
+            connection.close()
+        return catalog
+
+    # Normalize a SQL type (a mo_sql_parsing type, e.g., {'varchar': 255}, or a type string, e.g., 'VARCHAR(255)')
+    #   to its lower-cased name without parameters, e.g., 'varchar'
+    #
+    @staticmethod
+    def normalize_type(sql_type: Any) -> Optional[str]:
+        if isinstance(sql_type, dict):
+            sql_type = next(iter(sql_type), None)
+        if not isinstance(sql_type, str) or not sql_type.strip():
+            return None
+        return '_'.join(sql_type.split('(')[0].lower().split())
+
+    @staticmethod
+    def type_family(sql_type: Optional[str]) -> Optional[str]:
+        if sql_type is None:
+            return None
+        sql_type = SchemaCatalog.normalize_type(sql_type)
+        return TYPE_FAMILIES.get(sql_type, sql_type)
+
+    @staticmethod
+    def _as_list(value: Any) -> list:
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    @staticmethod
+    def _columns(columns: Any) -> tuple:
+        return tuple(column.lower() for column in SchemaCatalog._as_list(columns))
+
+    @staticmethod
+    def _add_foreign_key(entry: dict, columns: Any, references: dict) -> None:
+        entry['foreign_keys'].append((
+            SchemaCatalog._columns(columns),
+            references['table'].lower(),
+            SchemaCatalog._columns(references.get('columns'))))
+
+
+# Evaluate a rule's constraints (constraints_json, see RuleParser.parse_constraints()) against a schema catalog
+#   for the variables bound by a match, e.g.,
+#     [{'operator': '=', 'operands': [{'function': 'type', 'variables': ['V001']}, 'date']}]
+#     [{'operator': '=', 'operands': [{'function': 'unique', 'variables': ['V001', 'V004']}, 'true']}]
+#   Supported predicates:
+#     TYPE(x) = <type>            - x is a column (or a literal/cast) of the type's family
+#     IS(x) = CONSTANT / COLUMN   - x is a literal / a column reference
+#     UNIQUE(t, a1, ...)          - columns a1, ... of table t are unique
+#     FK(t1, a1, t2, a2)          - column a1 of table t1 references column a2 of table t2
+#     x = y                       - x and y are bound to the same value (tables compare by name)
+#   Note: a predicate the catalog cannot decide (e.g., an unknown column) is unsatisfied,
+#         so that a rule is never applied unless it is known to be safe
+#
+class ConstraintEvaluator:
+
+    # Whether the rule's constraints hold for a match (memo) of the rule in query,
+    #   query is a mo_sql_parsing dict (QueryRewriter) or a Node (QueryRewriterV2)
+    #
+    @staticmethod
+    def evaluate(rule: dict, memo: dict, query: Any, catalog: SchemaCatalog) -> bool:
+        constraints = rule.get('constraints_json') or []
+        if not constraints:
+            return True
+        context = {
+            'rule': rule,
+            'memo': memo,
+            'catalog': catalog,
+            'aliases': ConstraintEvaluator.table_aliases(query),
+            'literals': ConstraintEvaluator._literal_vars(rule),
+        }
+        for condition in constraints:
+            if condition.get('operator') != '=' or len(condition.get('operands', [])) != 2:
+                return False
+            left, right = [ConstraintEvaluator._operand(operand, context) for operand in condition['operands']]
+            if left is None or right is None or left != right:
+                return False
+        return True
+
+    # Collect {alias or table name: table name} of the tables referenced anywhere in the query
+    #
+    @staticmethod
+    def table_aliases(query: Any) -> dict:
+        aliases = {}
+        stack = [query]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Node):
+                if isinstance(node, TableNode):
+                    aliases[node.name.lower()] = node.name.lower()
+                    if node.alias:
+                        aliases[node.alias.lower()] = node.name.lower()
+                stack.extend(node.children)
+            elif isinstance(node, dict):
+                for key, value in node.items():
+                    if key in ('from', 'join', 'inner join', 'left join', 'left outer join', 'right join',
+                               'right outer join', 'full join', 'full outer join', 'cross join'):
+                        for source in value if isinstance(value, list) else [value]:
+                            if isinstance(source, str):
+                                aliases[source.lower()] = source.lower()
+                            elif isinstance(source, dict) and isinstance(source.get('value'), str):
+                                aliases[source['value'].lower()] = source['value'].lower()
+                                if isinstance(source.get('name'), str):
+                                    aliases[source['name'].lower()] = source['value'].lower()
+                    stack.append(value)
+            elif isinstance(node, list):
+                stack.extend(node)
+        return aliases
+
+    # Evaluate one operand to a comparable value: a type family, True/False, 'constant'/'column',
+    #   a bound value or a constant string (None if it cannot be decided)
+    #
+    @staticmethod
+    def _operand(operand: Any, context: dict) -> Any:
+        if isinstance(operand, dict):
+            function = operand.get('function', '').strip().lower()
+            variables = [variable.strip() for variable in operand.get('variables', [])]
+            if any(ConstraintEvaluator._var(variable, context) not in context['memo'] for variable in variables):
+                return None
+            values = [context['memo'][ConstraintEvaluator._var(variable, context)] for variable in variables]
+            if function == 'type' and len(values) == 1:
+                return ConstraintEvaluator._type_of(values[0], ConstraintEvaluator._var(variables[0], context), context)
+            if function == 'is' and len(values) == 1:
+                return ConstraintEvaluator._kind_of(values[0], ConstraintEvaluator._var(variables[0], context), context)
+            if function == 'unique' and len(values) >= 2:
+                table = ConstraintEvaluator._table_name(values[0], context)
+                columns = [ConstraintEvaluator._column_name(value) for value in values[1:]]
+                if table is None or None in columns:
+                    return None
+                return context['catalog'].is_unique(table, columns)
+            if function == 'fk' and len(values) == 4:
+                table, ref_table = [ConstraintEvaluator._table_name(values[i], context) for i in (0, 2)]
+                column, ref_column = [ConstraintEvaluator._column_name(values[i]) for i in (1, 3)]
+                if None in (table, column, ref_table, ref_column):
+                    return None
+                return context['catalog'].references(table, [column], ref_table, [ref_column])
+            return None
+        if not isinstance(operand, str):
+            return operand
+        operand = operand.strip()
+        variable = ConstraintEvaluator._var(operand, context)
+        if variable in context['memo']:
+            value = context['memo'][variable]
+            table = ConstraintEvaluator._table_name(value, context)
+            return ('table', table) if table is not None and not isinstance(value, str) else ('value', value)
+        if operand.lower() == 'true':
+            return True
+        if operand.lower() == 'false':
+            return False
+        if operand.lower() in ('constant', 'column'):
+            return operand.lower()
+        return SchemaCatalog.type_family(operand)
+
+    # Internal variable name of a constraint variable (constraints keep unmapped names, e.g., ' t2')
+    #
+    @staticmethod
+    def _var(variable: str, context: dict) -> str:
+        if variable in context['memo']:
+            return variable
+        mapping = context['rule'].get('mapping') or {}
+        return mapping.get(variable, variable) if isinstance(mapping, dict) else variable
+
+    # Variables of a mo_sql_parsing pattern bound inside a literal, e.g., 'V002' in {"literal": "V002"},
+    #   which QueryRewriter binds to the literal's content
+    #
+    @staticmethod
+    def _literal_vars(rule: dict) -> frozenset:
+        pattern = rule.get('pattern_json')
+        with _literal_vars_lock:
+            cached = _literal_vars.get(rule.get('id'))
+        if cached is not None and cached[0] is pattern:
+            return cached[1]
+        literals = set()
+        stack = [pattern]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                if isinstance(node.get('literal'), str):
+                    literals.add(node['literal'])
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                stack.extend(node)
+        literals = frozenset(literals)
+        with _literal_vars_lock:
+            _literal_vars[rule.get('id')] = (pattern, literals)
+        return literals
+
+    @staticmethod
+    def _type_of(value: Any, variable: str, context: dict) -> Optional[str]:
+        if variable in context['literals']:
+            return 'string'
+        if isinstance(value, LiteralNode):
+            value = value.value
+        elif isinstance(value, ColumnNode):
+            return ConstraintEvaluator._column_type(value.parent_alias, value.name, context)
+        elif isinstance(value, FunctionNode):
+            if value.name.lower() == 'cast':
+                data_types = [child for child in value.children if isinstance(child, DataTypeNode)]
+                return SchemaCatalog.type_family(data_types[0].name) if data_types else None
+            return None
+        if isinstance(value, bool):
+            return 'boolean'
+        if isinstance(value, int):
+            return 'integer'
+        if isinstance(value, float):
+            return 'numeric'
+        if isinstance(value, datetime):
+            return 'timestamp'
+        if isinstance(value, date):
+            return 'date'
+        if isinstance(value, str):
+            parts = value.split('.')
+            return ConstraintEvaluator._column_type(parts[-2] if len(parts) > 1 else None, parts[-1], context)
+        if isinstance(value, dict):
+            if 'literal' in value:
+                return 'string'
+            if isinstance(value.get('cast'), list) and len(value['cast']) == 2:
+                return SchemaCatalog.type_family(value['cast'][1])
+        return None
+
+    @staticmethod
+    def _column_type(qualifier: Optional[str], column: str, context: dict) -> Optional[str]:
+        catalog, aliases = context['catalog'], context['aliases']
+        if qualifier is not None:
+            table = aliases.get(qualifier.lower(), qualifier)
+            return SchemaCatalog.type_family(catalog.column_type(table, column))
+        # an unqualified column must have the same type in every (referenced) table that has it
+        tables = set(aliases.values()) or catalog.tables.keys()
+        families = {SchemaCatalog.type_family(catalog.column_type(table, column)) for table in tables} - {None}
+        return families.pop() if len(families) == 1 else None
+
+    @staticmethod
+    def _kind_of(value: Any, variable: str, context: dict) -> Optional[str]:
+        if variable in context['literals'] or isinstance(value, LiteralNode):
+            return 'constant'
+        if isinstance(value, ColumnNode):
+            return 'column'
+        if isinstance(value, (bool, int, float)) or (isinstance(value, dict) and 'literal' in value):
+            return 'constant'
+        if isinstance(value, str):
+            return 'column'
+        return None
+
+    @staticmethod
+    def _table_name(value: Any, context: dict) -> Optional[str]:
+        if isinstance(value, TableNode):
+            return value.name.lower()
+        if isinstance(value, SubqueryNode):
+            return None
+        if isinstance(value, dict) and isinstance(value.get('value'), str):
+            return value['value'].lower()
+        if isinstance(value, str):
+            return context['aliases'].get(value.lower(), value.lower())
+        return None
+
+    @staticmethod
+    def _column_name(value: Any) -> Optional[str]:
+        if isinstance(value, ColumnNode):
+            return value.name
+        if isinstance(value, str):
+            return value.split('.')[-1]
+        return None
@@ -1,3 +1,4 @@
+import hashlib
 import json
 
 from core.rule_parser import RuleParser
@@ -772,6 +773,7 @@ def get_rule_v2(key: str) -> dict:
     # TODO: reuse v1 parse_actions?
     identity_mapping = json.dumps({k: k for k in result.mapping})
     actions_json = RuleParser.parse_actions(rule['actions'], identity_mapping)
+    constraints_json = RuleParser.parse_constraints(rule['constraints'], identity_mapping)
     return {
         'id': rule['id'],
         'key': rule['key'],
@@ -779,6 +781,8 @@ def get_rule_v2(key: str) -> dict:
         'pattern': rule['pattern'],
         'pattern_ast': result.pattern_ast,
         'rewrite': rule['rewrite'],
+        'constraints': rule['constraints'],
+        'constraints_json': json.loads(constraints_json),
         'rewrite_ast': result.rewrite_ast,
         'mapping': result.mapping,
         'actions': rule['actions'],
@@ -795,7 +799,7 @@ def get_rules() -> list:
     for rule in rules:
       # Only populate Tableau rules
       #
-      if 0 <= rule['id'] < 30 or 100 <= rule['id'] < 130:
+      if is_populated(rule):
         rule['pattern_json'], rule['rewrite_json'], rule['mapping'] = RuleParser.parse(rule['pattern'], rule['rewrite'])
         rule['constraints_json'] = RuleParser.parse_constraints(rule['constraints'], rule['mapping'])
         rule['actions_json'] = RuleParser.parse_actions(rule['actions'], rule['mapping'])
@@ -803,4 +807,23 @@ def get_rules() -> list:
     # For demo: populate no rules to the querybooster.db
     #
     ans = []
-    return ans
\ No newline at end of file
+    return ans
+
+def is_populated(rule: dict) -> bool:
+    return 0 <= rule['id'] < 30 or 100 <= rule['id'] < 130
+
+
+# checksums of rule definitions by keys (see get_rules_checksum())
+_checksums = {}
+
+# return a checksum of the definitions of the rules populated by get_rules(), or of the rules with the given keys,
+#   computed from their text (without parsing them), so that seeding unchanged rules can be skipped
+#
+def get_rules_checksum(keys: list=None) -> str:
+    cache_key = None if keys is None else tuple(keys)
+    checksum = _checksums.get(cache_key)
+    if checksum is None:
+        definitions = [[rule['id'], rule['key'], rule['name'], rule['pattern'], rule['constraints'], rule['rewrite'], rule['actions']]
+                       for rule in rules if (is_populated(rule) if keys is None else rule['key'] in keys)]
+        checksum = _checksums[cache_key] = hashlib.sha1(json.dumps(definitions).encode('utf-8')).hexdigest()
+    return checksum
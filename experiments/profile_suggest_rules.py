@@ -9,10 +9,11 @@ from tests.string_util import StringUtil
 
 MAX_KHN_K = 10
 MAX_MPN_M = 100
+MAX_BS_W = 20
 
 
 # Profile RuleGenerator.suggest_rules()
-#   exp - explore_candidates approach: 'bf', 'khn', 'mpn'
+#   exp - explore_candidates approach: 'bf', 'khn', 'mpn', 'bs'
 #   examples - list of input rewriting examples
 #   optimal_rules - list of optimal rules for the given examples
 #
@@ -23,6 +24,8 @@ def profile_suggest_rules(exp: str, examples: list, optimal_rules: list) -> dict
         return profile_suggest_rules_khn(examples, optimal_rules)
     elif exp == 'mpn':
         return profile_suggest_rules_mpn(examples, optimal_rules)
+    elif exp == 'bs':
+        return profile_suggest_rules_bs(examples, optimal_rules)
     else:
         return {'success': False}
 
@@ -110,6 +113,40 @@ def profile_suggest_rules_mpn(examples: list, optimalRules: list) -> dict:
     return profile
 
 
+# Profile RuleGenerator.sugest_rules(exp='bs')
+#   Start with w=1, and double w each time, until the suggestRules are optimal
+#
+def profile_suggest_rules_bs(examples: list, optimalRules: list) -> dict:
+
+    print('Start profiling suggest rules using Beam Search ...')
+
+    w = 1
+    while w <= MAX_BS_W:
+
+        print('    Try W = ' + str(w) + ' ...')
+
+        profile = {}
+
+        # suggest rules from examples using exp='bs'
+        #
+        suggestRules = RuleGenerator.suggest_rules(examples, exp='bs', w=w, profile=profile)
+
+        # verify suggestRules == optimalRules
+        #
+        profile['success'] = verify_rules(suggestRules, optimalRules)
+        if profile['success']:
+
+            print('End profiling suggest rules using Beam Search ... Optimal Rules Found!')
+
+            return profile
+        
+        w *= 2
+    
+    print('End profiling suggest rules using Beam Search ... Optimal Rules Not Found! Reached Max W!')
+
+    return profile
+
+
 # Verify if the given suggestRules are the same as the optimalRules
 #
 def verify_rules(suggestRules: list, optimalRules: list) -> bool:
@@ -176,7 +213,7 @@ def read_examples_file(examples_file: str, num_optimal_rules: int):
 
 if __name__ == '__main__':
 
-    exps = ['bf', 'khn', 'mpn']
+    exps = ['bf', 'khn', 'mpn', 'bs']
 
     num_optimal_rules = 1
     examples_files = ['tweets_cast_2q.csv', 'tweets_cast_3q.csv', 'tweets_cast_4q.csv', 'tweets_cast_5q.csv']
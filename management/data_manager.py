@@ -1,48 +1,260 @@
 import sys
 # append the path of the parent directory
 sys.path.append("..")
+import base64
 import datetime
+import hashlib
 import json
-import sqlite3
-import traceback
+import logging
+import sqlparse
+import threading
+import zlib
 from sqlite3 import Error
 from pathlib import Path
-from typing import Dict, List
-from data.rules import get_rule
-import os
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from core.json_logger import Lazy
+from data.rules import get_rule, get_rules_checksum
+from management.storage import SQLiteStorage
+
+# page sizes of the paginated list APIs (see DataManager.list_queries_page() and DataManager.list_rules_page())
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# ids of the recently logged queries by guid (see DataManager.log_query()), shared by all DataManager instances,
+#   so that a query's report and its background suggestion find it without searching the queries table
+RECENT_QUERIES_SIZE = 10000
+_recent_queries = OrderedDict()
+_recent_queries_lock = threading.Lock()
+
+# changes kept in the rule change feed (see DataManager.record_rule_change()),
+#   a worker further behind reloads its rules instead of applying the changes
+RULE_CHANGES_KEEP = 10000
+
+# version of the seed data of DataManager.__init_data(), bump it when the seed data changes
+SEED_DATA_VERSION = 1
+
+# bootstrap steps (name, checksum) done by this process per storage (see DataManager.bootstrap()),
+#   so that constructing a manager after the first one does not touch the database
+_bootstrapped = set()
+_bootstrapped_lock = threading.Lock()
+# (storage, name) -> lock held while the bootstrap step runs, so that a step only blocks the managers waiting for it
+_bootstrap_locks = {}
+
+# the schema script, read once per process
+_schema_script = None
+
+logger = logging.getLogger(__name__)
+
 
 class DataManager:
 
-    def __init__(self, init=True) -> None:
-        db_path = Path(__file__).parent / "../"
-        self.db_conn = sqlite3.connect(os.path.join(db_path, 'querybooster.db'), check_same_thread=False)
+    # storage: the backend holding the tables (see management/storage.py),
+    #   by default the one configured by QUERYBOOSTER_STORAGE (querybooster.db next to the package if not set)
+    #
+    def __init__(self, init=True, storage: Optional[SQLiteStorage]=None) -> None:
+        self.storage = storage if storage is not None else SQLiteStorage.open()
+        self.db_conn = self.storage.conn
+        self.db_lock = self.storage.lock
         if init:
-            self.__init_schema()
-            self.__init_data()
+            self.bootstrap('schema', DataManager.sql_hash(DataManager.schema_script()), self.__init_schema)
+            self.bootstrap('data', f"{SEED_DATA_VERSION}:{get_rules_checksum(['remove_max_distinct'])}", self.__init_data)
     
-    def __init_schema(self) -> None:
+    # Run a bootstrap step once per database: it is skipped when the database records the same checksum for it,
+    #   otherwise it runs and, if it succeeds (returns True), its checksum is recorded in bootstrap_versions;
+    #   a failed step is not recorded and runs again for the next manager;
+    #   returns True if the step ran
+    #
+    def bootstrap(self, name: str, checksum: str, step) -> bool:
+        key = (self.storage, name, checksum)
+        with _bootstrapped_lock:
+            if key in _bootstrapped:
+                return False
+            lock = _bootstrap_locks.setdefault((self.storage, name), threading.Lock())
+        with lock:
+            # (done by another manager while we waited)
+            with _bootstrapped_lock:
+                if key in _bootstrapped:
+                    return False
+            ran = self.bootstrap_checksum(name) != checksum
+            if ran:
+                if not step():
+                    return True
+                with self.storage.transaction() as cur:
+                    cur.execute('''REPLACE INTO bootstrap_versions (name, checksum, timestamp) VALUES (?, ?, ?)''',
+                                [name, checksum, datetime.datetime.now()])
+            with _bootstrapped_lock:
+                _bootstrapped.add(key)
+            return ran
+
+    # Checksum recorded for a bootstrap step, None if it never ran on this database
+    #
+    def bootstrap_checksum(self, name: str) -> Optional[str]:
         try:
             cur = self.db_conn.cursor()
-            schema_path = Path(__file__).parent / "../schema"
-            with open(os.path.join(schema_path, 'schema.sql')) as schema_sql_file:
-                schema_sql = schema_sql_file.read()
-                cur.executescript(schema_sql)
-        except Error as e:
-            print(e)
+            cur.execute('''SELECT checksum FROM bootstrap_versions WHERE name = ?''', [name])
+            row = cur.fetchone()
+            return row[0] if row else None
+        except Error:
+            # a database created before bootstrap_versions
+            return None
+
+    @staticmethod
+    def schema_script() -> str:
+        global _schema_script
+        if _schema_script is None:
+            with open(Path(__file__).parent / '../schema/schema.sql') as schema_sql_file:
+                _schema_script = schema_sql_file.read()
+        return _schema_script
+    
+    # Encode a keyset (e.g., the (timestamp, id) of a page's last row) into an opaque cursor for the list APIs
+    #
+    @staticmethod
+    def encode_cursor(keyset: list) -> str:
+        return base64.urlsafe_b64encode(json.dumps(keyset).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+        if not cursor:
+            return None
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except ValueError:
+            raise ValueError(f'Invalid cursor {cursor!r}')
+
+    @staticmethod
+    def remember_query(guid: str, query_id: int) -> None:
+        with _recent_queries_lock:
+            _recent_queries[guid] = query_id
+            _recent_queries.move_to_end(guid)
+            while len(_recent_queries) > RECENT_QUERIES_SIZE:
+                _recent_queries.popitem(last=False)
+
+    # Forget a recently logged query (e.g., whose append was dropped by the storage)
+    #
+    @staticmethod
+    def forget_query(guid: str, query_id: int) -> None:
+        with _recent_queries_lock:
+            if _recent_queries.get(guid) == query_id:
+                del _recent_queries[guid]
+
+    # Id of a recently logged query by its guid, None if it is not (or no longer) remembered
+    #
+    @staticmethod
+    def recent_query_id(guid: str) -> Optional[int]:
+        with _recent_queries_lock:
+            return _recent_queries.get(guid)
+
+    # Clamp a requested page size to [1, MAX_PAGE_SIZE]
+    #
+    @staticmethod
+    def page_size(limit: Optional[int]) -> int:
+        return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+    def __init_schema(self) -> bool:
+        try:
+            migrated = self.__migrate_schema()
+            cur = self.db_conn.cursor()
+            cur.executescript(DataManager.schema_script())
+            if 'queries' in migrated:
+                self.rebuild_query_stats()
+            for table in ('rewriting_paths', 'suggestion_rewriting_paths'):
+                if table in migrated:
+                    self.compact_rewritings(table)
+            return True
+        except Error:
+            logger.exception('Error in __init_schema')
+            return False
+
+    # Add the columns introduced after a database was created (the schema script only creates missing tables),
+    #   returns the set of migrated tables
+    #
+    def __migrate_schema(self) -> set:
+        migrated = set()
+        cur = self.db_conn.cursor()
+        cur.execute('''PRAGMA table_info(queries)''')
+        columns = [row[1] for row in cur.fetchall()]
+        if columns and 'sql_hash' not in columns:
+            cur.execute('''ALTER TABLE queries ADD COLUMN original_sql_hash TEXT''')
+            cur.execute('''ALTER TABLE queries ADD COLUMN sql_hash TEXT''')
+            cur.execute('''SELECT id, original_sql, sql FROM queries''')
+            cur.executemany('''UPDATE queries SET original_sql_hash = ?, sql_hash = ? WHERE id = ?''',
+                            [(DataManager.sql_hash(original_sql), DataManager.sql_hash(sql), query_id)
+                             for query_id, original_sql, sql in cur.fetchall()])
+            migrated.add('queries')
+        for table in ('rewriting_paths', 'suggestion_rewriting_paths'):
+            cur.execute(f'''PRAGMA table_info({table})''')
+            columns = [row[1] for row in cur.fetchall()]
+            if columns and 'sql_hash' not in columns:
+                cur.execute(f'''ALTER TABLE {table} ADD COLUMN sql_hash TEXT''')
+                migrated.add(table)
+        self.db_conn.commit()
+        return migrated
 
-    def __init_data(self) -> None:
+    # Move the SQL texts of a (pre-sql_texts) rewriting path table into sql_texts
+    #
+    def compact_rewritings(self, table: str) -> None:
+        try:
+            with self.storage.transaction() as cur:
+                cur.execute(f'''SELECT query_id, seq, rewritten_sql FROM {table} 
+                                 WHERE sql_hash IS NULL AND rewritten_sql IS NOT NULL''')
+                rows = cur.fetchall()
+                texts = {DataManager.sql_hash(sql): sql for _, _, sql in rows}
+                cur.executemany('''INSERT OR IGNORE INTO sql_texts (sql_hash, sql) VALUES (?, ?)''',
+                                [(sql_hash, DataManager.encode_sql_text(sql)) for sql_hash, sql in texts.items()])
+                cur.executemany(f'''UPDATE {table} SET sql_hash = ?, rewritten_sql = NULL WHERE query_id = ? AND seq = ?''',
+                                [(DataManager.sql_hash(sql), query_id, seq) for query_id, seq, sql in rows])
+            self.db_conn.execute('''VACUUM''')
+        except Error:
+            logger.exception('Error in compact_rewritings')
+
+    # Hash of a SQL text, the key of its latency aggregates in query_stats and of its text in sql_texts
+    #
+    @staticmethod
+    def sql_hash(sql: str) -> str:
+        return hashlib.sha1((sql or '').encode('utf-8')).hexdigest()
+
+    # SQL texts are stored zlib-compressed in sql_texts
+    #
+    @staticmethod
+    def encode_sql_text(sql: str) -> bytes:
+        return zlib.compress(sql.encode('utf-8'))
+
+    @staticmethod
+    def decode_sql_text(data) -> Optional[str]:
+        if isinstance(data, bytes):
+            return zlib.decompress(data).decode('utf-8')
+        return data
+
+    # Rows of sql_texts (sql_hash, compressed SQL) and of a rewriting path table (query_id, seq, rule_id, sql_hash),
+    #   storing each distinct SQL text of a rewriting path once
+    #
+    @staticmethod
+    def rewriting_rows(query_id: int, rewriting_path: list) -> Tuple[list, list]:
+        texts = {}
+        rows = []
+        for seq, rewriting in enumerate(rewriting_path, start=1):
+            sql_hash = DataManager.sql_hash(rewriting[1])
+            if sql_hash not in texts:
+                texts[sql_hash] = DataManager.encode_sql_text(rewriting[1])
+            rows.append([query_id, seq, rewriting[0], sql_hash])
+        return list(texts.items()), rows
+
+    def __init_data(self) -> bool:
         try:
             # create two users: Alice and Bob
             #
-            self.update_user({'id': '102153741508111367852', 'email': 'alice.vldb@gmail.com'})
-            self.update_user({'id': '110518596083203416821', 'email': 'bob.vldb@gmail.com'})
+            done = [
+                self.update_user({'id': '102153741508111367852', 'email': 'alice.vldb@gmail.com'}),
+                self.update_user({'id': '110518596083203416821', 'email': 'bob.vldb@gmail.com'})
+            ]
             # create two apps for Alice
             #
-            self.update_application({'id': 1, 'name': 'TwitterPg', 'guid': 'Alice-Tableau-Twitter-Pg', 'user_id': '102153741508111367852'})
-            self.update_application({'id': 2, 'name': 'TwitterMySQL', 'guid': 'Alice-Tableau-Twitter-MySQL', 'user_id': '102153741508111367852'})
+            done.append(self.update_application({'id': 1, 'name': 'TwitterPg', 'guid': 'Alice-Tableau-Twitter-Pg', 'user_id': '102153741508111367852'}))
+            done.append(self.update_application({'id': 2, 'name': 'TwitterMySQL', 'guid': 'Alice-Tableau-Twitter-MySQL', 'user_id': '102153741508111367852'}))
             # create one app for Bob
             #
-            self.update_application({'id': 3, 'name': 'TpchPg', 'guid': 'Bob-Tableau-Tpch-Pg', 'user_id': '110518596083203416821'})
+            done.append(self.update_application({'id': 3, 'name': 'TpchPg', 'guid': 'Bob-Tableau-Tpch-Pg', 'user_id': '110518596083203416821'}))
             # create one rule for Alice
             #
             rule = get_rule('remove_max_distinct')
@@ -51,17 +263,18 @@ class DataManager:
             rule['constraints_json'] = json.dumps(rule['constraints_json'])
             rule['rewrite_json'] = json.dumps(rule['rewrite_json'])
             rule['actions_json'] = json.dumps(rule['actions_json'])
-            self.update_rule(rule)
+            done.append(self.update_rule(rule))
             # enable it for its app
             #
-            self.enable_rule(rule_id=rule['id'], app_id=1, app_name='TwitterPg')
-            
-        except Error as e:
-            print(e)
+            done.append(self.enable_rule(rule_id=rule['id'], app_id=1, app_name='TwitterPg'))
+            return all(done)
+        except Error:
+            logger.exception('Error in __init_data')
+            return False
     
     def __del__(self):
-        if self.db_conn:
-            self.db_conn.close()
+        # the storage (and its connection) is shared by all the DataManager instances of the process
+        self.db_conn = None
     
     def list_rules(self, user_id: str) -> List[Dict]:
         try:
@@ -81,13 +294,49 @@ class DataManager:
                                       ON enabled.application_id = applications.id
                            WHERE rules.user_id = ?''', [user_id])
             return cur.fetchall()
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in list_rules')
     
-    def enabled_rules(self, appguid: str) -> List[Dict]:
+    # One page of a user's rules in id order, after the rule id `after` (keyset pagination),
+    #   optionally only the rules enabled for application app_id;
+    #   the last column is the JSON array of the rule's enabled applications [{"app_id", "app_name"}, ...]
+    #
+    def list_rules_page(self, user_id: str, limit: int, after: Optional[int]=None, app_id: Optional[int]=None) -> List[Dict]:
+        try:
+            # the page is fetched at once under the storage lock, not read lazily while other threads use the connection
+            with self.db_lock:
+                cur = self.db_conn.cursor()
+                cur.execute('''SELECT rules.id, 
+                                  rules.key, 
+                                  rules.name, 
+                                  rules.pattern,
+                                  rules.constraints,
+                                  rules.rewrite,
+                                  rules.actions,
+                                  (SELECT json_group_array(json_object('app_id', enabled.application_id, 
+                                                                       'app_name', applications.name))
+                                     FROM enabled LEFT OUTER JOIN applications
+                                                  ON enabled.application_id = applications.id
+                                    WHERE enabled.rule_id = rules.id) AS enabled_apps
+                           FROM rules
+                           WHERE rules.user_id = ?
+                             AND (? IS NULL OR rules.id > ?)
+                             AND (? IS NULL OR EXISTS (SELECT 1 FROM enabled 
+                                                        WHERE enabled.rule_id = rules.id 
+                                                          AND enabled.application_id = ?))
+                           ORDER BY rules.id
+                           LIMIT ?''', [user_id, after, after, app_id, app_id, limit])
+                return cur.fetchall()
+        except Error:
+            logger.exception('Error in list_rules_page')
+    
+    # The rules enabled for an application, or only those of rule_ids that are enabled
+    #
+    def enabled_rules(self, appguid: str, rule_ids: Optional[list]=None) -> List[Dict]:
         try:
             cur = self.db_conn.cursor()
-            cur.execute('''SELECT rules.id, 
+            rule_ids = list(rule_ids) if rule_ids is not None else None
+            cur.execute(f'''SELECT rules.id, 
                                   rules.key, 
                                   rules.name, 
                                   internal_rules.pattern_json,
@@ -98,10 +347,82 @@ class DataManager:
                                       JOIN applications ON enabled.application_id = applications.id
                                       LEFT JOIN internal_rules ON rules.id = internal_rules.rule_id 
                            WHERE applications.guid = ? 
-                           ORDER BY rules.id''', [appguid])
+                             {'' if rule_ids is None else f"AND rules.id IN ({', '.join('?' * len(rule_ids))})"}
+                           ORDER BY rules.id''', [appguid] + (rule_ids or []))
             return cur.fetchall()
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in enabled_rules')
+    
+    # Latest version of an application's rule change feed (0 if its rules never changed)
+    #
+    def rule_version(self, appguid: str) -> int:
+        try:
+            cur = self.db_conn.cursor()
+            cur.execute('''SELECT version FROM rule_versions WHERE appguid = ?''', [appguid])
+            row = cur.fetchone()
+            return row[0] if row else 0
+        except Error:
+            logger.exception('Error in rule_version')
+            return 0
+    
+    # The changes of an application's enabled rules after version `since`, in version order:
+    #   [(version, rule_id, change), ...], where change is 'enable', 'disable', 'update', 'delete' of rule rule_id,
+    #   or 'reset' (rule_id NULL) when the application itself changed;
+    #   None if some changes after `since` may have been trimmed from the feed (or on error)
+    #
+    def rule_changes(self, appguid: str, since: int) -> Optional[List[Tuple]]:
+        try:
+            with self.db_lock:
+                cur = self.db_conn.cursor()
+                cur.execute('''SELECT version, rule_id, change FROM rule_changes 
+                               WHERE appguid = ? AND version > ? 
+                               ORDER BY version''', [appguid, since])
+                changes = cur.fetchall()
+                # (checked after reading the changes, a trim in between would have removed them)
+                cur.execute('''SELECT MIN(version) FROM rule_changes''')
+                oldest = cur.fetchone()[0]
+                if oldest is None or oldest > since + 1:
+                    return None
+                return changes
+        except Error:
+            logger.exception('Error in rule_changes')
+            return None
+    
+    # Record a change of a rule in the change feed of the applications app_ids
+    #   (by default, the applications the rule is enabled for), within the caller's transaction
+    #
+    @staticmethod
+    def record_rule_change(cur, rule_id: int, change: str, app_ids: Optional[list]=None) -> None:
+        if app_ids is None:
+            cur.execute('''SELECT application_id FROM enabled WHERE rule_id = ?''', [rule_id])
+            app_ids = [row[0] for row in cur.fetchall()]
+        guids = []
+        for app_id in app_ids:
+            cur.execute('''SELECT guid FROM applications WHERE id = ?''', [app_id])
+            row = cur.fetchone()
+            if row is not None:
+                guids.append(row[0])
+        DataManager.record_changes(cur, guids, rule_id, change)
+
+    # Record a change of applications (e.g., a changed or deleted guid) in the change feed of their guids,
+    #   as a 'reset' of all their rules, within the caller's transaction
+    #
+    @staticmethod
+    def record_application_change(cur, guids: list) -> None:
+        DataManager.record_changes(cur, [guid for guid in guids if guid is not None], None, 'reset')
+
+    @staticmethod
+    def record_changes(cur, guids: list, rule_id: Optional[int], change: str) -> None:
+        version = None
+        for guid in dict.fromkeys(guids):
+            cur.execute('''INSERT INTO rule_changes (appguid, rule_id, change, timestamp) VALUES (?, ?, ?, ?)''',
+                        [guid, rule_id, change, datetime.datetime.now()])
+            version = cur.lastrowid
+            cur.execute('''INSERT INTO rule_versions (appguid, version) VALUES (?, ?) 
+                           ON CONFLICT (appguid) DO UPDATE SET version = excluded.version''', [guid, version])
+        # trim the feed, always keeping the latest change
+        if version is not None and version > RULE_CHANGES_KEEP:
+            cur.execute('''DELETE FROM rule_changes WHERE version <= ?''', [version - max(1, RULE_CHANGES_KEEP)])
     
     def all_rules(self) -> List[Dict]:
         try:
@@ -116,8 +437,8 @@ class DataManager:
                            FROM rules LEFT JOIN internal_rules ON rules.id = internal_rules.rule_id 
                            ORDER BY rules.id''', [])
             return cur.fetchall()
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in all_rules')
     
     def fetch_rule(self, rule_id: int) -> Dict:
         try:
@@ -132,132 +453,264 @@ class DataManager:
                            FROM rules
                            WHERE rules.id = ?''', [rule_id])
             return cur.fetchall()[0]
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in fetch_rule')
     
     def enable_rule(self, rule_id: int, app_id: int, app_name: str) -> bool:
         try:
-            cur = self.db_conn.cursor()
-            if not app_id:
-                cur.execute('''SELECT id FROM applications WHERE name = ?''', [app_name])
-                app_id = cur.fetchone()[0]
-            cur.execute('''INSERT OR IGNORE INTO enabled (rule_id, application_id) VALUES (?, ?)''', [rule_id, app_id])
-            self.db_conn.commit()
+            with self.storage.transaction() as cur:
+                if not app_id:
+                    cur.execute('''SELECT id FROM applications WHERE name = ?''', [app_name])
+                    app_id = cur.fetchone()[0]
+                cur.execute('''INSERT OR IGNORE INTO enabled (rule_id, application_id) VALUES (?, ?)''', [rule_id, app_id])
+                if cur.rowcount > 0:
+                    DataManager.record_rule_change(cur, rule_id, 'enable', [app_id])
             return True
-        except Error as er:
-            print('[Error] in enable_rule:')
-            print('rule_id: ', rule_id, 'app_id: ', app_id, 'app_name: ', app_name)
-            print('SQLite error: %s' % (' '.join(er.args)))
-            print("Exception class is: ", er.__class__)
-            print('SQLite traceback: ')
-            exc_type, exc_value, exc_tb = sys.exc_info()
-            print(traceback.format_exception(exc_type, exc_value, exc_tb))
+        except Error:
+            logger.exception('Error in enable_rule (rule_id: %s, app_id: %s, app_name: %s)', rule_id, app_id, app_name)
             return False
     
     def disable_rule(self, rule_id: int, app_id: int, app_name: str) -> bool:
         try:
-            cur = self.db_conn.cursor()
-            if not app_id:
-                cur.execute('''SELECT id FROM applications WHERE name = ?''', [app_name])
-                app_id = cur.fetchone()[0]
-            cur.execute('''DELETE FROM enabled WHERE rule_id = ? AND application_id = ?''', [rule_id, app_id])
-            self.db_conn.commit()
+            with self.storage.transaction() as cur:
+                if not app_id:
+                    cur.execute('''SELECT id FROM applications WHERE name = ?''', [app_name])
+                    app_id = cur.fetchone()[0]
+                cur.execute('''DELETE FROM enabled WHERE rule_id = ? AND application_id = ?''', [rule_id, app_id])
+                if cur.rowcount > 0:
+                    DataManager.record_rule_change(cur, rule_id, 'disable', [app_id])
             return True
-        except Error as er:
-            print('[Error] in disable_rule:')
-            print('rule_id: ', rule_id, 'app_id: ', app_id, 'app_name: ', app_name)
-            print('SQLite error: %s' % (' '.join(er.args)))
-            print("Exception class is: ", er.__class__)
-            print('SQLite traceback: ')
-            exc_type, exc_value, exc_tb = sys.exc_info()
-            print(traceback.format_exception(exc_type, exc_value, exc_tb))
+        except Error:
+            logger.exception('Error in disable_rule (rule_id: %s, app_id: %s, app_name: %s)', rule_id, app_id, app_name)
             return False
     
-    def update_rule(self, rule: dict) -> None:
+    # Note: the built-in rules are updated on every start, 
+    #       so a change is recorded only if the rule's compiled JSON actually changed
+    #
+    def update_rule(self, rule: dict) -> bool:
         try:
-            cur = self.db_conn.cursor()
-            cur.execute('''REPLACE INTO rules (id, key, name, pattern, constraints, rewrite, actions, user_id) 
-                                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', 
-                        [rule['id'], rule['key'], rule['name'], rule['pattern'], 
-                         rule['constraints'], rule['rewrite'], rule['actions'], rule['user_id']
-                        ])
-            cur.execute('''REPLACE INTO internal_rules (rule_id, pattern_json, constraints_json, rewrite_json, actions_json) VALUES (?, ?, ?, ?, ?)''', 
-                        [rule['id'], rule['pattern_json'], rule['constraints_json'], rule['rewrite_json'], rule['actions_json']])
-            self.db_conn.commit()
-        except Error as er:
-            print('[Error] in update_rule:')
-            print(rule)
-            print('SQLite error: %s' % (' '.join(er.args)))
-            print("Exception class is: ", er.__class__)
-            print('SQLite traceback: ')
-            exc_type, exc_value, exc_tb = sys.exc_info()
-            print(traceback.format_exception(exc_type, exc_value, exc_tb))
+            with self.storage.transaction() as cur:
+                cur.execute('''SELECT rules.key, rules.name, pattern_json, constraints_json, rewrite_json, actions_json 
+                               FROM rules JOIN internal_rules ON rules.id = internal_rules.rule_id 
+                               WHERE rules.id = ?''', [rule['id']])
+                previous = cur.fetchone()
+                cur.execute('''REPLACE INTO rules (id, key, name, pattern, constraints, rewrite, actions, user_id) 
+                                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', 
+                            [rule['id'], rule['key'], rule['name'], rule['pattern'], 
+                             rule['constraints'], rule['rewrite'], rule['actions'], rule['user_id']
+                            ])
+                cur.execute('''REPLACE INTO internal_rules (rule_id, pattern_json, constraints_json, rewrite_json, actions_json) VALUES (?, ?, ?, ?, ?)''', 
+                            [rule['id'], rule['pattern_json'], rule['constraints_json'], rule['rewrite_json'], rule['actions_json']])
+                if previous is not None and previous != (rule['key'], rule['name'], rule['pattern_json'], rule['constraints_json'], 
+                                                         rule['rewrite_json'], rule['actions_json']):
+                    DataManager.record_rule_change(cur, rule['id'], 'update')
+            return True
+        except Error:
+            logger.exception('Error in update_rule (rule: %s)', rule['id'], extra={'rule': Lazy(json.dumps, rule)})
+            return False
 
     def save_rule(self, rule: dict, user_id: str) -> bool:
         try:
-            cur = self.db_conn.cursor()
-            if(rule['id'] == -1):
-                cur.execute('''SELECT IFNULL(MAX(id), 0) + 1 FROM rules;''')
-                rule['id'] = cur.fetchone()[0]
-            cur.execute('''INSERT INTO rules (id, "key", name, pattern, constraints, rewrite, actions, user_id) 
-                                       VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET  
-                                       name=excluded.name, pattern=excluded.pattern, constraints=excluded.constraints, rewrite=excluded.rewrite, actions=excluded.actions''',
-                        [rule['id'], rule['key'], rule['name'], rule['pattern'],
-                         rule['constraints'], rule['rewrite'], rule['actions'], user_id
-                         ])
-            cur.execute(
-                '''INSERT INTO internal_rules (rule_id, pattern_json, constraints_json, rewrite_json, actions_json) VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT (rule_id) DO UPDATE SET pattern_json=excluded.pattern_json, constraints_json=excluded.constraints_json, rewrite_json=excluded.rewrite_json, actions_json=excluded.actions_json''',
-                [rule['id'], rule['pattern_json'], rule['constraints_json'], rule['rewrite_json'],
-                 rule['actions_json']])
-            self.db_conn.commit()
+            with self.storage.transaction() as cur:
+                if(rule['id'] == -1):
+                    cur.execute('''SELECT IFNULL(MAX(id), 0) + 1 FROM rules;''')
+                    rule['id'] = cur.fetchone()[0]
+                cur.execute('''INSERT INTO rules (id, "key", name, pattern, constraints, rewrite, actions, user_id) 
+                                           VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET  
+                                           name=excluded.name, pattern=excluded.pattern, constraints=excluded.constraints, rewrite=excluded.rewrite, actions=excluded.actions''',
+                            [rule['id'], rule['key'], rule['name'], rule['pattern'],
+                             rule['constraints'], rule['rewrite'], rule['actions'], user_id
+                             ])
+                cur.execute(
+                    '''INSERT INTO internal_rules (rule_id, pattern_json, constraints_json, rewrite_json, actions_json) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (rule_id) DO UPDATE SET pattern_json=excluded.pattern_json, constraints_json=excluded.constraints_json, rewrite_json=excluded.rewrite_json, actions_json=excluded.actions_json''',
+                    [rule['id'], rule['pattern_json'], rule['constraints_json'], rule['rewrite_json'],
+                     rule['actions_json']])
+                DataManager.record_rule_change(cur, rule['id'], 'update')
             return True
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in save_rule')
             return False
     
     def delete_rule(self, rule: dict) -> bool:
         try:
-            cur = self.db_conn.cursor()
-            cur.execute('''DELETE FROM rules WHERE id = ?''', [rule['id']])
-            self.db_conn.commit()
+            with self.storage.transaction() as cur:
+                DataManager.record_rule_change(cur, rule['id'], 'delete')
+                cur.execute('''DELETE FROM rules WHERE id = ?''', [rule['id']])
             return True
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in delete_rule')
             return False
     
-    def log_query(self, appguid: str, guid: str, original_query: str, rewritten_query: str, rewriting_path: list) -> None:
+    # Log a query and its rewriting path as one append to the storage, returns the query's id (None on error)
+    #   the id comes from the storage's in-memory id block (see SQLiteStorage.allocate_id());
+    #   with a batched storage, the query is forgotten again if its append is dropped
+    #
+    def log_query(self, appguid: str, guid: str, original_query: str, rewritten_query: str, rewriting_path: list) -> Optional[int]:
         try:
-            cur = self.db_conn.cursor()
-            cur.execute('''SELECT IFNULL(MAX(id), 0) + 1 FROM queries;''')
-            query_id = cur.fetchone()[0]
-
-            cur.execute('''INSERT INTO queries (id, timestamp, appguid, guid, query_time_ms, original_sql, sql) 
-                                       VALUES (?, ?, ?, ?, ?, ?, ?)''', 
-                        [query_id, datetime.datetime.now(), appguid, guid, -1000, original_query, rewritten_query])
-            seq = 1
-            for rewriting in rewriting_path:
-                cur.execute('''INSERT INTO rewriting_paths (query_id, seq, rule_id, rewritten_sql)
-                                           VALUES (?, ?, ?, ?)''', 
-                            [query_id, seq, rewriting[0], rewriting[1]])
-                seq += 1
-            self.db_conn.commit()
-        except Error as e:
-            print(e)
+            query_id = self.storage.allocate_id('queries')
+            texts, rewritings = DataManager.rewriting_rows(query_id, rewriting_path)
+            self.storage.append([
+                ('''INSERT OR IGNORE INTO sql_texts (sql_hash, sql) VALUES (?, ?)''', texts),
+                ('''INSERT INTO queries (id, timestamp, appguid, guid, query_time_ms, original_sql, sql, original_sql_hash, sql_hash) 
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', 
+                 [[query_id, datetime.datetime.now(), appguid, guid, -1000, original_query, rewritten_query,
+                   DataManager.sql_hash(original_query), DataManager.sql_hash(rewritten_query)]]),
+                ('''INSERT INTO rewriting_paths (query_id, seq, rule_id, sql_hash)
+                                         VALUES (?, ?, ?, ?)''', 
+                 rewritings),
+            ], dropped=lambda: DataManager.forget_query(guid, query_id))
+            DataManager.remember_query(guid, query_id)
+            return query_id
+        except Error:
+            logger.exception('Error in log_query')
+            return None
     
+    # Record a query's latency, and maintain the latency aggregates of its executed SQL in query_stats,
+    #   as one append to the storage (ordered after the query's own append, see log_query())
+    #   Note: only reported latencies (>= 0) are aggregated, not the -1000 placeholder of log_query;
+    #         a re-reported latency replaces the previous one in count and sum (min and max keep it)
+    #
     def report_query(self, appguid: str, guid: str, query_time_ms: int) -> None:
+        try:
+            # a recently logged query is updated by its id
+            query_id = DataManager.recent_query_id(guid)
+            condition = 'id = :id AND appguid = :appguid AND guid = :guid' if query_id is not None else 'appguid = :appguid AND guid = :guid'
+            parameters = {'id': query_id, 'appguid': appguid, 'guid': guid, 'query_time_ms': query_time_ms}
+            self.storage.append([
+                # the aggregates first, they replace the query's previous latency
+                (f'''INSERT INTO query_stats (sql_hash, count, sum_ms, min_ms, max_ms)
+                         SELECT sql_hash,
+                                IFNULL(:query_time_ms >= 0, 0) - IFNULL(query_time_ms >= 0, 0),
+                                CASE WHEN :query_time_ms >= 0 THEN :query_time_ms ELSE 0 END
+                                  - CASE WHEN query_time_ms >= 0 THEN query_time_ms ELSE 0 END,
+                                CASE WHEN :query_time_ms >= 0 THEN :query_time_ms END,
+                                CASE WHEN :query_time_ms >= 0 THEN :query_time_ms END
+                           FROM queries
+                          WHERE {condition} AND (:query_time_ms >= 0 OR query_time_ms >= 0)
+                    ON CONFLICT (sql_hash) DO UPDATE SET
+                         count = count + excluded.count,
+                         sum_ms = sum_ms + excluded.sum_ms,
+                         min_ms = MIN(IFNULL(min_ms, excluded.min_ms), IFNULL(excluded.min_ms, min_ms)),
+                         max_ms = MAX(IFNULL(max_ms, excluded.max_ms), IFNULL(excluded.max_ms, max_ms))''',
+                 [parameters]),
+                (f'''UPDATE queries
+                       SET query_time_ms = :query_time_ms
+                     WHERE {condition}''',
+                 [parameters]),
+            ])
+        except Error:
+            logger.exception('Error in report_query')
+
+    # Recompute query_stats from the queries table (e.g., after a migration)
+    #   Note: the latencies of the queries pruned by the retention are lost
+    #
+    def rebuild_query_stats(self) -> None:
+        self.storage.flush()
         try:
             cur = self.db_conn.cursor()
-            cur.execute('''UPDATE queries
-                              SET query_time_ms = ? 
-                            WHERE appguid = ? 
-                              AND guid = ?''', 
-                        [query_time_ms, appguid, guid])
+            cur.execute('''DELETE FROM query_stats''')
+            cur.execute('''INSERT INTO query_stats (sql_hash, count, sum_ms, min_ms, max_ms)
+                           SELECT sql_hash, COUNT(*), SUM(query_time_ms), MIN(query_time_ms), MAX(query_time_ms)
+                             FROM queries
+                            WHERE query_time_ms >= 0
+                            GROUP BY sql_hash''')
             self.db_conn.commit()
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in rebuild_query_stats')
     
+    # Shape of a SQL query: its text with every literal replaced by ?, in uppercase keywords and single spaces,
+    #   e.g., "select * from t where a = 'x' and b > 1" -> "SELECT * FROM t WHERE a = ? AND b > ?"
+    #
+    @staticmethod
+    def query_shape(sql: str) -> str:
+        parts = []
+        for token in sqlparse.parse(sql or '')[0].flatten() if sql else []:
+            if token.ttype in sqlparse.tokens.Literal:
+                parts.append('?')
+            elif token.is_whitespace:
+                if parts and parts[-1] != ' ':
+                    parts.append(' ')
+            elif token.ttype in sqlparse.tokens.Keyword:
+                parts.append(token.normalized)
+            else:
+                parts.append(token.value)
+        return ''.join(parts).strip()
+
+    # Roll the oldest batch of queries logged before `before` (a timestamp) up into query_rollups,
+    #   then delete them with their rewriting paths and suggestions, the latency aggregates (query_stats)
+    #   no remaining query executes and the SQL texts (sql_texts) no longer referenced by any rewriting path or rollup,
+    #   in one transaction;
+    #   returns the number of pruned queries (0 once nothing is left to prune)
+    #
+    def prune_queries(self, before: str, batch_size: int) -> int:
+        self.storage.flush()
+        try:
+            with self.storage.transaction() as cur:
+                cur.execute('''SELECT id, appguid, timestamp, query_time_ms, original_sql, sql, sql_hash
+                                 FROM queries
+                                WHERE timestamp < ?
+                                ORDER BY timestamp
+                                LIMIT ?''', [before, batch_size])
+                queries = cur.fetchall()
+                if not queries:
+                    return 0
+                shapes = {}
+                # (appguid, shape_hash, day) -> [count, rewritten_count, reported_count, sum_ms, min_ms, max_ms]
+                rollups = {}
+                for _, appguid, timestamp, query_time_ms, original_sql, sql, _ in queries:
+                    shape = DataManager.query_shape(original_sql)
+                    shape_hash = DataManager.sql_hash(shape)
+                    shapes[shape_hash] = shape
+                    rollup = rollups.setdefault((appguid, shape_hash, str(timestamp)[:10]), [0, 0, 0, 0.0, None, None])
+                    rollup[0] += 1
+                    rollup[1] += int(sql != original_sql)
+                    if query_time_ms is not None and query_time_ms >= 0:
+                        rollup[2] += 1
+                        rollup[3] += query_time_ms
+                        rollup[4] = query_time_ms if rollup[4] is None else min(rollup[4], query_time_ms)
+                        rollup[5] = query_time_ms if rollup[5] is None else max(rollup[5], query_time_ms)
+                cur.executemany('''INSERT OR IGNORE INTO sql_texts (sql_hash, sql) VALUES (?, ?)''',
+                                [(shape_hash, DataManager.encode_sql_text(shape)) for shape_hash, shape in shapes.items()])
+                cur.executemany('''INSERT INTO query_rollups (appguid, shape_hash, day, count, rewritten_count, reported_count, sum_ms, min_ms, max_ms)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                   ON CONFLICT (appguid, shape_hash, day) DO UPDATE SET
+                                        count = count + excluded.count,
+                                        rewritten_count = rewritten_count + excluded.rewritten_count,
+                                        reported_count = reported_count + excluded.reported_count,
+                                        sum_ms = sum_ms + excluded.sum_ms,
+                                        min_ms = MIN(IFNULL(min_ms, excluded.min_ms), IFNULL(excluded.min_ms, min_ms)),
+                                        max_ms = MAX(IFNULL(max_ms, excluded.max_ms), IFNULL(excluded.max_ms, max_ms))''',
+                                [list(key) + rollup for key, rollup in rollups.items()])
+                query_ids = [[query[0]] for query in queries]
+                texts = set()
+                for table in ('rewriting_paths', 'suggestion_rewriting_paths'):
+                    for query_id in query_ids:
+                        cur.execute(f'''SELECT sql_hash FROM {table} WHERE query_id = ? AND sql_hash IS NOT NULL''', query_id)
+                        texts.update(row[0] for row in cur.fetchall())
+                cur.executemany('''DELETE FROM rewriting_paths WHERE query_id = ?''', query_ids)
+                cur.executemany('''DELETE FROM suggestion_rewriting_paths WHERE query_id = ?''', query_ids)
+                cur.executemany('''DELETE FROM suggestions WHERE query_id = ?''', query_ids)
+                cur.executemany('''DELETE FROM queries WHERE id = ?''', query_ids)
+                # the latency aggregates are shared by SQL, delete only the ones no remaining query executes
+                cur.executemany('''DELETE FROM query_stats
+                                    WHERE sql_hash = ?
+                                      AND NOT EXISTS (SELECT 1 FROM queries WHERE sql_hash = query_stats.sql_hash)''',
+                                [[sql_hash] for sql_hash in {query[6] for query in queries}])
+                # texts are shared by hash, delete only the ones nothing references any more
+                cur.executemany('''DELETE FROM sql_texts 
+                                    WHERE sql_hash = ?
+                                      AND NOT EXISTS (SELECT 1 FROM rewriting_paths WHERE sql_hash = sql_texts.sql_hash)
+                                      AND NOT EXISTS (SELECT 1 FROM suggestion_rewriting_paths WHERE sql_hash = sql_texts.sql_hash)
+                                      AND NOT EXISTS (SELECT 1 FROM query_rollups WHERE shape_hash = sql_texts.sql_hash)''',
+                                [[sql_hash] for sql_hash in texts])
+            return len(queries)
+        except Error:
+            logger.exception('Error in prune_queries')
+            return 0
+
     def list_queries(self, user_id: str) -> List[Dict]:
+        self.storage.flush()
         try:
             cur = self.db_conn.cursor()
             cur.execute('''SELECT id, 
@@ -272,32 +725,75 @@ class DataManager:
                            FROM query_log 
                           WHERE user_id = ?''', [user_id])
             return cur.fetchall()
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in list_queries')
+    
+    # One page of a user's query log, newest first, after the (timestamp, id) of the previous page's last query
+    #   (keyset pagination), with optional filters on the application, the time range [since, until)
+    #   and whether the query was rewritten / has a suggestion ('YES' or 'NO')
+    #
+    def list_queries_page(self, user_id: str, limit: int, after: Optional[tuple]=None, app_id: Optional[int]=None,
+                          since: Optional[str]=None, until: Optional[str]=None,
+                          rewritten: Optional[str]=None, suggestion: Optional[str]=None) -> List[Dict]:
+        self.storage.flush()
+        try:
+            conditions = ['user_id = ?']
+            parameters = [user_id]
+            if after is not None:
+                conditions.append('(timestamp, id) < (?, ?)')
+                parameters.extend(after)
+            for column, operator, value in (('app_id', '=', app_id), ('timestamp', '>=', since), ('timestamp', '<', until),
+                                            ('rewritten', '=', rewritten), ('suggestion', '=', suggestion)):
+                if value is not None:
+                    conditions.append(f'{column} {operator} ?')
+                    parameters.append(value)
+            # the page is fetched at once under the storage lock, not read lazily while other threads use the connection
+            with self.db_lock:
+                cur = self.db_conn.cursor()
+                cur.execute(f'''SELECT id, 
+                                  timestamp, 
+                                  rewritten,
+                                  before_latency,
+                                  after_latency, 
+                                  sql,
+                                  suggestion,
+                                  suggested_latency,
+                                  app_name
+                           FROM query_log 
+                          WHERE {' AND '.join(conditions)}
+                          ORDER BY timestamp DESC, id DESC
+                          LIMIT ?''', parameters + [limit])
+                return cur.fetchall()
+        except Error:
+            logger.exception('Error in list_queries_page')
     
     def get_original_sql(self, query_id: int) -> str:
+        self.storage.flush()
         try:
             cur = self.db_conn.cursor()
             cur.execute('''SELECT original_sql
                            FROM queries 
                            WHERE id = ?''', [query_id])
             return cur.fetchall()[0]
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in get_original_sql')
     
     def list_rewritings(self, query_id: int) -> List[Dict]:
+        self.storage.flush()
         try:
             cur = self.db_conn.cursor()
             cur.execute('''SELECT seq, 
                                   name, 
-                                  rewritten_sql
+                                  IFNULL(sql_texts.sql, rewritten_sql)
                            FROM rewriting_paths LEFT JOIN rules ON rules.id = rewriting_paths.rule_id
+                                LEFT JOIN sql_texts ON sql_texts.sql_hash = rewriting_paths.sql_hash
                            WHERE query_id = ?''', [query_id])
-            return cur.fetchall()
-        except Error as e:
-            print(e)
+            return [row[:-1] + (DataManager.decode_sql_text(row[-1]),) for row in cur.fetchall()]
+        except Error:
+            logger.exception('Error in list_rewritings')
     
     def list_suggestion_rewritings(self, query_id: int) -> List[Dict]:
+        self.storage.flush()
         try:
             cur = self.db_conn.cursor()
             cur.execute('''SELECT seq, 
@@ -305,60 +801,71 @@ class DataManager:
                                   rules.id,
                                   rules.user_id,
                                   users.email,
-                                  rewritten_sql
+                                  IFNULL(sql_texts.sql, rewritten_sql)
                            FROM suggestion_rewriting_paths
                                 LEFT JOIN rules ON rules.id = suggestion_rewriting_paths.rule_id
                                 JOIN users on rules.user_id = users.id
+                                LEFT JOIN sql_texts ON sql_texts.sql_hash = suggestion_rewriting_paths.sql_hash
                            WHERE query_id = ?''', [query_id])
-            return cur.fetchall()
-        except Error as e:
-            print(e)
+            return [row[:-1] + (DataManager.decode_sql_text(row[-1]),) for row in cur.fetchall()]
+        except Error:
+            logger.exception('Error in list_suggestion_rewritings')
     
-    def update_user(self, user: dict) -> None:
+    def update_user(self, user: dict) -> bool:
         try:
             cur = self.db_conn.cursor()
             cur.execute('''REPLACE INTO users (id, email) 
                                        VALUES (?, ?)''', 
                         [user['id'], user['email']])
             self.db_conn.commit()
-        except Error as e:
-            print('[Error] in update_user:')
-            print(e)
+            return True
+        except Error:
+            logger.exception('Error in update_user')
+            return False
     
-    def update_application(self, app: dict) -> None:
+    def update_application(self, app: dict) -> bool:
         try:
-            cur = self.db_conn.cursor()
-            cur.execute('''REPLACE INTO applications (id, name, guid, user_id) 
-                                        VALUES (?, ?, ?, ?) ''', 
-                        [app['id'], app['name'], app['guid'], app['user_id']])
-            self.db_conn.commit()
-        except Error as e:
-            print('[Error] in update_application:')
-            print(e)
+            with self.storage.transaction() as cur:
+                cur.execute('''SELECT guid FROM applications WHERE id = ?''', [app['id']])
+                previous = cur.fetchone()
+                cur.execute('''REPLACE INTO applications (id, name, guid, user_id) 
+                                            VALUES (?, ?, ?, ?) ''', 
+                            [app['id'], app['name'], app['guid'], app['user_id']])
+                if previous is None or previous[0] != app['guid']:
+                    DataManager.record_application_change(cur, [previous and previous[0], app['guid']])
+            return True
+        except Error:
+            logger.exception('Error in update_application')
+            return False
 
     def save_application(self, app: dict) -> None:
         try:
-            cur = self.db_conn.cursor()
-            if(app['id'] == -1):
-                cur.execute('''SELECT IFNULL(MAX(id), 0) + 1 FROM applications;''')
-                app['id'] = cur.fetchone()[0]
-            cur.execute('''INSERT INTO applications (id, name, guid, user_id) 
-                                    VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET
-                                    name=excluded.name''', 
-                        [app['id'], app['name'], app['guid'], app['user_id']])
-            self.db_conn.commit()
-        except Error as e:
-            print('[Error] in save_application:')
-            print(e)
+            with self.storage.transaction() as cur:
+                if(app['id'] == -1):
+                    cur.execute('''SELECT IFNULL(MAX(id), 0) + 1 FROM applications;''')
+                    app['id'] = cur.fetchone()[0]
+                cur.execute('''SELECT 1 FROM applications WHERE id = ?''', [app['id']])
+                created = cur.fetchone() is None
+                cur.execute('''INSERT INTO applications (id, name, guid, user_id) 
+                                        VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET
+                                        name=excluded.name''', 
+                            [app['id'], app['name'], app['guid'], app['user_id']])
+                # (the guid of an existing application is not updated)
+                if created:
+                    DataManager.record_application_change(cur, [app['guid']])
+        except Error:
+            logger.exception('Error in save_application')
 
     def delete_application(self, app: dict) -> bool:
         try:
-            cur = self.db_conn.cursor()
-            cur.execute('''DELETE FROM applications WHERE id = ? AND user_id = ?''', [app['id'], app['user_id']])
-            self.db_conn.commit()
+            with self.storage.transaction() as cur:
+                cur.execute('''SELECT guid FROM applications WHERE id = ? AND user_id = ?''', [app['id'], app['user_id']])
+                guids = [row[0] for row in cur.fetchall()]
+                cur.execute('''DELETE FROM applications WHERE id = ? AND user_id = ?''', [app['id'], app['user_id']])
+                DataManager.record_application_change(cur, guids)
             return True
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in delete_application')
             return False
     
     def list_applications(self, user_id: str) -> List[Dict]:
@@ -370,8 +877,8 @@ class DataManager:
                            FROM applications
                            WHERE applications.user_id = ?''', [user_id])
             return cur.fetchall()
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in list_applications')
     
     def create_user(self, user: dict) -> bool:
         try:
@@ -380,38 +887,49 @@ class DataManager:
                         [user['id'], user['email']])
             self.db_conn.commit()
             return True
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in create_user')
             return False
     
     def fetch_query(self, guid: str) -> dict:
+        # (on the writer's schedule: a query is fetched off the request thread, see background_suggest_rewritings())
+        self.storage.flush(force=False)
         try:
             cur = self.db_conn.cursor()
+            query_id = DataManager.recent_query_id(guid)
+            if query_id is not None:
+                cur.execute('''SELECT id, 
+                                      rewritten,
+                                      sql
+                               FROM query_log
+                              WHERE id = ?''', [query_id])
+                rows = cur.fetchall()
+                if rows:
+                    return rows[0]
             cur.execute('''SELECT query_log.id, 
                                   query_log.rewritten,
                                   query_log.sql
                            FROM query_log JOIN queries ON query_log.id = queries.id
                           WHERE queries.guid = ?''', [guid])
             return cur.fetchall()[0]
-        except Error as e:
-            print(e)
+        except Error:
+            logger.exception('Error in fetch_query')
     
     def log_query_suggestion(self, query_id: int, rewritten_query: str, rewriting_path: list) -> None:
         try:
-            cur = self.db_conn.cursor()
             # TODO - estimate the query_time_ms for suggested rewritten_sql
-            cur.execute('''INSERT INTO suggestions (query_id, query_time_ms, rewritten_sql) 
-                                       VALUES (?, ?, ?)''', 
-                        [query_id, -1000, rewritten_query])
-            seq = 1
-            for rewriting in rewriting_path:
-                cur.execute('''INSERT INTO suggestion_rewriting_paths (query_id, seq, rule_id, rewritten_sql)
-                                           VALUES (?, ?, ?, ?)''', 
-                            [query_id, seq, rewriting[0], rewriting[1]])
-                seq += 1
-            self.db_conn.commit()
-        except Error as e:
-            print(e)
+            texts, rewritings = DataManager.rewriting_rows(query_id, rewriting_path)
+            self.storage.append([
+                ('''INSERT OR IGNORE INTO sql_texts (sql_hash, sql) VALUES (?, ?)''', texts),
+                ('''INSERT INTO suggestions (query_id, query_time_ms, rewritten_sql) 
+                                     VALUES (?, ?, ?)''', 
+                 [[query_id, -1000, rewritten_query]]),
+                ('''INSERT INTO suggestion_rewriting_paths (query_id, seq, rule_id, sql_hash)
+                                                    VALUES (?, ?, ?, ?)''', 
+                 rewritings),
+            ])
+        except Error:
+            logger.exception('Error in log_query_suggestion')
 
 
 if __name__ == '__main__':
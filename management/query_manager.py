@@ -1,7 +1,7 @@
 import sys
 # append the path of the parent directory
 sys.path.append("..")
-from management.data_manager import DataManager
+from management.data_manager import DataManager, MAX_PAGE_SIZE
 import json
 
 
@@ -13,28 +13,68 @@ class QueryManager:
     def __del__(self):
         del self.dm
     
-    def log_query(self, appguid: str, guid: str, original_query: str, rewritten_query: str, rewriting_path: list) -> None:
-        self.dm.log_query(appguid, guid, original_query, rewritten_query, rewriting_path)
+    def log_query(self, appguid: str, guid: str, original_query: str, rewritten_query: str, rewriting_path: list) -> int:
+        return self.dm.log_query(appguid, guid, original_query, rewritten_query, rewriting_path)
     
     def report_query(self, appguid: str, guid: str, query_time_ms: int) -> None:
         self.dm.report_query(appguid, guid, query_time_ms)
 
     def list_queries(self, user_id: str) -> list:
-        queries = self.dm.list_queries(user_id)
-        res = []
-        for query in queries:
-            res.append({
-                'id': query[0],
-                'timestamp': query[1],
-                'rewritten': query[2],
-                'before_latency': query[3],
-                'after_latency': query[4],
-                'sql': query[5],
-                'suggestion': query[6],
-                'suggested_latency': query[7],
-                'app_name': query[8]
-            })
+        return list(self.iter_queries(user_id))
+
+    # One page of a user's query log (newest first) and the cursor of the next page (None after the last page),
+    #   filters: app_id, since, until (timestamps), rewritten, suggestion (True/False)
+    #
+    def list_queries_page(self, user_id: str, limit: int=None, cursor: str=None, **filters) -> dict:
+        limit = DataManager.page_size(limit)
+        rows = self.dm.list_queries_page(user_id, limit, DataManager.decode_cursor(cursor), **QueryManager.query_filters(filters))
+        if rows is None:
+            raise RuntimeError('Failed to list the queries')
+        return {
+            'queries': [QueryManager.query_json(row) for row in rows],
+            'next_cursor': DataManager.encode_cursor([rows[-1][1], rows[-1][0]]) if len(rows) == limit else None
+        }
+
+    # Iterate over all the (filtered) queries of a user page by page, holding one page in memory at a time
+    #
+    def iter_queries(self, user_id: str, **filters):
+        filters = QueryManager.query_filters(filters)
+        after = None
+        while True:
+            rows = self.dm.list_queries_page(user_id, MAX_PAGE_SIZE, after, **filters)
+            if rows is None:
+                raise RuntimeError('Failed to list the queries')
+            for row in rows:
+                yield QueryManager.query_json(row)
+            if len(rows) < MAX_PAGE_SIZE:
+                return
+            after = (rows[-1][1], rows[-1][0])
+
+    @staticmethod
+    def query_filters(filters: dict) -> dict:
+        res = {}
+        for key in ('app_id', 'since', 'until'):
+            if filters.get(key) is not None:
+                res[key] = filters[key]
+        for key in ('rewritten', 'suggestion'):
+            value = filters.get(key)
+            if value is not None:
+                res[key] = value.upper() if isinstance(value, str) else ('YES' if value else 'NO')
         return res
+
+    @staticmethod
+    def query_json(query: tuple) -> dict:
+        return {
+            'id': query[0],
+            'timestamp': query[1],
+            'rewritten': query[2],
+            'before_latency': query[3],
+            'after_latency': query[4],
+            'sql': query[5],
+            'suggestion': query[6],
+            'suggested_latency': query[7],
+            'app_name': query[8]
+        }
     
     def rewriting_path(self, query_id: str) -> dict:
         original_sql = self.dm.get_original_sql(query_id)
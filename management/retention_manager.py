@@ -0,0 +1,64 @@
+import sys
+# append the path of the parent directory
+sys.path.append("..")
+from management.data_manager import DataManager
+import datetime
+import logging
+import os
+import threading
+import time
+
+
+# age (days) after which logged queries are rolled up and pruned, 0 keeps them forever
+RETENTION_DAYS = int(os.environ.get('QUERYBOOSTER_RETENTION_DAYS', '0'))
+
+# queries pruned per transaction, and the pause between two batches so that the server's writes get through
+RETENTION_BATCH_SIZE = 500
+RETENTION_BATCH_PAUSE = 0.1
+
+# seconds between two retention runs
+RETENTION_INTERVAL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionManager:
+
+    def __init__(self, dm: DataManager, retention_days: int=RETENTION_DAYS, batch_size: int=RETENTION_BATCH_SIZE) -> None:
+        self.dm = dm
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+
+    def __del__(self):
+        del self.dm
+
+    # Roll up and prune all the queries older than the retention, batch by batch,
+    #   returns the number of pruned queries
+    #
+    def run_once(self, now: datetime.datetime=None) -> int:
+        if self.retention_days <= 0:
+            return 0
+        before = str((now or datetime.datetime.now()) - datetime.timedelta(days=self.retention_days))
+        pruned = 0
+        while True:
+            count = self.dm.prune_queries(before, self.batch_size)
+            pruned += count
+            if count < self.batch_size:
+                return pruned
+            time.sleep(RETENTION_BATCH_PAUSE)
+
+    # Run the retention in a background (daemon) thread every `interval` seconds
+    #
+    def start(self, interval: float=RETENTION_INTERVAL) -> threading.Thread:
+        def run():
+            while True:
+                try:
+                    pruned = self.run_once()
+                    if pruned > 0:
+                        logger.info('Pruned %d queries older than %d days', pruned, self.retention_days)
+                except Exception:
+                    logger.exception('Failed to prune the queries older than %d days', self.retention_days)
+                time.sleep(interval)
+        thread = threading.Thread(target=run, name='QueryBooster Retention', daemon=True)
+        thread.start()
+        return thread
@@ -1,10 +1,29 @@
 import sys
 # append the path of the parent directory
 sys.path.append("..")
-from management.data_manager import DataManager
+from management.data_manager import DataManager, MAX_PAGE_SIZE
 from core.rule_parser import RuleParser
-from data.rules import get_rules
+from core.schema_catalog import SchemaCatalog
+from data.rules import get_rules, get_rules_checksum
 import json
+import logging
+import os
+import threading
+from typing import Optional
+
+# compiled enabled rules of the applications, shared by all the RuleManager instances of the process:
+#   (storage, appguid) -> (version, {rule id: rule}), kept up to date by applying
+#   only the application's rule changes after version (see DataManager.rule_changes());
+#   an entry is replaced, never modified, and the database is read outside of the lock
+_enabled_rules = {}
+_enabled_rules_lock = threading.Lock()
+
+# directory of the applications' schema catalogs, <appguid>.sql (a DDL file) or <appguid>.db (a SQLite database),
+#   against which their rules' constraints are checked (see RuleManager.fetch_catalog());
+#   constraints are not checked for an application without one (QUERYBOOSTER_SCHEMA_DIR, unset by default)
+SCHEMA_DIR = os.environ.get('QUERYBOOSTER_SCHEMA_DIR')
+
+logger = logging.getLogger(__name__)
 
 
 class RuleManager:
@@ -13,9 +32,14 @@ class RuleManager:
         self.dm = dm
         self.__init_rules()
     
+    # Seed the built-in rules once per database, and again only when their definitions change
+    #
     def __init_rules(self) -> None:
-        for rule in get_rules():
-            self.dm.update_rule(rule)
+        self.dm.bootstrap('rules', get_rules_checksum(), self.__seed_rules)
+
+    def __seed_rules(self) -> bool:
+        # (every rule is seeded, even after a failure)
+        return all([self.dm.update_rule(rule) for rule in get_rules()])
     
     def __del__(self):
         del self.dm
@@ -30,20 +54,67 @@ class RuleManager:
     def delete_rule(self, rule: dict) -> bool:
         return self.dm.delete_rule(rule)
     
+    # The compiled rules enabled for an application, in id order
+    #   Note: the rules are compiled once per process and then maintained from the application's change feed,
+    #         so that a call costs one lookup of the feed's version when no rule changed
+    #
     def fetch_enabled_rules(self, appguid: str) -> list:
-        enabled_rules = self.dm.enabled_rules(appguid)
-        res = []
-        for enabled_rule in enabled_rules:
-            res.append({
-                'id': enabled_rule[0],
-                'key': enabled_rule[1],
-                'name': enabled_rule[2],
-                'pattern_json': json.loads(enabled_rule[3]),
-                'constraints_json': json.loads(enabled_rule[4]),
-                'rewrite_json': json.loads(enabled_rule[5]),
-                'actions_json': json.loads(enabled_rule[6])
-            })
-        return res
+        version = self.dm.rule_version(appguid)
+        key = (self.dm.storage, appguid)
+        with _enabled_rules_lock:
+            entry = _enabled_rules.get(key)
+        if entry is not None and entry[0] == version:
+            return list(entry[1].values())
+        # (a feed behind our version means the database was replaced, reload)
+        entry = self.__apply_rule_changes(appguid, entry) if entry is not None and entry[0] < version else None
+        if entry is None:
+            entry = (version, {row[0]: RuleManager.enabled_rule_json(row) for row in self.dm.enabled_rules(appguid) or []})
+        with _enabled_rules_lock:
+            current = _enabled_rules.get(key)
+            # (unless a concurrent call already stored a newer version of the same database)
+            if current is None or current[0] <= entry[0] or current[0] > version:
+                _enabled_rules[key] = entry
+        return list(entry[1].values())
+
+    # Apply the changes of an application's rule feed after the cached version to a copy of its cached rules,
+    #   None if the rules must be reloaded (the application changed or the feed was trimmed)
+    #
+    def __apply_rule_changes(self, appguid: str, entry: tuple) -> Optional[tuple]:
+        feed = self.dm.rule_changes(appguid, entry[0])
+        if not feed or any(change == 'reset' for _, _, change in feed):
+            return None
+        changes = {rule_id: change for _, rule_id, change in feed}
+        rules = {rule_id: rule for rule_id, rule in entry[1].items() if rule_id not in changes}
+        updated = [rule_id for rule_id, change in changes.items() if change in ('enable', 'update')]
+        if updated:
+            for row in self.dm.enabled_rules(appguid, updated) or []:
+                rules[row[0]] = RuleManager.enabled_rule_json(row)
+        return (feed[-1][0], dict(sorted(rules.items())))
+
+    @staticmethod
+    def enabled_rule_json(rule: tuple) -> dict:
+        return {
+            'id': rule[0],
+            'key': rule[1],
+            'name': rule[2],
+            'pattern_json': json.loads(rule[3]),
+            'constraints_json': json.loads(rule[4]),
+            'rewrite_json': json.loads(rule[5]),
+            'actions_json': json.loads(rule[6])
+        }
+
+    # The schema catalog of an application (see SCHEMA_DIR), None if it has none
+    #   Note: a catalog is loaded once per process and reloaded only when its file changes (see SchemaCatalog.load())
+    #
+    @staticmethod
+    def fetch_catalog(appguid: str) -> Optional[SchemaCatalog]:
+        if not SCHEMA_DIR or not appguid or os.path.basename(appguid) != appguid:
+            return None
+        for extension in ('.sql', '.db'):
+            path = os.path.join(SCHEMA_DIR, appguid + extension)
+            if os.path.isfile(path):
+                return SchemaCatalog.load(path)
+        return None
 
     def fetch_all_rules(self) -> list:
         rules = self.dm.all_rules()
@@ -72,46 +143,54 @@ class RuleManager:
                 'rewrite': rule[5],
                 'actions': rule[6]
             }
-        except Exception as e:
-            print(e)
+        except Exception:
+            logger.exception('Error in fetch_rule')
             return {}
     
     def list_rules(self, user_id: str, app_id: str) -> list:
-        rules = self.dm.list_rules(user_id)
-        # group the rule together and 
-        # list its enabled applications
-        rule_applications = {}
-        for rule in rules:
-            rule_id = rule[0]
-            application_id = rule[7]
-            application_name = rule[8]
-            if application_id is not None:
-                if rule_id in rule_applications:
-                    rule_applications[rule_id].append({"app_id": application_id, "app_name": application_name})
-                else:
-                    rule_applications[rule_id] = [{"app_id": application_id, "app_name": application_name}]
-            else:
-                rule_applications[rule_id] = []
-        res = []
-        visited_rule_ids = []
-        for rule in rules:
-            if rule[0] not in visited_rule_ids:
-                enabled_application_num = len(rule_applications[rule[0]])
-                enabled_application_id = [rule_applications[rule[0]][i]["app_id"] for i in range(enabled_application_num)]
-                if app_id == None or (int(app_id) in enabled_application_id):
-                    res.append({
-                        'id': rule[0],
-                        'key': rule[1],
-                        'name': rule[2],
-                        'pattern': rule[3],
-                        'constraints': rule[4],
-                        'rewrite': rule[5],
-                        'actions': rule[6],
-                        'enabled_apps': rule_applications[rule[0]]
-                    })
-                visited_rule_ids.append(rule[0])
+        return list(self.iter_rules(user_id, app_id))
 
-        return res
+    # One page of a user's rules (in id order), each with its enabled applications,
+    #   and the cursor of the next page (None after the last page)
+    #
+    def list_rules_page(self, user_id: str, app_id: str=None, limit: int=None, cursor: str=None) -> dict:
+        limit = DataManager.page_size(limit)
+        after = DataManager.decode_cursor(cursor)
+        rows = self.dm.list_rules_page(user_id, limit, after, None if app_id is None else int(app_id))
+        if rows is None:
+            raise RuntimeError('Failed to list the rules')
+        return {
+            'rules': [RuleManager.rule_json(row) for row in rows],
+            'next_cursor': DataManager.encode_cursor(rows[-1][0]) if len(rows) == limit else None
+        }
+
+    # Iterate over all the rules of a user page by page, holding one page in memory at a time
+    #
+    def iter_rules(self, user_id: str, app_id: str=None):
+        app_id = None if app_id is None else int(app_id)
+        after = None
+        while True:
+            rows = self.dm.list_rules_page(user_id, MAX_PAGE_SIZE, after, app_id)
+            if rows is None:
+                raise RuntimeError('Failed to list the rules')
+            for row in rows:
+                yield RuleManager.rule_json(row)
+            if len(rows) < MAX_PAGE_SIZE:
+                return
+            after = rows[-1][0]
+
+    @staticmethod
+    def rule_json(rule: tuple) -> dict:
+        return {
+            'id': rule[0],
+            'key': rule[1],
+            'name': rule[2],
+            'pattern': rule[3],
+            'constraints': rule[4],
+            'rewrite': rule[5],
+            'actions': rule[6],
+            'enabled_apps': json.loads(rule[7]) if rule[7] else []
+        }
         
     def transform_rule_graph(self, root_rule: dict) -> dict:
         rules = []
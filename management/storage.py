@@ -0,0 +1,252 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+# Storage backends of DataManager
+#   Usage: QUERYBOOSTER_STORAGE=batched-sqlite:///var/lib/querybooster/querybooster.db python3 server.py
+#
+#   - sqlite:         (default) every write is committed to the database file before the call returns,
+#   - batched-sqlite: appends to the write-heavy log tables (queries, rewriting_paths, suggestion_rewriting_paths)
+#                     and the reported latencies are queued in memory and group-committed, in order, by a background
+#                     writer thread, so that a high-volume application pays one transaction per batch instead of
+#                     one per query (and per report).
+#   Ids of the log tables are allocated in blocks reserved in the database (id_blocks),
+#     so that appended rows get their ids without waiting for (or scanning) the table.
+
+DEFAULT_STORAGE_URL = 'sqlite:///' + os.path.abspath(Path(__file__).parent / '../querybooster.db')
+
+# ids reserved from id_blocks at once
+ID_BLOCK_SIZE = 1000
+
+# the batched writer commits as soon as this many rows are queued, or after FLUSH_INTERVAL seconds
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.05
+
+# an append blocks while this many rows are queued (i.e., while the writer is behind)
+MAX_PENDING_ROWS = 100 * BATCH_SIZE
+
+# attempts to commit a batch while the database is locked (e.g., by another process) before the writer
+#   puts it back in front of the queue and tries again
+COMMIT_ATTEMPTS = 10
+
+logger = logging.getLogger(__name__)
+
+# opened storages by URL (see SQLiteStorage.open()), shared by all the DataManager instances of the process
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+class SQLiteStorage:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # the connection is shared by the server's request threads,
+        #   multi-statement writes hold this lock so that their transactions do not interleave
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        # table -> [next id, last id] of the id block reserved by this process
+        self.id_blocks = {}
+        self.id_blocks_lock = threading.Lock()
+
+    # Open (or reuse) the storage of a URL: 'sqlite:///<path>' or 'batched-sqlite:///<path>'
+    #
+    @staticmethod
+    def open(url: Optional[str]=None) -> 'SQLiteStorage':
+        url = url or os.environ.get('QUERYBOOSTER_STORAGE') or DEFAULT_STORAGE_URL
+        with _storages_lock:
+            storage = _storages.get(url)
+            if storage is None:
+                scheme, _, path = url.partition(':///')
+                if scheme == 'sqlite':
+                    storage = SQLiteStorage(path)
+                elif scheme == 'batched-sqlite':
+                    storage = BatchedSQLiteStorage(path)
+                else:
+                    raise ValueError(f"Unknown storage {url!r}, expected 'sqlite:///<path>' or 'batched-sqlite:///<path>'")
+                _storages[url] = storage
+            return storage
+
+    # A write transaction: the body's statements are committed together, or rolled back on error
+    #
+    @contextmanager
+    def transaction(self):
+        with self.lock, self.conn:
+            yield self.conn.cursor()
+
+    # Allocate the next id of a table from this process's block, reserving a new block when it is used up
+    #
+    def allocate_id(self, table: str) -> int:
+        with self.id_blocks_lock:
+            block = self.id_blocks.get(table)
+            if block is None or block[0] > block[1]:
+                block = self.id_blocks[table] = self.reserve_ids(table, ID_BLOCK_SIZE)
+            block[0] += 1
+            return block[0] - 1
+
+    # Reserve `count` ids of a table in id_blocks, returns [first id, last id]
+    #   (the first reservation of a table starts after its largest id)
+    #
+    def reserve_ids(self, table: str, count: int) -> list:
+        with self.transaction() as cur:
+            cur.execute(f'''INSERT OR IGNORE INTO id_blocks (name, next_id)
+                                 SELECT ?, IFNULL(MAX(id), 0) + 1 FROM {table}''', [table])
+            cur.execute('''UPDATE id_blocks SET next_id = next_id + ? WHERE name = ?''', [count, table])
+            cur.execute('''SELECT next_id FROM id_blocks WHERE name = ?''', [table])
+            next_id = cur.fetchone()[0]
+        return [next_id - count, next_id - 1]
+
+    # Append writes to log tables, as one unit: [(INSERT/UPDATE statement, [row parameters, ...]), ...],
+    #   applied after the previous appends; if they cannot be written, the error is raised here,
+    #   or, by a storage that writes them later, dropped() is called instead (see BatchedSQLiteStorage)
+    #
+    def append(self, writes: List[Tuple[str, list]], dropped: Optional[Callable[[], None]]=None) -> None:
+        with self.transaction() as cur:
+            for sql, rows in writes:
+                cur.executemany(sql, rows)
+
+    # Make all the appended rows visible to reads (nothing is buffered by this storage),
+    #   force=False waits for the writer's schedule instead of cutting the current batch short
+    #
+    def flush(self, force: bool=True) -> None:
+        return
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+
+class BatchedSQLiteStorage(SQLiteStorage):
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        # readers keep reading while the writer commits
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.pending = []
+        self.pending_rows = 0
+        # number of appends queued / written (committed or failed), flush() waits for the writer to catch up
+        self.queued = 0
+        self.committed = 0
+        # number of appends that could not be committed (see commit_batch())
+        self.failed = 0
+        self.closing = False
+        self.condition = threading.Condition()
+        self.writer = threading.Thread(target=self.write_batches, name='QueryBooster Batched Writer', daemon=True)
+        self.writer.start()
+        # the writer is a daemon thread: drain the queued appends before the process exits
+        atexit.register(self.close)
+
+    def append(self, writes: List[Tuple[str, list]], dropped: Optional[Callable[[], None]]=None) -> None:
+        with self.condition:
+            # backpressure: wait for the writer to catch up
+            while self.pending_rows >= MAX_PENDING_ROWS and self.writer.is_alive() and not self.closing:
+                self.condition.notify_all()
+                self.condition.wait(FLUSH_INTERVAL)
+            if self.closing:
+                raise sqlite3.ProgrammingError('Cannot append to a closed storage')
+            if not self.writer.is_alive():
+                # degrade to a synchronous write
+                logger.error('The batched writer stopped, writing an append synchronously')
+                super().append(writes)
+                return
+            self.pending.append((writes, dropped))
+            self.pending_rows += sum(len(rows) for _, rows in writes)
+            self.queued += 1
+            if self.pending_rows >= BATCH_SIZE:
+                self.condition.notify_all()
+
+    def flush(self, force: bool=True) -> None:
+        with self.condition:
+            target = self.queued
+            if force:
+                self.condition.notify_all()
+            while self.committed < target:
+                if not self.writer.is_alive():
+                    logger.error('The batched writer stopped with %d appends queued', target - self.committed)
+                    return
+                self.condition.wait(FLUSH_INTERVAL)
+
+    # Write the queued appends, then stop the writer
+    #
+    def close(self) -> None:
+        with self.condition:
+            if self.closing:
+                return
+            self.closing = True
+            self.condition.notify_all()
+        self.writer.join()
+        self.conn.close()
+
+    # Writer thread: group-commit the queued appends on its own connection, in the order they were queued
+    #
+    def write_batches(self) -> None:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        while True:
+            with self.condition:
+                if not self.pending:
+                    if self.closing:
+                        break
+                    self.condition.wait(FLUSH_INTERVAL)
+                elif self.pending_rows < BATCH_SIZE and not self.closing:
+                    # give a partial batch a moment to fill up, unless someone is flushing
+                    self.condition.wait(FLUSH_INTERVAL)
+                batch, self.pending, self.pending_rows = self.pending, [], 0
+            if not batch:
+                continue
+            failed, requeued = [], False
+            try:
+                error = BatchedSQLiteStorage.commit_batch(conn, [writes for writes, _ in batch])
+                if isinstance(error, sqlite3.OperationalError) and not self.closing:
+                    # still locked after all the attempts: keep the batch (and its order) and try again
+                    requeued = True
+                elif isinstance(error, sqlite3.OperationalError) or (error is not None and len(batch) == 1):
+                    failed = batch
+                elif error is not None:
+                    # e.g., an integrity error of one append: commit the others one by one
+                    failed = [append for append in batch if BatchedSQLiteStorage.commit_batch(conn, [append[0]]) is not None]
+            except Exception:
+                logger.exception('Failed to write a batch of %d appends', len(batch))
+                failed = batch
+            with self.condition:
+                if requeued:
+                    self.pending[:0] = batch
+                    self.pending_rows += sum(len(rows) for writes, _ in batch for _, rows in writes)
+                else:
+                    self.committed += len(batch)
+                    self.failed += len(failed)
+                self.condition.notify_all()
+            if failed:
+                logger.error('Dropped %d of a batch of %d appends', len(failed), len(batch))
+                for _, dropped in failed:
+                    if dropped is not None:
+                        dropped()
+        conn.close()
+
+    # Commit appends in one transaction, retrying while the database is locked;
+    #   returns None on success, or the error the transaction was rolled back on
+    #
+    @staticmethod
+    def commit_batch(conn: sqlite3.Connection, batch: list) -> Optional[Exception]:
+        error = None
+        for attempt in range(COMMIT_ATTEMPTS):
+            try:
+                with conn:
+                    for writes in batch:
+                        for sql, rows in writes:
+                            conn.executemany(sql, rows)
+                return None
+            except sqlite3.OperationalError as e:
+                # e.g., database is locked by another writer
+                logger.warning('Retrying a batch of %d appends: %s', len(batch), e)
+                error = e
+                time.sleep(0.1 * (attempt + 1))
+            except Exception as e:
+                logger.warning('Failed to commit a batch of %d appends: %s', len(batch), e)
+                return e
+        return error
@@ -12,6 +12,8 @@ CREATE TABLE IF NOT EXISTS rules(
         REFERENCES users(id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_rules_user_id ON rules(user_id);
+
 CREATE TABLE IF NOT EXISTS internal_rules(
     rule_id INTEGER UNIQUE,
     pattern_json TEXT,
@@ -24,6 +26,32 @@ CREATE TABLE IF NOT EXISTS internal_rules(
         ON DELETE CASCADE
 );
 
+-- bootstrap steps done on this database (the schema script, the seed data and the seed rules) with the checksum
+--   of what they applied, so that each step runs once per database and again only when it changed (see DataManager.bootstrap())
+CREATE TABLE IF NOT EXISTS bootstrap_versions(
+    name TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    timestamp TEXT
+);
+
+-- change feed of the rules enabled per application: every change (enable, disable, update, delete) of a rule
+--   gets the next version in the application's feed, and rule_versions holds the latest version per application,
+--   so that a worker applies only the changes after its own version (see RuleManager.fetch_enabled_rules())
+CREATE TABLE IF NOT EXISTS rule_changes(
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    appguid TEXT,
+    rule_id INTEGER,
+    change TEXT,
+    timestamp TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_rule_changes_appguid_version ON rule_changes(appguid, version);
+
+CREATE TABLE IF NOT EXISTS rule_versions(
+    appguid TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS users(
     id TEXT PRIMARY KEY,
     email TEXT
@@ -40,6 +68,9 @@ CREATE TABLE IF NOT EXISTS applications(
         ON DELETE CASCADE
 );
 
+CREATE INDEX IF NOT EXISTS idx_applications_guid ON applications(guid);
+CREATE INDEX IF NOT EXISTS idx_applications_user_id ON applications(user_id);
+
 CREATE TABLE IF NOT EXISTS enabled(
     application_id INTEGER,
     rule_id INTEGER,
@@ -54,6 +85,8 @@ CREATE TABLE IF NOT EXISTS enabled(
         ON DELETE CASCADE
 );
 
+CREATE INDEX IF NOT EXISTS idx_enabled_rule_id ON enabled(rule_id);
+
 CREATE TABLE IF NOT EXISTS queries(
     id INTEGER PRIMARY KEY,
     guid TEXT,
@@ -61,7 +94,56 @@ CREATE TABLE IF NOT EXISTS queries(
     timestamp TEXT,
     query_time_ms REAL,
     original_sql TEXT,
-    sql TEXT
+    sql TEXT,
+    original_sql_hash TEXT,
+    sql_hash TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_queries_appguid_guid ON queries(appguid, guid);
+CREATE INDEX IF NOT EXISTS idx_queries_guid ON queries(guid);
+CREATE INDEX IF NOT EXISTS idx_queries_appguid_timestamp ON queries(appguid, timestamp);
+CREATE INDEX IF NOT EXISTS idx_queries_timestamp ON queries(timestamp);
+CREATE INDEX IF NOT EXISTS idx_queries_sql_hash ON queries(sql_hash);
+
+-- SQL texts stored once, zlib-compressed, by hash
+--   (the steps of rewriting_paths and suggestion_rewriting_paths, the query shapes of query_rollups);
+--   rewritten_sql of a rewriting path is only set in the rows written before sql_texts existed
+CREATE TABLE IF NOT EXISTS sql_texts(
+    sql_hash TEXT PRIMARY KEY,
+    sql BLOB
+);
+
+-- daily aggregates of the queries pruned by the retention (see management/retention_manager.py),
+--   per application and query shape (the original SQL with its literals replaced by ?, in sql_texts)
+CREATE TABLE IF NOT EXISTS query_rollups(
+    appguid TEXT,
+    shape_hash TEXT,
+    day TEXT,
+    count INTEGER NOT NULL DEFAULT 0,
+    rewritten_count INTEGER NOT NULL DEFAULT 0,
+    reported_count INTEGER NOT NULL DEFAULT 0,
+    sum_ms REAL NOT NULL DEFAULT 0,
+    min_ms REAL,
+    max_ms REAL,
+    PRIMARY KEY (appguid, shape_hash, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_query_rollups_shape_hash ON query_rollups(shape_hash);
+
+-- next unreserved id of the log tables, reserved in blocks by each process (see management/storage.py)
+CREATE TABLE IF NOT EXISTS id_blocks(
+    name TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+
+-- latency aggregates of the reported queries per executed SQL (by hash),
+--   maintained incrementally by report_query
+CREATE TABLE IF NOT EXISTS query_stats(
+    sql_hash TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    sum_ms REAL NOT NULL DEFAULT 0,
+    min_ms REAL,
+    max_ms REAL
 );
 
 CREATE TABLE IF NOT EXISTS rewriting_paths(
@@ -69,6 +151,7 @@ CREATE TABLE IF NOT EXISTS rewriting_paths(
     seq INTEGER,
     rule_id INTEGER,
     rewritten_sql TEXT,
+    sql_hash TEXT,
     PRIMARY KEY (query_id, seq),
     CONSTRAINT fk_queries 
         FOREIGN KEY (query_id) 
@@ -80,6 +163,8 @@ CREATE TABLE IF NOT EXISTS rewriting_paths(
         ON DELETE CASCADE
 );
 
+CREATE INDEX IF NOT EXISTS idx_rewriting_paths_sql_hash ON rewriting_paths(sql_hash);
+
 CREATE TABLE IF NOT EXISTS suggestions(
     query_id INTEGER UNIQUE,
     query_time_ms REAL,
@@ -95,6 +180,7 @@ CREATE TABLE IF NOT EXISTS suggestion_rewriting_paths(
     seq INTEGER,
     rule_id INTEGER,
     rewritten_sql TEXT,
+    sql_hash TEXT,
     PRIMARY KEY (query_id, seq),
     CONSTRAINT fk_queries 
         FOREIGN KEY (query_id) 
@@ -106,6 +192,8 @@ CREATE TABLE IF NOT EXISTS suggestion_rewriting_paths(
         ON DELETE CASCADE
 );
 
+CREATE INDEX IF NOT EXISTS idx_suggestion_rewriting_paths_sql_hash ON suggestion_rewriting_paths(sql_hash);
+
 CREATE TABLE IF NOT EXISTS tables(
     id INTEGER PRIMARY KEY,
     application_id INTEGER,
@@ -134,7 +222,7 @@ SELECT q.id AS id,
        (CASE WHEN q.sql = q.original_sql THEN 'NO' 
              WHEN q.sql != q.original_sql THEN 'YES'
         END) AS rewritten,
-       (SELECT AVG(q1.query_time_ms) FROM queries q1 WHERE q1.sql=q.original_sql) AS before_latency,
+       (CASE WHEN st.count > 0 THEN st.sum_ms / st.count END) AS before_latency,
        q.query_time_ms AS after_latency,
        q.original_sql AS sql,
        (CASE WHEN s.query_id IS NOT NULL THEN 'YES' ELSE 'NO'
@@ -142,8 +230,10 @@ SELECT q.id AS id,
        (CASE WHEN s.query_id IS NOT NULL THEN s.query_time_ms ELSE -1000
         END) AS suggested_latency,
        a.user_id AS user_id,
-       a.name AS app_name
+       a.name AS app_name,
+       a.id AS app_id
   FROM queries q 
         JOIN applications a ON q.appguid = a.guid
         LEFT OUTER JOIN suggestions s ON q.id = s.query_id
+        LEFT OUTER JOIN query_stats st ON q.original_sql_hash = st.sql_hash
  ORDER BY q.timestamp DESC;
\ No newline at end of file
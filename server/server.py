@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, Response, send_from_directory, request, jsonify, stream_with_context
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 import sys
@@ -8,27 +8,60 @@ import json
 import logging
 import threading
 from io import BytesIO
+from core.json_logger import Lazy, MODULE_LOGGERS, setup_logging
 from core.profiler import Profiler
 from core.query_patcher import QueryPatcher
 from core.query_rewriter import QueryRewriter
+from core.query_rewriter_v2 import RewriteBudget
 from core.rule_generator import RuleGenerator
 from management.data_manager import DataManager
 from management.rule_manager import RuleManager
 from management.query_manager import QueryManager
 from management.app_manager import AppManager
 from management.user_manager import UserManager
+from management.retention_manager import RetentionManager, RETENTION_DAYS
 
 app = Flask(__name__, static_folder="static/static")
 app.wsgi_app = ProxyFix(
     app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1
 )
 
+# leveled JSON logs written by a background thread (QUERYBOOSTER_LOG_LEVEL, INFO by default),
+#   the request payloads and the pretty-printed queries are logged at DEBUG,
+#   together with the records of the core and management modules
+logger = setup_logging('querybooster', modules=MODULE_LOGGERS).getChild('server')
+
 dm = DataManager()
 rm = RuleManager(dm)
 qm = QueryManager(dm)
 am = AppManager(dm)
 um = UserManager(dm)
 
+# roll up and prune old query logs in the background (QUERYBOOSTER_RETENTION_DAYS, disabled by default)
+if RETENTION_DAYS > 0:
+    RetentionManager(DataManager(init=False), RETENTION_DAYS).start()
+
+# Stream a (large) JSON array item by item instead of building the whole response in memory
+#   Note: the first item (i.e., the first page) is fetched before the response starts, so that an early error
+#         is still reported by the route with a 400; an error after that is logged and leaves the array unclosed,
+#         so that the client gets an invalid body instead of a silently truncated list
+#
+def stream_json_array(items) -> Response:
+    items = iter(items)
+    first = next(items, None)
+    def generate():
+        yield '['
+        if first is not None:
+            yield json.dumps(first)
+            try:
+                for item in items:
+                    yield ',' + json.dumps(item)
+            except Exception:
+                logger.exception('stream failed', extra={'route': request.path})
+                return
+        yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 # Members API Route
 @app.route("/", methods=["GET"])
 def index():
@@ -44,8 +77,7 @@ def post_query():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/] request:")
-        print(request)
+        logger.debug('request', extra={'route': '/', 'request': request_data})
 
         cmd = request_data['cmd']
         appguid = request_data['appguid']
@@ -56,39 +88,26 @@ def post_query():
             original_query = request_data['query']
             database = request_data['db']
 
-            log_text = "\n=================================================="
-            log_text += "\n    Original query"
-            log_text += "\n--------------------------------------------------"
-            log_text += "\n appguid: " + appguid
-            log_text += "\n guid: " + guid
-            log_text += "\n db: " + database
-            log_text += "\n" + QueryRewriter.beautify(original_query)
-            log_text += "\n--------------------------------------------------"
-            print(log_text)
-
-            # Fetch enabled rules
+            # Fetch enabled rules, and the app's schema catalog to check their constraints against (if any)
             rules = rm.fetch_enabled_rules(appguid)
+            catalog = rm.fetch_catalog(appguid)
 
-            # Rewrite the query
-            rewritten_query, rewriting_path = QueryRewriter.rewrite(original_query, rules)
-            rewritten_query = QueryPatcher.patch(rewritten_query, database)
-
-            for rewriting in rewriting_path:
-                rewriting[1] = QueryPatcher.patch(rewriting[1], database)
+            # Rewrite the query, within the default per-request budget (see RewriteBudget)
+            budget = RewriteBudget()
+            rewritten_query, rewriting_path = QueryRewriter.rewrite(original_query, rules, catalog=catalog, budget=budget)
+            rewritten_query = QueryPatcher.patch_rewriting(rewritten_query, rewriting_path, database)
 
             formatted_original_query = QueryRewriter.reformat(original_query)
             qm.log_query(
                 appguid, guid, QueryPatcher.patch(formatted_original_query, database),
                 rewritten_query, rewriting_path)
-            log_text = "\n=================================================="
-            log_text += "\n    Rewritten query"
-            log_text += "\n--------------------------------------------------"
-            log_text += "\n appguid: " + appguid
-            log_text += "\n guid: " + guid
-            log_text += "\n db: " + database
-            log_text += "\n" + QueryRewriter.beautify(rewritten_query)
-            log_text += "\n--------------------------------------------------"
-            print(log_text)
+            logger.info('rewrite', extra={'appguid': appguid, 'guid': guid, 'db': database,
+                                          'rules': [rewriting[0] for rewriting in rewriting_path],
+                                          'budget_exceeded': budget.exceeded})
+            # pretty-printed (by the logging thread) only at DEBUG
+            logger.debug('rewritten query', extra={'appguid': appguid, 'guid': guid,
+                                                   'original_query': Lazy(QueryRewriter.beautify, original_query),
+                                                   'rewritten_query': Lazy(QueryRewriter.beautify, rewritten_query)})
 
             return rewritten_query
 
@@ -96,17 +115,10 @@ def post_query():
         elif cmd == 'report':
             query_time_ms = request_data['queryTimeMs']
 
-            log_text = "\n=================================================="
-            log_text += "\n    Report query time ms"
-            log_text += "\n--------------------------------------------------"
-            log_text += "\n appguid: " + appguid
-            log_text += "\n guid: " + guid
-            log_text += "\n query_time_ms: " + str(query_time_ms)
-            log_text += "\n--------------------------------------------------"
-            logging.info(log_text)
+            logger.info('report', extra={'appguid': appguid, 'guid': guid, 'query_time_ms': query_time_ms})
             qm.report_query(appguid, guid, query_time_ms)
             # Start a background thread to suggest rewritings for this query
-            threading.Thread(target=background_suggest_rewritings, name='Background Suggest Rewritings', args=[guid]).start()
+            threading.Thread(target=background_suggest_rewritings, name='Background Suggest Rewritings', args=[guid, appguid]).start()
 
             return 'true'
 
@@ -119,8 +131,7 @@ def create_user():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/createUser] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/createUser', 'request': request_data})
 
         success = um.create_user(request_data)
 
@@ -134,14 +145,15 @@ def list_rules():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/listRules] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/listRules', 'request': request_data})
 
         user_id = request_data.get('user_id')
         app_id = request_data.get('app_id')
-        rules_json = rm.list_rules(user_id, app_id)
+        # keyset-paginated: {'rules': [...], 'next_cursor': ...}
+        if 'limit' in request_data or 'cursor' in request_data:
+            return jsonify(rm.list_rules_page(user_id, app_id, request_data.get('limit'), request_data.get('cursor'))), 200
 
-        return jsonify(rules_json), 200
+        return stream_json_array(rm.iter_rules(user_id, app_id)), 200
     except Exception as e:
         return jsonify(str(e)), 400
 
@@ -151,8 +163,7 @@ def delete_rule():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/deleteRule] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/deleteRule', 'request': request_data})
 
         success = rm.delete_rule(request_data)
 
@@ -166,8 +177,7 @@ def save_rule():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/saveRule] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/saveRule', 'request': request_data})
 
         rule = request_data.get('rule')
         user_id = request_data.get('user_id')
@@ -183,8 +193,7 @@ def recommend_rule():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/recommendRule] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/recommendRule', 'request': request_data})
 
         q0 = request_data.get("q0")
         q1 = request_data.get("q1")
@@ -204,8 +213,7 @@ def recommend_rules():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/recommendRules] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/recommendRules', 'request': request_data})
 
         database = request_data.get('database')
         examples = request_data.get('examples')
@@ -227,8 +235,7 @@ def generate_rule_graph():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/generateRuleGraph] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/generateRuleGraph', 'request': request_data})
 
         q0 = request_data.get("q0")
         q1 = request_data.get("q1")
@@ -243,8 +250,8 @@ def generate_rule_graph():
             rule['rewrite'] = QueryPatcher.patch(rule['rewrite'], 'postgresql')
 
         # Logging
-        print("\n[/generateRuleGraph] profiles:")
-        print(Profiler.show())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('profiles', extra={'route': '/generateRuleGraph', 'profiles': Profiler.show()})
 
         return jsonify(rule_graph_json), 200
     except Exception as e:
@@ -256,8 +263,7 @@ def generate_rules_graph():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        logging.info("\n[/generateRulesGraph] request:")
-        logging.info(request_data)
+        logger.debug('request', extra={'route': '/generateRulesGraph', 'request': request_data})
 
         # Extract data from the JSON request
         database = request_data['database']
@@ -273,8 +279,8 @@ def generate_rules_graph():
             rule['rewrite'] = QueryPatcher.patch(rule['rewrite'], database)
 
         # Logging
-        logging.info("\n[/generateRulesGraph] profiles:")
-        logging.info(Profiler.show())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('profiles', extra={'route': '/generateRulesGraph', 'profiles': Profiler.show()})
 
         return jsonify(rule_graph_json), 200
     except Exception as e:
@@ -286,8 +292,7 @@ def enable_rule():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/enableRule] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/enableRule', 'request': request_data})
 
         rule = request_data.get('rule')
         app = request_data.get('app')
@@ -303,8 +308,7 @@ def disable_rule():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/disableRule] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/disableRule', 'request': request_data})
 
         rule = request_data.get('rule')
         app = request_data.get('app')
@@ -320,13 +324,15 @@ def list_queries():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/listQueries] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/listQueries', 'request': request_data})
 
         user_id = request_data.get('user_id')
-        queries_json = qm.list_queries(user_id)
+        filters = {key: request_data.get(key) for key in ('app_id', 'since', 'until', 'rewritten', 'suggestion')}
+        # keyset-paginated: {'queries': [...], 'next_cursor': ...}
+        if 'limit' in request_data or 'cursor' in request_data:
+            return jsonify(qm.list_queries_page(user_id, request_data.get('limit'), request_data.get('cursor'), **filters)), 200
 
-        return jsonify(queries_json), 200
+        return stream_json_array(qm.iter_queries(user_id, **filters)), 200
     except Exception as e:
         return jsonify(str(e)), 400
 
@@ -336,8 +342,7 @@ def rewriting_path():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/rewritingPath] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/rewritingPath', 'request': request_data})
 
         query_id = request_data.get('queryId')
         rewriting_path_json = qm.rewriting_path(query_id)
@@ -346,14 +351,21 @@ def rewriting_path():
     except Exception as e:
         return jsonify(str(e)), 400
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    try:
+        # Rewrite pipeline metrics: per-phase and per-rule latency histograms and counters
+        return jsonify(Profiler.metrics()), 200
+    except Exception as e:
+        return jsonify(str(e)), 400
+
 @app.route('/listApplications', methods=['POST'])
 def list_applications():
     try:
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/listApplications] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/listApplications', 'request': request_data})
 
         user_id = request_data.get('user_id') if 'user_id' in request_data else None
         applications_json = am.list_applications(user_id)
@@ -368,8 +380,7 @@ def save_application():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/saveApplication] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/saveApplication', 'request': request_data})
 
         success = am.save_application(request_data)
 
@@ -383,8 +394,7 @@ def delete_application():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        logging.info("\n[/deleteApplication] request:")
-        logging.info(request_data)
+        logger.debug('request', extra={'route': '/deleteApplication', 'request': request_data})
 
         # Extract data from the JSON request
         application = request_data['app']
@@ -401,8 +411,7 @@ def suggestion_rewriting_path():
         request_data = json.loads(request.data, strict=False)
 
         # Logging
-        print("\n[/suggestionRewritingPath] request:")
-        print(request_data)
+        logger.debug('request', extra={'route': '/suggestionRewritingPath', 'request': request_data})
 
         query_id = request_data.get('queryId')
         suggestion_rewriting_path_json = qm.suggestion_rewriting_path(query_id)
@@ -411,47 +420,33 @@ def suggestion_rewriting_path():
     except Exception as e:
         return jsonify(str(e)), 400
 
-def background_suggest_rewritings(guid):
+def background_suggest_rewritings(guid, appguid):
     _dm = DataManager(init=False)
     _qm = QueryManager(_dm)
     _rm = RuleManager(_dm)
 
-    log_text = ""
-    log_text += "\n=================================================="
-    log_text += "\n   Background suggest rewritings [Started]"
-    log_text += "\n--------------------------------------------------"
-    log_text += "\n guid: " + guid
-    print(log_text)
+    logger.debug('suggest rewritings started', extra={'guid': guid})
 
     # Fetch the query with the given guid
     query = _qm.fetch_query(guid)
     if query['rewritten'] == 'NO':
         # Suggest rewritings for the query
         original_query = query['sql']
-        log_text = ""
-        log_text += "\n--------------------------------------------------"
-        log_text += "\n    Original query"
-        log_text += "\n--------------------------------------------------"
-        log_text += "\n" + QueryRewriter.beautify(original_query)
-        print(log_text)
         # Fetch all rules
         rules = _rm.fetch_all_rules()
-        rewritten_query, rewriting_path = QueryRewriter.rewrite(original_query, rules)
-        rewritten_query = QueryPatcher.patch(rewritten_query)
-        for rewriting in rewriting_path:
-            rewriting[1] = QueryPatcher.patch(rewriting[1])
+        budget = RewriteBudget()
+        rewritten_query, rewriting_path = QueryRewriter.rewrite(original_query, rules, catalog=_rm.fetch_catalog(appguid),
+                                                                budget=budget)
+        rewritten_query = QueryPatcher.patch_rewriting(rewritten_query, rewriting_path)
         _qm.log_query_suggestion(query['id'], rewritten_query, rewriting_path)
-        log_text = ""
-        log_text += "\n--------------------------------------------------"
-        log_text += "\n    Rewritten query"
-        log_text += "\n--------------------------------------------------"
-        log_text += "\n" + QueryRewriter.beautify(rewritten_query)
-        log_text += "\n--------------------------------------------------"
-        print(log_text)
-
-    log_text += "\n--------------------------------------------------"
-    log_text += "\n   Background suggest rewritings [Ended]"
-    log_text += "\n--------------------------------------------------"
+        logger.info('suggestion', extra={'guid': guid, 'query_id': query['id'],
+                                         'rules': [rewriting[0] for rewriting in rewriting_path],
+                                         'budget_exceeded': budget.exceeded})
+        logger.debug('suggested query', extra={'guid': guid,
+                                               'original_query': Lazy(QueryRewriter.beautify, original_query),
+                                               'rewritten_query': Lazy(QueryRewriter.beautify, rewritten_query)})
+
+    logger.debug('suggest rewritings ended', extra={'guid': guid})
 
     return None
 
@@ -0,0 +1,96 @@
+import csv
+import json
+import pytest
+from core.bulk_rewriter import BulkRewriter
+from core.query_patcher import QueryPatcher
+from core.query_rewriter import QueryRewriter
+
+
+QUERIES = [
+    "SELECT * FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'",
+    "SELECT * FROM tweets WHERE created_at > 1",
+    "SELECT * FROM",
+    "SELECT id FROM tweets WHERE CAST(state_name AS TEXT) = 'CA'",
+]
+
+
+def _rules():
+    return BulkRewriter.load_rules(rule_keys='remove_cast_date,remove_cast_text')
+
+
+def _read_output(path):
+    with open(path) as output_file:
+        return [json.loads(line) for line in output_file]
+
+
+def _write_jsonl(path, queries):
+    with open(path, 'w') as input_file:
+        for query in queries:
+            input_file.write(json.dumps({'query': query}) + '\n')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_bulk_rewrite_jsonl(tmp_path, workers):
+    input_path, output_path = str(tmp_path / 'queries.jsonl'), str(tmp_path / 'out.jsonl')
+    _write_jsonl(input_path, QUERIES)
+    with open(input_path, 'a') as input_file:
+        input_file.write('not json\n')
+
+    rules = _rules()
+    stats = BulkRewriter.run(input_path, output_path, rules, workers=workers, report=None)
+    assert (stats['processed'], stats['rewritten'], stats['failed']) == (5, 2, 2)
+
+    results = _read_output(output_path)
+    assert [result['offset'] for result in results] == [0, 1, 2, 3, 4]
+    for query, result in zip(QUERIES, results):
+        assert result['query'] == query
+        if 'error' not in result:
+            expected, path = QueryRewriter.rewrite(query, rules)
+            assert result['rewritten_query'] == QueryPatcher.patch(expected)
+            assert len(result['rewriting_path']) == len(path)
+    assert 'error' in results[2]
+    assert results[4] == {'offset': 4, 'query': None, 'error': 'invalid record'}
+
+
+def test_bulk_rewrite_csv_column(tmp_path):
+    input_path, output_path = str(tmp_path / 'queries.csv'), str(tmp_path / 'out.jsonl')
+    with open(input_path, 'w', newline='') as input_file:
+        writer = csv.writer(input_file)
+        writer.writerow(['id', 'q0'])
+        for index, query in enumerate(QUERIES):
+            writer.writerow([index, query])
+
+    stats = BulkRewriter.run(input_path, output_path, _rules(), column='q0', report=None)
+    assert stats['processed'] == len(QUERIES)
+    assert [result['query'] for result in _read_output(output_path)] == QUERIES
+
+    with pytest.raises(ValueError):
+        BulkRewriter.run(input_path, output_path, _rules(), column='query', report=None)
+
+
+def test_bulk_rewrite_resume(tmp_path):
+    input_path, output_path = str(tmp_path / 'queries.jsonl'), str(tmp_path / 'out.jsonl')
+    _write_jsonl(input_path, QUERIES)
+    BulkRewriter.run(input_path, output_path, _rules(), report=None)
+    complete = _read_output(output_path)
+
+    # simulate a run killed in the middle of writing the third record
+    with open(output_path) as output_file:
+        lines = output_file.readlines()
+    with open(output_path, 'w') as output_file:
+        output_file.writelines(lines[:2])
+        output_file.write(lines[2][:10])
+
+    stats = BulkRewriter.run(input_path, output_path, _rules(), resume=True, report=None)
+    assert (stats['offset'], stats['processed']) == (2, 2)
+    assert _read_output(output_path) == complete
+
+    # an explicit offset skips input records
+    stats = BulkRewriter.run(input_path, str(tmp_path / 'tail.jsonl'), _rules(), offset=3, report=None)
+    assert stats['processed'] == 1
+    assert _read_output(str(tmp_path / 'tail.jsonl')) == complete[3:]
+
+    # an explicit offset without --resume overwrites an existing output
+    stats = BulkRewriter.run(input_path, output_path, _rules(), offset=3, report=None)
+    assert stats['processed'] == 1
+    assert _read_output(output_path) == complete[3:]
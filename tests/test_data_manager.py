@@ -0,0 +1,180 @@
+import sqlite3
+from management import data_manager
+from management.data_manager import DataManager
+from management.storage import BatchedSQLiteStorage, SQLiteStorage
+
+
+APP = 'Alice-Tableau-Twitter-Pg'
+ALICE = '102153741508111367852'
+
+
+def _data_manager(tmp_path, **kwargs) -> DataManager:
+    return DataManager(storage=SQLiteStorage(str(tmp_path / 'querybooster.db')), **kwargs)
+
+
+def _stats(dm: DataManager, sql: str) -> tuple:
+    cur = dm.db_conn.cursor()
+    cur.execute('''SELECT count, sum_ms, min_ms, max_ms FROM query_stats WHERE sql_hash = ?''', [DataManager.sql_hash(sql)])
+    return cur.fetchone()
+
+
+def test_report_query_maintains_query_stats(tmp_path):
+    dm = _data_manager(tmp_path)
+    dm.log_query(APP, 'stats-1', 'SELECT a FROM t', 'SELECT a FROM t', [])
+    dm.log_query(APP, 'stats-2', 'SELECT a FROM t', 'SELECT a FROM t', [])
+    # the -1000 placeholder of a logged query is not aggregated
+    assert _stats(dm, 'SELECT a FROM t') is None
+
+    dm.report_query(APP, 'stats-1', 10)
+    dm.report_query(APP, 'stats-2', 30)
+    assert _stats(dm, 'SELECT a FROM t') == (2, 40.0, 10.0, 30.0)
+
+    # a re-report replaces the query's previous latency, a failed run (< 0) removes it
+    dm.report_query(APP, 'stats-1', 20)
+    assert _stats(dm, 'SELECT a FROM t')[:2] == (2, 50.0)
+    dm.report_query(APP, 'stats-1', -1)
+    assert _stats(dm, 'SELECT a FROM t')[:2] == (1, 30.0)
+
+    # the query log's before latency is the average latency of the original SQL
+    assert {row[3] for row in dm.list_queries(ALICE)} == {30.0}
+
+    # a rebuild agrees with the incremental aggregates
+    dm.rebuild_query_stats()
+    assert _stats(dm, 'SELECT a FROM t')[:2] == (1, 30.0)
+
+
+def test_report_query_is_appended(tmp_path, monkeypatch):
+    storage = BatchedSQLiteStorage(str(tmp_path / 'querybooster.db'))
+    dm = DataManager(storage=storage)
+    flush = storage.flush
+
+    def no_forced_flush(force=True):
+        assert not force
+        flush(force)
+    monkeypatch.setattr(storage, 'flush', no_forced_flush)
+    # reported behind the query's own (queued) append, without committing it first
+    dm.log_query(APP, 'appended-1', 'SELECT b FROM t', 'SELECT b FROM t', [])
+    dm.report_query(APP, 'appended-1', 10)
+    dm.log_query(APP, 'appended-2', 'SELECT b FROM t', 'SELECT b FROM t', [])
+    dm.report_query(APP, 'appended-2', 30)
+    dm.report_query(APP, 'appended-1', -1)
+    assert dm.fetch_query('appended-2')[2] == 'SELECT b FROM t'
+    monkeypatch.undo()
+
+    storage.flush()
+    assert _stats(dm, 'SELECT b FROM t') == (1, 30.0, 10.0, 30.0)
+    storage.close()
+
+
+def test_migrate_queries_without_hashes(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'querybooster.db'))
+    connection.executescript('''
+        CREATE TABLE queries(id INTEGER PRIMARY KEY, guid TEXT, appguid TEXT, timestamp TEXT,
+                             query_time_ms REAL, original_sql TEXT, sql TEXT);
+        INSERT INTO queries VALUES (1, 'old-1', 'Alice-Tableau-Twitter-Pg', '2024-01-01 00:00:00', 12, 'SELECT 1', 'SELECT 1');
+        INSERT INTO queries VALUES (2, 'old-2', 'Alice-Tableau-Twitter-Pg', '2024-01-02 00:00:00', -1000, 'SELECT 1', 'SELECT 2');
+    ''')
+    connection.close()
+
+    dm = _data_manager(tmp_path)
+    cur = dm.db_conn.cursor()
+    cur.execute('''SELECT id, original_sql_hash, sql_hash FROM queries ORDER BY id''')
+    assert cur.fetchall() == [(1, DataManager.sql_hash('SELECT 1'), DataManager.sql_hash('SELECT 1')),
+                              (2, DataManager.sql_hash('SELECT 1'), DataManager.sql_hash('SELECT 2'))]
+    assert _stats(dm, 'SELECT 1') == (1, 12.0, 12.0, 12.0)
+    assert sorted(row[3] for row in dm.list_queries(ALICE)) == [12.0, 12.0]
+
+
+def test_recent_query_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_manager, 'RECENT_QUERIES_SIZE', 2)
+    dm = _data_manager(tmp_path)
+    query_ids = [dm.log_query(APP, f'recent-{i}', f'SELECT {i}', f'SELECT {i}', []) for i in range(3)]
+    # only the most recent guids are remembered
+    assert [DataManager.recent_query_id(f'recent-{i}') for i in range(3)] == [None] + query_ids[1:]
+    DataManager.forget_query('recent-1', query_ids[0])
+    assert DataManager.recent_query_id('recent-1') == query_ids[1]
+
+    # a remembered query is found by its id, a forgotten one by its guid
+    assert dm.fetch_query('recent-2') == (query_ids[2], 'NO', 'SELECT 2')
+    assert dm.fetch_query('recent-0') == (query_ids[0], 'NO', 'SELECT 0')
+    dm.report_query(APP, 'recent-2', 5)
+    dm.report_query(APP, 'recent-0', 7)
+    cur = dm.db_conn.cursor()
+    cur.execute('''SELECT id, query_time_ms FROM queries WHERE guid LIKE 'recent-%' ORDER BY id''')
+    assert cur.fetchall() == [(query_ids[0], 7.0), (query_ids[1], -1000.0), (query_ids[2], 5.0)]
+
+
+def test_sql_texts_are_stored_once_compressed(tmp_path):
+    sql = 'SELECT a FROM t WHERE b = 1'
+    assert isinstance(DataManager.encode_sql_text(sql), bytes)
+    assert DataManager.decode_sql_text(DataManager.encode_sql_text(sql)) == sql
+    # legacy (uncompressed) texts pass through
+    assert DataManager.decode_sql_text(sql) == sql and DataManager.decode_sql_text(None) is None
+
+    dm = _data_manager(tmp_path)
+    query_id = dm.log_query(APP, 'texts-1', 'SELECT a FROM t', sql, [[0, sql], [0, sql]])
+    dm.log_query_suggestion(query_id, sql, [[0, sql]])
+    assert dm.db_conn.execute('''SELECT COUNT(*) FROM sql_texts''').fetchone() == (1,)
+    assert [row[2] for row in dm.list_rewritings(query_id)] == [sql, sql]
+    assert [row[-1] for row in dm.list_suggestion_rewritings(query_id)] == [sql]
+
+
+def test_migrate_rewriting_paths_into_sql_texts(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'querybooster.db'))
+    connection.executescript('''
+        CREATE TABLE rewriting_paths(query_id INTEGER, seq INTEGER, rule_id INTEGER, rewritten_sql TEXT,
+                                     PRIMARY KEY (query_id, seq));
+        INSERT INTO rewriting_paths VALUES (1, 1, 0, 'SELECT 1');
+        INSERT INTO rewriting_paths VALUES (1, 2, 0, 'SELECT 2');
+        INSERT INTO rewriting_paths VALUES (2, 1, 0, 'SELECT 1');
+    ''')
+    connection.close()
+
+    dm = _data_manager(tmp_path)
+    cur = dm.db_conn.cursor()
+    cur.execute('''SELECT query_id, seq, rewritten_sql, sql_hash FROM rewriting_paths ORDER BY query_id, seq''')
+    assert cur.fetchall() == [(1, 1, None, DataManager.sql_hash('SELECT 1')), (1, 2, None, DataManager.sql_hash('SELECT 2')),
+                              (2, 1, None, DataManager.sql_hash('SELECT 1'))]
+    assert dm.db_conn.execute('''SELECT COUNT(*) FROM sql_texts''').fetchone() == (2,)
+    assert [row[2] for row in dm.list_rewritings(1)] == ['SELECT 1', 'SELECT 2']
+
+    # a row with its SQL inline (written before sql_texts) is still listed
+    dm.db_conn.execute('''INSERT INTO rewriting_paths (query_id, seq, rule_id, rewritten_sql) VALUES (3, 1, 0, 'SELECT 3')''')
+    dm.db_conn.commit()
+    assert [row[2] for row in dm.list_rewritings(3)] == ['SELECT 3']
+
+
+def test_bootstrap_runs_once_per_checksum(tmp_path):
+    dm = _data_manager(tmp_path)
+    runs = []
+
+    def step(result: bool=True):
+        runs.append(result)
+        return result
+
+    assert dm.bootstrap('test', 'a', step) and runs == [True]
+    assert not dm.bootstrap('test', 'a', step)
+    # another process finds the checksum in the database
+    other = DataManager(init=False, storage=SQLiteStorage(dm.storage.path))
+    assert not other.bootstrap('test', 'a', step) and len(runs) == 1
+
+    # a new checksum runs the step again
+    assert other.bootstrap('test', 'b', step) and len(runs) == 2
+    assert dm.bootstrap_checksum('test') == 'b'
+
+    # a failed step is not recorded, and is retried
+    assert dm.bootstrap('test', 'c', lambda: step(False)) and runs[-1] is False
+    assert dm.bootstrap_checksum('test') == 'b'
+    assert dm.bootstrap('test', 'c', step) and runs[-1] is True
+    assert dm.bootstrap_checksum('test') == 'c'
+    assert not other.bootstrap('test', 'c', step) and len(runs) == 4
+
+
+def test_update_rule_reports_failure(tmp_path):
+    dm = _data_manager(tmp_path)
+    rule = {'id': 1000, 'key': 'failing_rule', 'name': 'Failing Rule', 'pattern': '', 'constraints': '', 'rewrite': '',
+            'actions': '', 'user_id': ALICE, 'pattern_json': '{}', 'constraints_json': '[]', 'rewrite_json': '{}',
+            'actions_json': '[]'}
+    assert dm.update_rule(rule)
+    # not a value SQLite can bind
+    assert not dm.update_rule({**rule, 'pattern_json': {}})
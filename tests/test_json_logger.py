@@ -0,0 +1,55 @@
+import io
+import json
+import logging
+import threading
+from core.json_logger import JsonFormatter, Lazy, flush_logging, setup_logging
+
+
+def test_json_formatter():
+    record = logging.LogRecord('querybooster.server', logging.INFO, __file__, 1, 'rewrite %s', ('q1',), None)
+    record.appguid = 'app'
+    record.sql = Lazy(str.upper, 'select 1')
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['level'] == 'INFO' and entry['logger'] == 'querybooster.server'
+    assert entry['message'] == 'rewrite q1'
+    assert entry['appguid'] == 'app' and entry['sql'] == 'SELECT 1'
+    assert 'args' not in entry and 'msg' not in entry
+
+
+def test_setup_logging_formats_off_thread():
+    stream = io.StringIO()
+    logger = setup_logging('test_json_logger', level='DEBUG', stream=stream)
+    assert setup_logging('test_json_logger') is logger
+    threads = []
+
+    def beautify(sql):
+        threads.append(threading.current_thread())
+        return sql.upper()
+
+    logger.getChild('server').debug('rewritten query', extra={'guid': 'g1', 'sql': Lazy(beautify, 'select 1')})
+    flush_logging('test_json_logger')
+    entry = json.loads(stream.getvalue())
+    assert entry['message'] == 'rewritten query' and entry['guid'] == 'g1' and entry['sql'] == 'SELECT 1'
+    assert threads and threads[0] is not threading.current_thread()
+
+    # a disabled level does not evaluate its lazy values
+    logger.setLevel(logging.INFO)
+    logger.debug('skipped', extra={'sql': Lazy(beautify, 'select 2')})
+    logger.info('report', extra={'query_time_ms': 1.5})
+    flush_logging('test_json_logger')
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2 and json.loads(lines[1])['query_time_ms'] == 1.5
+    assert len(threads) == 1
+
+
+def test_setup_logging_routes_module_loggers():
+    stream = io.StringIO()
+    setup_logging('test_json_logger_routed', level='INFO', stream=stream, modules=('test_json_logger_package',))
+    # a module logger (logging.getLogger(__name__)) of the package writes through the configured logger
+    module_logger = logging.getLogger('test_json_logger_package.query_rewriter')
+    module_logger.warning('Cycle found after %d steps', 2, extra={'rewriting_path': Lazy(json.dumps, [[1, 'SELECT 1']])})
+    module_logger.debug('skipped')
+    flush_logging('test_json_logger_routed')
+    entry = json.loads(stream.getvalue())
+    assert entry['logger'] == 'test_json_logger_package.query_rewriter' and entry['message'] == 'Cycle found after 2 steps'
+    assert json.loads(entry['rewriting_path']) == [[1, 'SELECT 1']]
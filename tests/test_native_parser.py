@@ -0,0 +1,84 @@
+import pytest
+from core.native_parser import NativeParser, NativeParseError
+from core.query_parser import QueryParser
+from mo_sql_parsing import parse
+
+
+def test_select_shapes():
+    for sql in [
+        "SELECT a FROM t",
+        "SELECT * FROM t",
+        "SELECT t.*, u.a AS b, c d, e AS \"My E\" FROM t, u",
+        "SELECT DISTINCT *, a FROM t",
+        "SELECT DISTINCT t.*, a FROM t",
+        "SELECT \"t\".\"a.b\", `x`.y FROM \"My Table\" \"t\"",
+        "SELECT a FROM t;",
+        "select a from t where a like '%x%' limit 1",
+    ]:
+        assert NativeParser.parse(sql) == parse(sql)
+
+
+def test_expression_shapes():
+    for sql in [
+        "SELECT a + b - c, a - b + c, (a + b) + c, a + (b + c), a * (b * c), a - (b - c) FROM t",
+        "SELECT 1 + 2 * 3 - 4 / 5 % 6, a || b || c, -a * b, -a || b, -1 * b, -(1), - 1 FROM t",
+        "SELECT 1.0, 1., .5, 007, 12345678901234567890, 'it''s', '', NULL, TRUE FROM t",
+        "SELECT CAST(a AS DATE), CAST(a AS VARCHAR(10)), a::numeric(5,2), -1::int, (1)::int FROM t",
+        "SELECT NOW(), COUNT(*), COUNT(DISTINCT a, b), SUM(a + 1), LEFT(a, 3), MyFunc(x) FROM t",
+        "SELECT CASE WHEN a THEN 1 END, CASE WHEN a THEN 1 WHEN b THEN 2 ELSE NULL END FROM t",
+        "SELECT TIMESTAMP '2016-10-01 00:00:00.000', DATE '2020-01-01' FROM t",
+        "SELECT a FROM t WHERE NOT a = 1 AND b OR (c AND d) AND NOT NOT e",
+        "SELECT a FROM t WHERE y = NULL AND z <> NULL AND w != NULL AND NULL = q AND x = (NULL)",
+        "SELECT a FROM t WHERE a = 1 = 2 AND a < b < c AND a = b > c",
+        "SELECT a FROM t WHERE a IS NULL AND b IS NOT NULL AND c NOT LIKE 'x' AND d ILIKE e || 'y'",
+        "SELECT a FROM t WHERE a BETWEEN b + 1 AND c * 2 AND d NOT BETWEEN 1 AND 2",
+        "SELECT a FROM t WHERE a IN (1) AND b IN ('z') AND c IN (1, 'x') AND d IN (a, b) AND e IN (-1, 2)",
+        "SELECT a FROM t WHERE a IN (TRUE, 1) AND b IN (0, 'x') AND c IN ('', 'x') AND d IN (1, (2))",
+        "SELECT a FROM t WHERE a IN (NULL, 1) AND b NOT IN (1, 2) AND c IN (SELECT d FROM u) AND e IN b",
+        "SELECT a FROM t WHERE EXISTS (SELECT 1 FROM u WHERE u.a = t.a) AND a = (SELECT MAX(b) FROM u)",
+    ]:
+        assert NativeParser.parse(sql) == parse(sql)
+
+
+def test_clause_shapes():
+    for sql in [
+        "SELECT a FROM t x, u AS y, (SELECT b FROM v) z, (SELECT b FROM v)",
+        "SELECT a FROM t JOIN u ON t.a = u.a LEFT OUTER JOIN v ON 1 = 1 CROSS JOIN w NATURAL JOIN x",
+        "SELECT a FROM t AS x INNER JOIN (SELECT b FROM u) AS y ON x.a = y.b, w JOIN u",
+        "SELECT a, COUNT(*) FROM t GROUP BY a HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC, a LIMIT 5 OFFSET 10",
+        "SELECT a FROM t GROUP BY a, b ORDER BY a ASC OFFSET 5 LIMIT 10",
+        "SELECT a FROM t UNION SELECT b FROM u UNION SELECT c FROM v",
+        "SELECT a FROM t UNION SELECT b FROM u UNION ALL SELECT c FROM v UNION ALL SELECT d FROM w",
+        "SELECT a FROM (SELECT a FROM t UNION ALL SELECT a FROM u) AS s",
+    ]:
+        assert NativeParser.parse(sql) == parse(sql)
+
+
+def test_unsupported_sql_raises():
+    for sql in [
+        "SELECT DISTINCT ON (a) a FROM t",
+        "SELECT a FROM t JOIN u USING (a)",
+        "SELECT EXTRACT(YEAR FROM a) FROM t",
+        "SELECT a FROM t WHERE b > NOW() - INTERVAL '1 day'",
+        "SELECT a FROM t UNION SELECT b FROM u ORDER BY a",
+        "SELECT a FROM t WHERE a LIKE '%\\_%'",
+        "SELECT a FROM t -- comment",
+        "SELECT E'x' FROM t",
+        "SELECT 1e3 FROM t",
+        "SELECT CASE a WHEN 1 THEN 2 END FROM t",
+        "SELECT a::double precision FROM t",
+        "SELECT a FROM t; SELECT b FROM u",
+        "UPDATE t SET a = 1",
+    ]:
+        with pytest.raises(NativeParseError):
+            NativeParser.parse(sql)
+
+
+def test_query_parser_backends():
+    sql = "SELECT a, COUNT(*) AS c FROM t WHERE b IN (1, 2) GROUP BY a"
+    assert QueryParser(backend='native').parse(sql) == QueryParser(backend='mosql').parse(sql)
+    # SQL outside the native subset falls back to mo_sql_parsing
+    sql = "SELECT DISTINCT ON (a) a FROM t JOIN u USING (a)"
+    assert QueryParser(backend='native').parse(sql) == QueryParser(backend='mosql').parse(sql)
+    with pytest.raises(ValueError):
+        QueryParser(backend='sqlglot')
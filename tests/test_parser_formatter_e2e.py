@@ -355,4 +355,12 @@ def test_query_43():
     original_sql = query["pattern"]
     parsed_ast = parser.parse(original_sql)
     formatted_sql = formatter.format(parsed_ast)
-    assert parse(formatted_sql) == parse(original_sql)
\ No newline at end of file
+    assert parse(formatted_sql) == parse(original_sql)
+
+def test_native_backend_matches_mosql_backend():
+    native_parser = QueryParser(backend='native')
+    mosql_parser = QueryParser(backend='mosql')
+    for query_id in [1, 2, 4, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22,
+                     23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43]:
+        original_sql = get_query(query_id)["pattern"]
+        assert native_parser.parse(original_sql) == mosql_parser.parse(original_sql)
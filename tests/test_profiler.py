@@ -0,0 +1,80 @@
+import threading
+from core import profiler
+from core.profiler import Profiler, HISTOGRAM_BUCKETS_MS
+from core.query_rewriter_v2 import QueryRewriterV2
+from data.rules import get_rule_v2
+
+
+def test_function_timers_are_reentrant():
+    Profiler.onFunctionStart('test_reentrant')
+    Profiler.onFunctionStart('test_reentrant')
+    Profiler.onFunctionEnd('test_reentrant')
+    Profiler.onFunctionEnd('test_reentrant')
+    # a third end without a start is ignored
+    Profiler.onFunctionEnd('test_reentrant')
+    profile = Profiler.show()['test_reentrant']
+    assert profile['calls'] == 2
+    assert profile['total_time'] >= 0
+
+
+def test_metrics_merge_threads():
+    Profiler.reset()
+
+    def work():
+        for _ in range(100):
+            Profiler.observe('parse', 0.0002)
+            Profiler.count('hits', 'rule_a')
+        Profiler.observe('match', 10.0, 'rule_a')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    metrics = Profiler.metrics()
+    parse = metrics['phases']['parse']
+    assert parse['count'] == 400
+    assert parse['total_ms'] == 80.0
+    assert parse['buckets']['0.25'] == 400
+    assert sum(parse['buckets'].values()) == 400
+    assert len(parse['buckets']) == len(HISTOGRAM_BUCKETS_MS) + 1
+    assert metrics['rules']['rule_a']['hits'] == 400
+    assert metrics['rules']['rule_a']['match']['buckets']['+Inf'] == 4
+
+
+
+def test_exited_threads_are_retired():
+    Profiler.reset()
+
+    def work():
+        Profiler.observe('parse', 0.0002)
+        Profiler.count('hits', 'rule_a')
+
+    # e.g., one thread per request
+    for _ in range(50):
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(profiler._threadMetrics) <= 2
+    metrics = Profiler.metrics()
+    assert metrics['phases']['parse']['count'] == 500
+    assert metrics['rules']['rule_a']['hits'] == 500
+
+def test_rewrite_is_instrumented():
+    Profiler.reset()
+    q0 = "SELECT * FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'"
+    rules = [get_rule_v2('remove_cast_text'), get_rule_v2('remove_cast_date')]
+    _q1, rewriting_path = QueryRewriterV2.rewrite(q0, rules)
+    assert len(rewriting_path) == 1
+
+    metrics = Profiler.metrics()
+    for phase in ['parse', 'format', 'take_actions', 'replace']:
+        assert metrics['phases'][phase]['count'] > 0
+    assert metrics['rules']['remove_cast_date']['hits'] == 1
+    # remove_cast_text needs a CAST(... AS TEXT) the query does not have
+    assert 'hits' not in metrics['rules']['remove_cast_text']
+    assert metrics['rules']['remove_cast_text']['skipped'] > 0
@@ -1,7 +1,9 @@
-from core.query_formatter import QueryFormatter
-from data.queries import get_query
-from data.asts import get_ast
-from mo_sql_parsing import parse
+from core.query_formatter import QueryFormatter, SQLEmitter, ast_to_json
+from core.query_parser import QueryParser
+from core.ast.node import QueryNode, SelectNode, FromNode, TableNode, ColumnNode, FunctionNode
+from data.queries import get_query, queries
+from data.asts import get_ast, _build_asts
+from mo_sql_parsing import parse, format as mosql_format
 
 formatter = QueryFormatter()
 
@@ -321,4 +323,26 @@ def test_query_43():
     """Query 43: MySQL Test."""
     query = get_query(43)
     sql = formatter.format(get_ast(43))
-    assert parse(sql) == parse(query["pattern"])
\ No newline at end of file
+    assert parse(sql) == parse(query["pattern"])
+
+def test_emitter_matches_mosql_format():
+    """The native emitter is byte-identical to formatting ast_to_json() with mo_sql_parsing."""
+    parser = QueryParser()
+    asts = list(_build_asts().values())
+    for query in queries:
+        for key in ('pattern', 'rewrite'):
+            try:
+                asts.append(parser.parse(query[key]))
+            except Exception:
+                continue
+    for ast in asts:
+        assert SQLEmitter().emit(ast) == mosql_format(ast_to_json(ast))
+
+
+def test_format_quotes():
+    """Identifiers that need quoting are double-quoted."""
+    ast = QueryNode(
+        _select=SelectNode([ColumnNode('my col', _parent_alias='t'), FunctionNode('COUNT', _args=[ColumnNode('*')], _alias='cnt')]),
+        _from=FromNode([TableNode('select', 't')]),
+    )
+    assert formatter.format(ast) == 'SELECT t."my col", COUNT(*) AS cnt FROM "select" AS t'
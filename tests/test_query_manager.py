@@ -0,0 +1,93 @@
+import datetime
+import pytest
+from management.data_manager import DataManager
+from management.query_manager import QueryManager
+from management.rule_manager import RuleManager
+from management.storage import SQLiteStorage
+
+
+APP = 'Alice-Tableau-Twitter-Pg'
+OTHER_APP = 'Alice-Tableau-Twitter-MySQL'
+ALICE = '102153741508111367852'
+
+
+@pytest.fixture
+def dm(tmp_path):
+    return DataManager(storage=SQLiteStorage(str(tmp_path / 'querybooster.db')))
+
+
+def _log_queries(dm: DataManager, count: int) -> None:
+    for i in range(count):
+        appguid = APP if i % 2 == 0 else OTHER_APP
+        rewritten = f'SELECT {i} FROM t' if i % 3 == 0 else f'SELECT {i} FROM t WHERE 1 = 1'
+        dm.log_query(appguid, f'page-{i}', f'SELECT {i} FROM t WHERE 1 = 1', rewritten, [])
+    # spread the queries over days, with two queries sharing each timestamp
+    dm.db_conn.executemany('''UPDATE queries SET timestamp = ? WHERE guid = ?''',
+                           [(str(datetime.datetime(2024, 1, 1 + i // 2)), f'page-{i}') for i in range(count)])
+    dm.db_conn.commit()
+
+
+def test_cursor_round_trip():
+    cursor = DataManager.encode_cursor(['2024-01-01 00:00:00', 42])
+    assert DataManager.decode_cursor(cursor) == ['2024-01-01 00:00:00', 42]
+    assert DataManager.decode_cursor(None) is None
+    with pytest.raises(ValueError):
+        DataManager.decode_cursor('not a cursor')
+    assert DataManager.page_size(None) == 100 and DataManager.page_size(0) == 100
+    assert DataManager.page_size(-5) == 1 and DataManager.page_size(10 ** 6) == 1000
+
+
+def test_list_queries_page(dm):
+    _log_queries(dm, 25)
+    qm = QueryManager(dm)
+    everything = qm.list_queries(ALICE)
+    assert len(everything) == 25
+    # newest first, ties broken by id
+    assert everything == sorted(everything, key=lambda query: (query['timestamp'], query['id']), reverse=True)
+
+    pages, cursor = [], None
+    while True:
+        page = qm.list_queries_page(ALICE, limit=7, cursor=cursor)
+        pages.extend(page['queries'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+        assert len(page['queries']) == 7
+    assert pages == everything
+
+
+def test_list_queries_filters(dm):
+    _log_queries(dm, 12)
+    qm = QueryManager(dm)
+    expected = {query['id'] for query in qm.list_queries(ALICE) if query['app_name'] == 'TwitterPg'}
+    assert {query['id'] for query in qm.list_queries_page(ALICE, app_id=1)['queries']} == expected
+
+    rewritten = qm.list_queries_page(ALICE, rewritten=True)['queries']
+    assert len(rewritten) == 4 and all(query['rewritten'] == 'YES' for query in rewritten)
+    assert len(qm.list_queries_page(ALICE, rewritten='no')['queries']) == 8
+
+    ranged = qm.list_queries_page(ALICE, since='2024-01-02', until='2024-01-04')['queries']
+    assert sorted(query['timestamp'][:10] for query in ranged) == ['2024-01-02'] * 2 + ['2024-01-03'] * 2
+    assert qm.list_queries_page(ALICE, suggestion=True)['queries'] == []
+
+
+def test_list_rules_page(dm):
+    rm = RuleManager(dm)
+    for i in range(5):
+        dm.update_rule({'id': 1000 + i, 'key': f'page_rule_{i}', 'name': f'Page Rule {i}', 'pattern': '', 'constraints': '',
+                        'rewrite': '', 'actions': '', 'user_id': ALICE, 'pattern_json': '{}', 'constraints_json': '[]',
+                        'rewrite_json': '{}', 'actions_json': '[]'})
+    dm.enable_rule(1002, 2, None)
+    everything = rm.list_rules(ALICE, None)
+    assert [rule['id'] for rule in everything] == [0, 1000, 1001, 1002, 1003, 1004]
+
+    pages, cursor = [], None
+    while True:
+        page = rm.list_rules_page(ALICE, limit=4, cursor=cursor)
+        pages.extend(page['rules'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert pages == everything
+    rules = rm.list_rules_page(ALICE, app_id='2')['rules']
+    assert [(rule['id'], rule['enabled_apps']) for rule in rules] == [(1002, [{'app_id': 2, 'app_name': 'TwitterMySQL'}])]
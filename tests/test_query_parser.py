@@ -366,4 +366,33 @@ def test_query_43():
     query = get_query(43)
     sql = query["pattern"]
     logger.info("\n" + visualize_ast(sql, get_ast(43)))
-    assert parser.parse(sql) == get_ast(43)
\ No newline at end of file
+    assert parser.parse(sql) == get_ast(43)
+
+
+def test_parse_cache():
+    """Repeated SQL text hits the shared dict cache, but every parse builds a fresh node tree."""
+    QueryParser.clear_parse_cache()
+    sql = get_query(1)["pattern"]
+    first = parser.parse_to_dict(sql)
+    assert parser.parse_to_dict(sql) is first
+    # Backends are cached separately, so each one still parses the text itself
+    assert QueryParser(backend='mosql').parse_to_dict(sql) == first
+
+    tree = parser.parse(sql)
+    assert tree == get_ast(1)
+    assert parser.parse(sql) is not tree
+
+
+def test_parse_cache_interns_subtrees():
+    """Identical subtrees within and across cached queries share one object."""
+    QueryParser.clear_parse_cache()
+    sub = "SELECT b FROM u WHERE u.c = 1"
+    first = parser.parse_to_dict(f"SELECT a FROM t WHERE a IN ({sub}) OR a + 1 IN ({sub})")
+    left, right = first['where']['or']
+    assert left['in'][1] is right['in'][1]
+    second = parser.parse_to_dict(f"SELECT x FROM v WHERE x IN ({sub})")
+    assert second['where']['in'][1] is left['in'][1]
+    # Equal but differently typed literals are never shared
+    typed = parser.parse_to_dict("SELECT a FROM t WHERE a = 1 OR a = 1.0 OR a = TRUE")
+    assert [operand['eq'][1] for operand in typed['where']['or']] == [1, 1.0, True]
+    assert [type(operand['eq'][1]) for operand in typed['where']['or']] == [int, float, bool]
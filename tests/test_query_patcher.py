@@ -28,4 +28,33 @@ def test_patch_timestamp_1():
 def test_patch_timestamp_2():
     q0 = "SELECT SUM(1), CAST(state_name AS TEXT) FROM tweets WHERE DATE_TRUNC('QUARTER', created_at) IN (TIMESTAMP('2016-10-01 00:00:00.000'), TIMESTAMP('2017-01-01 00:00:00.000'), TIMESTAMP('2017-04-01 00:00:00.000')) AND STRPOS(text, 'iphone') > 0 GROUP BY 2"
     q1 = "SELECT SUM(1), CAST(state_name AS TEXT) FROM tweets WHERE DATE_TRUNC('QUARTER', created_at) IN ((TIMESTAMP '2016-10-01 00:00:00.000'), (TIMESTAMP '2017-01-01 00:00:00.000'), (TIMESTAMP '2017-04-01 00:00:00.000')) AND STRPOS(text, 'iphone') > 0 GROUP BY 2"
-    assert q1 == QueryPatcher.patch_timestamp(q0)
\ No newline at end of file
+    assert q1 == QueryPatcher.patch_timestamp(q0)
+
+def _patch_sequentially(sql, database):
+    if database == 'postgresql':
+        sql = QueryPatcher.patch_ilike(sql)
+        sql = QueryPatcher.patch_timestamp(sql)
+    return sql
+
+
+def test_patch_matches_sequential_passes():
+    queries = [
+        "SELECT * FROM tweets WHERE ILIKE(text, '%iphone%')",
+        "SELECT * FROM tweets WHERE ILIKE(text, '%iphone%') AND created_at > TIMESTAMP('2017-04-01 00:00:00.000')",
+        "SELECT * FROM tweets WHERE ILIKE(created_at, TIMESTAMP('2017-04-01'))",
+        "SELECT * FROM tweets WHERE ILIKE(a, TIME)STAMP('x')",
+        "SELECT * FROM tweets WHERE text = 'no fixups'",
+    ]
+    for sql in queries:
+        for database in ['postgresql', 'mysql', 'sqlite']:
+            assert QueryPatcher.patch(sql, database) == _patch_sequentially(sql, database)
+
+
+def test_patch_rewriting():
+    q0 = "SELECT * FROM tweets WHERE ILIKE(text, '%iphone%')"
+    q1 = "SELECT * FROM tweets WHERE created_at = TIMESTAMP('2017-04-01 00:00:00.000')"
+    rewriting_path = [[1, q0], [2, q1]]
+    rewritten_query = QueryPatcher.patch_rewriting(q1, rewriting_path)
+    assert rewritten_query == "SELECT * FROM tweets WHERE created_at = (TIMESTAMP '2017-04-01 00:00:00.000')"
+    assert rewriting_path == [[1, QueryPatcher.patch(q0)], [2, rewritten_query]]
+    assert QueryPatcher.patch_rewriting(q0, [], 'mysql') == q0
@@ -1,4 +1,5 @@
 from core.query_rewriter import QueryRewriter
+from core.query_rewriter_v2 import RewriteBudget
 from data.rules import get_rule
 from mo_sql_parsing import parse
 from mo_sql_parsing import format
@@ -1803,3 +1804,24 @@ def test_rewrite_mysql():
                 AND (LOCATE('iphone', LOWER(`tweets`.`text`)) > 0))
               GROUP BY 1, 2'''
 
+
+
+def test_rewrite_budget():
+    q0 = "SELECT CAST(state_name AS TEXT) FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'"
+    rules = [get_rule(k) for k in ['remove_cast_date', 'remove_cast_text']]
+
+    # unbounded by default
+    q1, rewrite_path = QueryRewriter.rewrite(q0, rules)
+    assert len(rewrite_path) == 2
+
+    # out of rewrite steps: the query reached by the steps taken so far
+    budget = RewriteBudget(max_rewrite_steps=1)
+    q1_partial, rewrite_path = QueryRewriter.rewrite(q0, rules, budget=budget)
+    assert budget.exceeded == 'rewrite_steps'
+    assert len(rewrite_path) == 1 and q1_partial == rewrite_path[0][1] != q1
+
+    # out of match attempts before any rule applied: the original query
+    budget = RewriteBudget(max_match_attempts=5)
+    q1_none, rewrite_path = QueryRewriter.rewrite(q0, rules, budget=budget)
+    assert budget.exceeded == 'match_attempts' and budget.match_attempts > 5
+    assert rewrite_path == [] and q1_none == format(parse(q0))
@@ -1,6 +1,8 @@
+import json
 from core.query_formatter import QueryFormatter
 from core.query_parser import QueryParser
-from core.query_rewriter_v2 import QueryRewriterV2 as QueryRewriter
+from core.query_rewriter_v2 import QueryRewriterV2 as QueryRewriter, RewriteBudget, RewritingStep
+from core.query_rewriter_v2 import _pick_applicable_rule, _rule_features
 from data.rules import get_rule_v2 as get_rule
 
 _PARSER = QueryParser()
@@ -1790,3 +1792,130 @@ def test_rewrite_postgresql():
 #               WHERE ((ADDDATE(DATE_FORMAT(`tweets`.`created_at`, '%Y-%m-01 00:00:00'), INTERVAL 0 SECOND) = TIMESTAMP('2017-03-01 00:00:00'))
 #                 AND (LOCATE('iphone', LOWER(`tweets`.`text`)) > 0))
 #               GROUP BY 1, 2'''
+
+
+def test_rewrite_path_steps(monkeypatch):
+    q0 = '''
+        SELECT  SUM(1),
+                CAST(state_name AS TEXT)
+        FROM  tweets
+        WHERE  CAST(DATE_TRUNC('QUARTER', CAST(created_at AS DATE)) AS DATE) IN
+                    ((TIMESTAMP '2016-10-01 00:00:00.000'), (TIMESTAMP '2017-01-01 00:00:00.000'))
+        AND  (STRPOS(text, 'iphone') > 0)
+        GROUP  BY 2;
+    '''
+    rules = [get_rule('remove_cast_date')]
+
+    # The final SQL is the last step's SQL, rendered once
+    _q1, rewrite_path = QueryRewriter.rewrite(q0, rules, iterate=False)
+    assert len(rewrite_path) == 1
+    step = rewrite_path[0]
+    assert step.rule_id == rules[0]['id']
+    assert step.sql is _q1
+    assert format(step.ast) == _q1
+
+    # Steps are [rule_id, sql] lists
+    rule_id, sql = step
+    assert isinstance(step, list)
+    assert [rule_id, sql] == step == [rules[0]['id'], _q1]
+    assert json.loads(json.dumps(rewrite_path)) == [[rules[0]['id'], _q1]]
+    step[1] = sql.lower()
+    assert step[1] == step.sql == sql.lower()
+
+    # A step built from a snapshot alone renders it
+    assert RewritingStep(rule_id, parse(_q1))[1] == format(parse(_q1))
+
+    # Each step is rendered once, plus the original query once (for cycle detection)
+    rendered, render = [], QueryFormatter.format
+    monkeypatch.setattr(QueryFormatter, 'format', lambda self, ast: rendered.append(ast) or render(self, ast))
+    _q2, rewrite_path = QueryRewriter.rewrite(q0, rules + [get_rule('remove_cast_text')])
+    assert len(rewrite_path) == 3 and len(rendered) == 1 + len(rewrite_path)
+    assert _q2 is rewrite_path[-1].sql
+
+
+def test_rewrite_budget():
+    q0 = '''
+        SELECT  SUM(1), CAST(state_name AS TEXT)
+        FROM  tweets
+        WHERE  CAST(DATE_TRUNC('QUARTER', CAST(created_at AS DATE)) AS DATE) IN
+                    ((TIMESTAMP '2016-10-01 00:00:00.000'), (TIMESTAMP '2017-01-01 00:00:00.000'))
+        AND  (STRPOS(text, 'iphone') > 0)
+        GROUP  BY 2;
+    '''
+    rules = [get_rule('remove_cast_date'), get_rule('remove_cast_text')]
+
+    budget = RewriteBudget()
+    q1, rewrite_path = QueryRewriter.rewrite(q0, rules, budget=budget)
+    assert budget.exceeded is None
+    assert budget.rewrite_steps == len(rewrite_path) == 3
+    assert budget.match_attempts > 0
+
+    # Out of rewrite steps: the query reached by the steps taken so far
+    budget = RewriteBudget(max_rewrite_steps=1)
+    q1_partial, rewrite_path = QueryRewriter.rewrite(q0, rules, budget=budget)
+    assert budget.exceeded == 'rewrite_steps'
+    assert len(rewrite_path) == 1
+    assert q1_partial == rewrite_path[0][1] != q1
+
+    # Out of match attempts or time before any rule applied: the original query
+    for budget in [RewriteBudget(max_match_attempts=5), RewriteBudget(time_ms=0)]:
+        q1_none, rewrite_path = QueryRewriter.rewrite(q0, rules, budget=budget)
+        assert budget.exceeded in ('match_attempts', 'time')
+        assert rewrite_path == []
+        assert q1_none == format(parse(q0))
+
+    # Unlimited budget
+    budget = RewriteBudget(time_ms=None, max_match_attempts=None, max_rewrite_steps=None)
+    assert QueryRewriter.rewrite(q0, rules, budget=budget)[0] == q1
+    assert budget.exceeded is None
+
+
+def test_rewrite_result_flags_exceeded_budget():
+    q0 = "SELECT CAST(state_name AS TEXT) FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'"
+    rules = [get_rule('remove_cast_date'), get_rule('remove_cast_text')]
+
+    # No budget: an unbounded, complete rewrite, still unpacking as (sql, path)
+    result = QueryRewriter.rewrite(q0, rules)
+    q1, rewrite_path = result
+    assert result.exceeded is None and result.budget.time_ms is None
+    assert (result.sql, result.rewriting_path) == (q1, rewrite_path) and len(rewrite_path) == 2
+
+    # A small budget: the best rewrite so far, flagged
+    result = QueryRewriter.rewrite(q0, rules, budget=RewriteBudget(max_rewrite_steps=1))
+    assert result.exceeded == 'rewrite_steps'
+    assert len(result.rewriting_path) == 1 and result.sql == result.rewriting_path[0][1] != q1
+
+
+def test_rewrite_budget_exceeded_while_applying_a_rule(monkeypatch):
+    q0 = "SELECT CAST(state_name AS TEXT) FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'"
+    rules = [get_rule('remove_cast_date'), get_rule('remove_cast_text')]
+    replace = QueryRewriter.replace
+
+    def replace_until_out_of_time(query_ast, rule, memo):
+        if rule['key'] == 'remove_cast_text':
+            RewriteBudget.active()._exceed('time')
+        return replace(query_ast, rule, memo)
+    monkeypatch.setattr(QueryRewriter, 'replace', staticmethod(replace_until_out_of_time))
+
+    # the rewrite stops (the rule is not treated as failed, nor the next one tried)
+    #   with the query of the last applied rule
+    result = QueryRewriter.rewrite(q0, rules, budget=RewriteBudget())
+    assert result.exceeded == 'time'
+    assert [step.rule_id for step in result.rewriting_path] == [rules[0]['id']]
+    assert result.sql == result.rewriting_path[0].sql
+
+
+def test_pick_applicable_rule_skips_rules_by_features():
+    rule_keys = ['remove_cast_text', 'remove_max_distinct', 'remove_cast_date']
+    rules = [get_rule(k) for k in rule_keys]
+    query = "SELECT * FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'"
+
+    assert ('type', 'TEXT') in _rule_features(rules[0])
+    assert ('function', 'MAX') in _rule_features(rules[1])
+    # cached outside of the (shared) rule dicts, and per pattern
+    assert set(rules[0]) == set(get_rule('remove_cast_text'))
+    assert _rule_features(dict(rules[0], pattern_ast=rules[2]['pattern_ast'])) == _rule_features(rules[2])
+    # the first rule that can match is still the one picked, in list order
+    rule, _memo = _pick_applicable_rule(parse(query), rules, set())
+    assert rule['key'] == 'remove_cast_date'
+    assert all(QueryRewriter.match(parse(query), r, {}) is False for r in rules[:2])
@@ -0,0 +1,63 @@
+import datetime
+from management.data_manager import DataManager
+from management.retention_manager import RetentionManager
+from management.storage import SQLiteStorage
+
+
+APP = 'Alice-Tableau-Twitter-Pg'
+NOW = datetime.datetime(2024, 3, 1)
+
+
+def _log(dm: DataManager, guid: str, original_sql: str, rewriting_path: list, days_ago: int, query_time_ms=None) -> None:
+    rewritten_sql = rewriting_path[-1][1] if rewriting_path else original_sql
+    dm.log_query(APP, guid, original_sql, rewritten_sql, rewriting_path)
+    if query_time_ms is not None:
+        dm.report_query(APP, guid, query_time_ms)
+    dm.db_conn.execute('''UPDATE queries SET timestamp = ? WHERE guid = ?''',
+                       [str(NOW - datetime.timedelta(days=days_ago, hours=1)), guid])
+    dm.db_conn.commit()
+
+
+def _texts(dm: DataManager) -> set:
+    return {DataManager.decode_sql_text(row[0]) for row in dm.db_conn.execute('''SELECT sql FROM sql_texts''')}
+
+
+def test_prune_and_roll_up(tmp_path):
+    dm = DataManager(storage=SQLiteStorage(str(tmp_path / 'querybooster.db')))
+    _log(dm, 'old-1', "SELECT * FROM t WHERE a = 'x'", [[0, 'SELECT a FROM t'], [0, 'SELECT b FROM t']], 40, 10)
+    _log(dm, 'old-2', "SELECT * FROM t WHERE a = 'y'", [], 40, 30)
+    _log(dm, 'old-3', "SELECT * FROM t WHERE a = 'z'", [[0, 'SELECT c FROM t']], 40)
+    _log(dm, 'old-4', 'SELECT * FROM u', [], 35, 5)
+    _log(dm, 'new-1', "SELECT * FROM t WHERE a = 'w'", [[0, 'SELECT c FROM t']], 1, 7)
+
+    retention = RetentionManager(dm, retention_days=30, batch_size=3)
+    assert retention.run_once(now=NOW) == 4
+    assert retention.run_once(now=NOW) == 0
+
+    # only the recent query is left
+    assert [row[0] for row in dm.db_conn.execute('''SELECT guid FROM queries''')] == ['new-1']
+    assert dm.db_conn.execute('''SELECT COUNT(*) FROM rewriting_paths''').fetchone() == (1,)
+
+    # rolled up per application, query shape and day
+    shape = DataManager.query_shape("SELECT * FROM t WHERE a = 'x'")
+    assert shape == 'SELECT * FROM t WHERE a = ?'
+    rollups = dm.db_conn.execute('''SELECT shape_hash, day, count, rewritten_count, reported_count, sum_ms, min_ms, max_ms
+                                      FROM query_rollups ORDER BY day''').fetchall()
+    day = str((NOW - datetime.timedelta(days=40, hours=1)).date())
+    assert rollups[0] == (DataManager.sql_hash(shape), day, 3, 2, 2, 40.0, 10.0, 30.0)
+    assert rollups[1][2:] == (1, 0, 1, 5.0, 5.0, 5.0)
+    assert sum(rollup[2] for rollup in rollups) == 4
+
+    # the texts of the pruned rewriting paths are deleted, unless still referenced
+    assert _texts(dm) == {'SELECT c FROM t', shape, 'SELECT * FROM u'}
+
+    # the latency aggregates of the pruned queries' SQL are deleted, unless still executed by a remaining query
+    stats = dm.db_conn.execute('''SELECT sql_hash, count FROM query_stats''').fetchall()
+    assert stats == [(DataManager.sql_hash('SELECT c FROM t'), 1)]
+
+
+def test_retention_disabled(tmp_path):
+    dm = DataManager(storage=SQLiteStorage(str(tmp_path / 'querybooster.db')))
+    _log(dm, 'kept-1', 'SELECT 1', [], 400)
+    assert RetentionManager(dm, retention_days=0).run_once(now=NOW) == 0
+    assert dm.db_conn.execute('''SELECT COUNT(*) FROM queries''').fetchone() == (1,)
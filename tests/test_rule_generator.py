@@ -225,6 +225,39 @@ import re
 #     assert gen_rule['rewrite'] == "ILIKE(text, '%iphone%')"
 
 
+def test_featuresOf_1():
+    pattern = '''
+        select e1.name, e1.age, e2.salary
+        from employee e1,
+            employee e2
+        where e1.id = e2.id
+        and e1.age > 17
+        and e2.salary  > 35000;
+    '''
+    rewrite = '''
+        SELECT  e1.name,
+                e1.age,
+                e1.salary
+        FROM employee e1
+        WHERE e1.age > 17
+        AND e1.salary > 35000;
+    '''
+
+    pattern_json, rewrite_json, mapping = RuleParser.parse(pattern, rewrite)
+
+    features = RuleGenerator.featuresOf(pattern_json)
+    assert features['columns'] == {'name', 'age', 'salary', 'id'}
+    assert features['literals'] == {17: 1, 35000: 1}
+    assert features['tables'] == [{'value': 'employee', 'name': 'e1'}, {'value': 'employee', 'name': 'e2'}]
+    assert features['subtrees'] == []
+    assert features['variableLists'] == []
+    assert features['branches'] == []
+
+    # features are cached per AST Json string
+    #
+    assert RuleGenerator.featuresOf(pattern_json) is features
+
+
 def test_columns_1():
     pattern = "STRPOS(LOWER(text), 'iphone') > 0"
     rewrite = "ILIKE(text, '%iphone%')"
@@ -485,6 +518,51 @@ def test_dereplaceVars_2():
     '''
 
 
+def test_copy_a_rule_1():
+
+    rule = {
+        'pattern': "STRPOS(LOWER(text), 'iphone') > 0",
+        'rewrite': "text ILIKE '%iphone%'"
+    }
+    rule['pattern_json'], rule['rewrite_json'], rule['mapping'] = RuleParser.parse(rule['pattern'], rule['rewrite'])
+    rule['constraints'], rule['constraints_json'], rule['actions'], rule['actions_json'] = '', '[]', '', '[]'
+    rule['fingerPrint'] = RuleGenerator.fingerPrint(rule)
+    rule['coveredExamples'] = [0]
+    rule['children'] = [RuleGenerator.copy_a_rule(rule)]
+
+    new_rule = RuleGenerator.copy_a_rule(rule)
+    assert new_rule == rule['children'][0]
+    assert 'fingerPrint' not in new_rule
+    assert 'coveredExamples' not in new_rule
+    assert 'children' not in new_rule
+    assert new_rule['pattern_json'] == rule['pattern_json']
+
+
+def test_variablize_column_shared_1():
+
+    rule = {
+        'pattern': "SELECT text FROM tweets WHERE STRPOS(LOWER(text), 'iphone') > 0 AND id > 1",
+        'rewrite': "SELECT text FROM tweets WHERE text ILIKE '%iphone%' AND id > 1"
+    }
+    rule['pattern_json'], rule['rewrite_json'], rule['mapping'] = RuleParser.parse(rule['pattern'], rule['rewrite'])
+    rule['constraints'], rule['constraints_json'], rule['actions'], rule['actions_json'] = '', '[]', '', '[]'
+    pattern_json = rule['pattern_json']
+    
+    new_rule = RuleGenerator.variablize_column(rule, 'text')
+    assert new_rule['pattern'] == "SELECT <x1> FROM tweets WHERE STRPOS(LOWER(<x1>), 'iphone') > 0 AND id > 1"
+    assert rule['pattern_json'] == pattern_json
+
+    # the transformation does not mutate the shared AST Json of the rule
+    patternASTJson = RuleGenerator.loadASTJson(rule['pattern_json'])
+    assert patternASTJson == json.loads(pattern_json)
+
+    # unchanged subtrees are shared between the rule and the new rule
+    newPatternASTJson = RuleGenerator.loadASTJson(new_rule['pattern_json'])
+    assert newPatternASTJson is not patternASTJson
+    assert newPatternASTJson['from'] is patternASTJson['from']
+    assert newPatternASTJson['where']['and'][1] is patternASTJson['where']['and'][1]
+
+
 def test_variablize_column_1():
 
     rule = {
@@ -3102,6 +3180,83 @@ def test_generate_spreadsheet_id_21():
 #         <x1>
 #     '''))
 
+def test_fingerPrint_1():
+    rule1 = {'pattern': 'SELECT e1.<x1>, e1.<x2> FROM employee e1 WHERE e1.<x1> > 17 AND e1.<x2> > 35000', 
+             'rewrite': 'SELECT e1.<x1>, e1.<x2> FROM employee e1 WHERE e1.<x1> > 17'}
+    rule1['pattern_json'], rule1['rewrite_json'], rule1['mapping'] = RuleParser.parse(rule1['pattern'], rule1['rewrite'])
+    rule2 = {'pattern': 'SELECT e1.<x2>, e1.<x1> FROM employee e1 WHERE e1.<x2> > 17 AND e1.<x1> > 35000', 
+             'rewrite': 'SELECT e1.<x2>, e1.<x1> FROM employee e1 WHERE e1.<x2> > 17'}
+    rule2['pattern_json'], rule2['rewrite_json'], rule2['mapping'] = RuleParser.parse(rule2['pattern'], rule2['rewrite'])
+    rule3 = {'pattern': 'SELECT e1.<x1>, e1.<x1> FROM employee e1 WHERE e1.<x1> > 17 AND e1.<x1> > 35000', 
+             'rewrite': 'SELECT e1.<x1>, e1.<x1> FROM employee e1 WHERE e1.<x1> > 17'}
+    rule3['pattern_json'], rule3['rewrite_json'], rule3['mapping'] = RuleParser.parse(rule3['pattern'], rule3['rewrite'])
+
+    assert RuleGenerator.fingerPrint(rule1) == RuleGenerator.fingerPrint(rule2)
+    assert RuleGenerator.fingerPrint(rule1) != RuleGenerator.fingerPrint(rule3)
+    # finger-print is cached in the rule
+    assert rule1['fingerPrint'] == RuleGenerator.fingerPrint(rule1)
+
+
+def test_fingerPrint_2():
+    # same pattern, different rewrites
+    rule1 = {'pattern': "STRPOS(LOWER(<x1>), '<x2>') > 0", 'rewrite': "<x1> ILIKE '%<x2>%'"}
+    rule1['pattern_json'], rule1['rewrite_json'], rule1['mapping'] = RuleParser.parse(rule1['pattern'], rule1['rewrite'])
+    rule2 = {'pattern': "STRPOS(LOWER(<x1>), '<x2>') > 0", 'rewrite': "<x2> ILIKE '%<x1>%'"}
+    rule2['pattern_json'], rule2['rewrite_json'], rule2['mapping'] = RuleParser.parse(rule2['pattern'], rule2['rewrite'])
+
+    assert RuleGenerator.fingerPrint(rule1) != RuleGenerator.fingerPrint(rule2)
+
+
+def test_suggest_rules_bs_w5_1():
+    examples = [
+        {
+            "q0":"SELECT * FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'",
+            "q1":"SELECT * FROM tweets WHERE created_at = TIMESTAMP '2016-10-01 00:00:00.000'"
+        },
+        {
+            "q0":"SELECT * FROM tweets WHERE CAST(deleted_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'",
+            "q1":"SELECT * FROM tweets WHERE deleted_at = TIMESTAMP '2016-10-01 00:00:00.000'"
+        }
+    ]
+
+    profile = {}
+    suggestRules = RuleGenerator.suggest_rules(examples, exp='bs', w=5, profile=profile)
+    assert type(suggestRules) is list
+    assert len(suggestRules) == 1
+    assert profile['timeout'] is False
+
+    suggestRule = suggestRules[0]
+
+    assert StringUtil.strim(RuleGenerator._fingerPrint(suggestRule['pattern'])) == StringUtil.strim(RuleGenerator._fingerPrint('''
+        CAST(<x1> AS DATE) = TIMESTAMP('2016-10-01 00:00:00.000')
+    '''))
+    assert StringUtil.strim(RuleGenerator._fingerPrint(suggestRule['rewrite'])) == StringUtil.strim(RuleGenerator._fingerPrint('''
+        <x1> = TIMESTAMP('2016-10-01 00:00:00.000')
+    '''))
+
+
+def test_suggest_rules_bs_timeout_1():
+    examples = [
+        {
+            "q0":"SELECT * FROM tweets WHERE CAST(created_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'",
+            "q1":"SELECT * FROM tweets WHERE created_at = TIMESTAMP '2016-10-01 00:00:00.000'"
+        },
+        {
+            "q0":"SELECT * FROM tweets WHERE CAST(deleted_at AS DATE) = TIMESTAMP '2016-10-01 00:00:00.000'",
+            "q1":"SELECT * FROM tweets WHERE deleted_at = TIMESTAMP '2016-10-01 00:00:00.000'"
+        }
+    ]
+
+    # no time budget at all, the seed rules are the best rules found so far
+    #
+    profile = {}
+    suggestRules = RuleGenerator.suggest_rules(examples, exp='bs', w=5, t=0, profile=profile)
+    assert type(suggestRules) is list
+    assert len(suggestRules) == 2
+    assert profile['timeout'] is True
+    assert profile['cnt_iterations'] == 0
+
+
 def test_recommend_simple_rules_1():
     examples = [
         {'q0': "SELECT * FROM employee WHERE workdept IN (SELECT deptno FROM department WHERE deptname = 'OPERATIONS')",
@@ -3403,4 +3558,28 @@ def test_parse_validator_14():
   assert True == success2
 
   success3, errormessage3, index3 = RuleGenerator.parse_validate(pattern, rewrite)
-  assert True == success3
\ No newline at end of file
+  assert True == success3
+
+
+def test_levDistance_1():
+
+  assert RuleGenerator.levDistance('SELECT', 'SELECT') == 0
+  assert RuleGenerator.levDistance('SELECT', 'SELET') == 1
+  assert RuleGenerator.levDistance('FROM', 'FORM') == 2
+  assert RuleGenerator.levDistance('kitten', 'sitting') == 3
+  assert RuleGenerator.levDistance('', 'WHERE') == 5
+
+  # bounded: stops early and returns maxDistance + 1 once the distance exceeds it
+  #
+  assert RuleGenerator.levDistance('WHERE', 'WHER', 1) == 1
+  assert RuleGenerator.levDistance('kitten', 'sitting', 1) == 2
+  assert RuleGenerator.levDistance('SELECT', 'SELECT' + 'x' * 100000, 1) == 2
+  assert RuleGenerator.levDistance('SELECT', 'x' * 100000, 1) == 2
+
+def test_parse_validator_15():
+
+  pattern = 'SELECT ' + ', '.join('<x' + str(i) + '>' for i in range(1, 2000)) + ' FROM <x0>'
+  rewrite = pattern
+
+  success, errormessage, index = RuleGenerator.parse_validate(pattern, rewrite)
+  assert True == success
@@ -0,0 +1,82 @@
+from management import data_manager
+from management.data_manager import DataManager
+from management.rule_manager import RuleManager
+from management.storage import SQLiteStorage
+
+
+APP = 'Alice-Tableau-Twitter-Pg'
+ALICE = '102153741508111367852'
+
+
+def _rule(rule_id: int, name: str) -> dict:
+    return {'id': rule_id, 'key': f'rule_{rule_id}', 'name': name, 'pattern': '', 'constraints': '', 'rewrite': '',
+            'actions': '', 'user_id': ALICE, 'pattern_json': '{}', 'constraints_json': '[]', 'rewrite_json': '{}',
+            'actions_json': '[]'}
+
+
+def _workers(tmp_path) -> tuple:
+    # two processes (storages) on the same database: one edits the rules, the other serves them from its cache
+    path = str(tmp_path / 'querybooster.db')
+    editor = DataManager(storage=SQLiteStorage(path))
+    worker = RuleManager(DataManager(init=False, storage=SQLiteStorage(path)))
+    for rule_id in (1000, 1001):
+        editor.update_rule(_rule(rule_id, f'Rule {rule_id}'))
+    return editor, worker
+
+
+def _enabled(rm: RuleManager, appguid: str=APP) -> dict:
+    return {rule['id']: rule['name'] for rule in rm.fetch_enabled_rules(appguid) if rule['id'] >= 1000}
+
+
+def test_enabled_rules_follow_rule_changes(tmp_path, monkeypatch):
+    editor, worker = _workers(tmp_path)
+    assert _enabled(worker) == {}
+
+    editor.enable_rule(1000, 1, None)
+    editor.enable_rule(1001, 1, None)
+    assert _enabled(worker) == {1000: 'Rule 1000', 1001: 'Rule 1001'}
+
+    # an unchanged feed is served from the cache
+    calls = []
+    monkeypatch.setattr(worker.dm, 'enabled_rules', lambda *args: calls.append(args))
+    assert _enabled(worker) == {1000: 'Rule 1000', 1001: 'Rule 1001'}
+    assert calls == []
+    monkeypatch.undo()
+
+    editor.update_rule(_rule(1001, 'Renamed'))
+    assert _enabled(worker) == {1000: 'Rule 1000', 1001: 'Renamed'}
+    editor.disable_rule(1000, 1, None)
+    assert _enabled(worker) == {1001: 'Renamed'}
+    editor.delete_rule({'id': 1001})
+    assert _enabled(worker) == {}
+
+
+def test_enabled_rules_follow_application_changes(tmp_path):
+    editor, worker = _workers(tmp_path)
+    editor.enable_rule(1000, 1, None)
+    assert _enabled(worker) == {1000: 'Rule 1000'}
+    assert _enabled(worker, 'Alice-Tableau-Twitter-Pg-2') == {}
+
+    # the application's guid changes
+    editor.update_application({'id': 1, 'name': 'TwitterPg', 'guid': 'Alice-Tableau-Twitter-Pg-2', 'user_id': ALICE})
+    assert _enabled(worker) == {}
+    assert _enabled(worker, 'Alice-Tableau-Twitter-Pg-2') == {1000: 'Rule 1000'}
+
+    # the application is deleted
+    editor.delete_application({'id': 1, 'user_id': ALICE})
+    assert _enabled(worker, 'Alice-Tableau-Twitter-Pg-2') == {}
+
+
+def test_enabled_rules_reload_after_the_feed_is_trimmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_manager, 'RULE_CHANGES_KEEP', 2)
+    editor, worker = _workers(tmp_path)
+    assert _enabled(worker) == {}
+
+    editor.enable_rule(1000, 1, None)
+    editor.enable_rule(1001, 1, None)
+    editor.disable_rule(1000, 2, None)
+    editor.enable_rule(1000, 2, None)
+    assert editor.db_conn.execute('''SELECT COUNT(*) FROM rule_changes''').fetchone() == (2,)
+    # the worker missed trimmed changes, and reloads its rules
+    assert editor.rule_changes(APP, 0) is None
+    assert _enabled(worker) == {1000: 'Rule 1000', 1001: 'Rule 1001'}
@@ -0,0 +1,147 @@
+import sqlite3
+from core.query_parser import QueryParser
+from core.query_rewriter import QueryRewriter
+from core.query_rewriter_v2 import QueryRewriterV2
+from core.schema_catalog import ConstraintEvaluator, SchemaCatalog
+from data.rules import get_rule, get_rule_v2
+from management import rule_manager
+from management.rule_manager import RuleManager
+
+
+DDL = '''
+CREATE TABLE users(
+    id INTEGER PRIMARY KEY,
+    email VARCHAR(255) UNIQUE
+);
+
+CREATE TABLE tweets(
+    id INTEGER,
+    user_id INTEGER REFERENCES users(id),
+    created_at DATE,
+    posted_at TIMESTAMP,
+    text TEXT,
+    state_name VARCHAR(64),
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE employee(
+    id INTEGER,
+    name TEXT,
+    dept_id INTEGER,
+    CONSTRAINT fk_dept FOREIGN KEY (dept_id) REFERENCES department(id)
+);
+
+CREATE VIEW tweet_dates AS SELECT created_at FROM tweets;
+'''
+
+
+def _catalog():
+    return SchemaCatalog.from_ddl(DDL)
+
+
+def test_catalog_from_ddl():
+    catalog = _catalog()
+    assert set(catalog.tables) == {'users', 'tweets', 'employee'}
+    assert catalog.column_type('tweets', 'created_at') == 'date'
+    assert catalog.column_type('TWEETS', 'State_Name') == 'varchar'
+    assert SchemaCatalog.type_family(catalog.column_type('tweets', 'state_name')) == 'string'
+    assert catalog.is_unique('tweets', ['id'])
+    assert catalog.is_unique('users', ['email'])
+    assert not catalog.is_unique('employee', ['id'])
+    assert catalog.is_unique('unknown', ['id']) is None
+    assert catalog.references('tweets', ['user_id'], 'users', ['id'])
+    assert catalog.references('employee', ['dept_id'], 'department', ['id'])
+
+
+def test_catalog_from_sqlite(tmp_path):
+    path = str(tmp_path / 'app.db')
+    connection = sqlite3.connect(path)
+    connection.executescript(DDL + 'CREATE UNIQUE INDEX employee_name ON employee(name);')
+    connection.close()
+
+    catalog = SchemaCatalog.load(path)
+    assert catalog.column_type('tweets', 'posted_at') == 'timestamp'
+    assert catalog.is_unique('tweets', ['id']) and catalog.is_unique('users', ['email'])
+    assert catalog.is_unique('employee', ['name']) and not catalog.is_unique('employee', ['id'])
+    assert catalog.references('employee', ['dept_id'], 'department', ['id'])
+    # loaded once, then served from memory
+    assert SchemaCatalog.load(path) is catalog
+
+
+def test_catalog_load_cache(tmp_path):
+    path = tmp_path / 'schema.sql'
+    path.write_text(DDL)
+    catalog = SchemaCatalog.load(str(path))
+    assert SchemaCatalog.load(str(path)) is catalog
+
+    # a changed file is reloaded
+    path.write_text(DDL + 'CREATE TABLE department(id INTEGER PRIMARY KEY);\n')
+    reloaded = SchemaCatalog.load(str(path))
+    assert reloaded is not catalog
+    assert reloaded.is_unique('department', ['id'])
+
+
+def test_evaluate_constraints():
+    catalog = _catalog()
+    rule = get_rule('remove_cast_date')
+    assert ConstraintEvaluator.evaluate(rule, {'V001': 't.created_at'}, {'from': {'value': 'tweets', 'name': 't'}}, catalog)
+    assert not ConstraintEvaluator.evaluate(rule, {'V001': 't.posted_at'}, {'from': {'value': 'tweets', 'name': 't'}}, catalog)
+    # an unknown column cannot be proven safe
+    assert not ConstraintEvaluator.evaluate(rule, {'V001': 'missing'}, {'from': 'tweets'}, catalog)
+
+    rule = get_rule('replace_strpos_lower')
+    assert ConstraintEvaluator.evaluate(rule, {'V001': 'text', 'V002': 'iphone'}, {'from': 'tweets'}, catalog)
+
+    rule = get_rule('remove_self_join_advance')
+    memo = {'V001': {'value': 'tweets', 'name': 't1'}, 'V002': {'value': 'tweets', 'name': 't2'}, 'V003': 'id'}
+    assert ConstraintEvaluator.evaluate(rule, memo, {}, catalog)
+    memo['V002'] = {'value': 'users', 'name': 't2'}
+    assert not ConstraintEvaluator.evaluate(rule, memo, {}, catalog)
+
+
+def test_rewrite_with_catalog():
+    catalog = _catalog()
+    rules = [get_rule('remove_cast_date'), get_rule('remove_self_join')]
+
+    query = 'SELECT * FROM tweets WHERE CAST(created_at AS DATE) = CAST(posted_at AS DATE)'
+    rewritten, path = QueryRewriter.rewrite(query, rules, catalog=catalog)
+    assert len(path) == 1
+    assert 'CAST(created_at AS DATE)' not in rewritten and 'CAST(posted_at AS DATE)' in rewritten
+    # without a catalog, constraints are not checked
+    assert len(QueryRewriter.rewrite(query, rules)[1]) == 2
+    # the (shared) rule dicts are left as they are
+    assert rules == [get_rule('remove_cast_date'), get_rule('remove_self_join')]
+
+    query = 'SELECT e1.name FROM employee e1, employee e2 WHERE e1.id = e2.id AND e1.dept_id = 1'
+    assert QueryRewriter.rewrite(query, rules, catalog=catalog)[1] == []
+    query = 'SELECT t1.text FROM tweets t1, tweets t2 WHERE t1.id = t2.id AND t1.user_id = 1'
+    assert len(QueryRewriter.rewrite(query, rules, catalog=catalog)[1]) == 1
+
+
+def test_rewrite_v2_with_catalog():
+    catalog = _catalog()
+    rules = [get_rule_v2('remove_cast_date'), get_rule_v2('remove_self_join')]
+
+    query = 'SELECT * FROM tweets t WHERE CAST(t.created_at AS DATE) = CAST(t.posted_at AS DATE)'
+    assert ConstraintEvaluator.table_aliases(QueryParser().parse(query)) == {'tweets': 'tweets', 't': 'tweets'}
+    _, path = QueryRewriterV2.rewrite(query, rules, catalog=catalog)
+    assert len(path) == 1
+    assert 'CAST(t.posted_at AS DATE)' in path[0][1] and 'CAST(t.created_at AS DATE)' not in path[0][1]
+
+    query = 'SELECT e1.name FROM employee e1, employee e2 WHERE e1.id = e2.id AND e1.dept_id = 1'
+    assert QueryRewriterV2.rewrite(query, rules, catalog=catalog)[1] == []
+    assert len(QueryRewriterV2.rewrite(query, rules)[1]) == 1
+
+
+def test_fetch_catalog(tmp_path, monkeypatch):
+    app = 'Alice-Tableau-Twitter-Pg'
+    assert RuleManager.fetch_catalog(app) is None
+
+    monkeypatch.setattr(rule_manager, 'SCHEMA_DIR', str(tmp_path))
+    (tmp_path / f'{app}.sql').write_text(DDL)
+    catalog = RuleManager.fetch_catalog(app)
+    assert catalog.column_type('tweets', 'created_at') == 'date'
+    assert RuleManager.fetch_catalog(app) is catalog
+    # an application without a catalog, or a guid that is not a file name
+    assert RuleManager.fetch_catalog('Bob-Tableau-Tpch-Pg') is None
+    assert RuleManager.fetch_catalog(f'../{tmp_path.name}/{app}') is None
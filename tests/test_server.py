@@ -0,0 +1,60 @@
+import json
+import pytest
+
+
+ALICE = '102153741508111367852'
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    # the server's managers open their storage on import, on the database of the test
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('QUERYBOOSTER_STORAGE', 'sqlite:///' + str(tmp_path_factory.mktemp('server') / 'querybooster.db'))
+        from server import server
+    for i in range(5):
+        server.qm.log_query('Alice-Tableau-Twitter-Pg', f'server-{i}', f'SELECT {i} FROM t', f'SELECT {i} FROM t', [])
+    return server
+
+
+def test_list_queries_streamed(server):
+    response = server.app.test_client().post('/listQueries', data=json.dumps({'user_id': ALICE}))
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert [query['sql'] for query in json.loads(response.data)] == [f'SELECT {i} FROM t' for i in reversed(range(5))]
+
+
+def test_list_queries_paginated(server):
+    client = server.app.test_client()
+    page = json.loads(client.post('/listQueries', data=json.dumps({'user_id': ALICE, 'limit': 3})).data)
+    assert len(page['queries']) == 3 and page['next_cursor']
+    rest = json.loads(client.post('/listQueries', data=json.dumps({'user_id': ALICE, 'cursor': page['next_cursor']})).data)
+    assert rest['next_cursor'] is None
+    assert [query['sql'] for query in page['queries'] + rest['queries']] == [f'SELECT {i} FROM t' for i in reversed(range(5))]
+    assert client.post('/listQueries', data=json.dumps({'user_id': ALICE, 'cursor': 'not a cursor'})).status_code == 400
+
+
+def test_list_rules_streamed(server):
+    response = server.app.test_client().post('/listRules', data=json.dumps({'user_id': ALICE}))
+    assert response.status_code == 200
+    assert [rule['key'] for rule in json.loads(response.data)] == ['remove_max_distinct']
+
+
+def test_stream_errors(server, monkeypatch):
+    client = server.app.test_client()
+
+    # an error on the first page is still a 400
+    def fail(user_id, **filters):
+        raise RuntimeError('Failed to list the queries')
+        yield
+    monkeypatch.setattr(server.qm, 'iter_queries', fail)
+    assert client.post('/listQueries', data=json.dumps({'user_id': ALICE})).status_code == 400
+
+    # an error mid-stream leaves the array unclosed
+    def fail_later(user_id, **filters):
+        yield {'id': 1}
+        raise RuntimeError('Failed to list the queries')
+    monkeypatch.setattr(server.qm, 'iter_queries', fail_later)
+    response = client.post('/listQueries', data=json.dumps({'user_id': ALICE}))
+    assert response.data == b'[{"id": 1}'
+    with pytest.raises(ValueError):
+        json.loads(response.data)
@@ -0,0 +1,170 @@
+import pytest
+import sqlite3
+import threading
+from management import storage as storage_module
+from management.data_manager import DataManager
+from management.storage import BatchedSQLiteStorage, SQLiteStorage
+
+
+APP = 'Alice-Tableau-Twitter-Pg'
+
+
+def _storage(tmp_path) -> SQLiteStorage:
+    storage = SQLiteStorage(str(tmp_path / 'querybooster.db'))
+    DataManager(storage=storage)
+    return storage
+
+
+def test_allocate_ids_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, 'ID_BLOCK_SIZE', 10)
+    storage = _storage(tmp_path)
+    storage.conn.execute('''INSERT INTO queries (id, guid) VALUES (41, 'existing')''')
+    storage.conn.commit()
+
+    # the first block of a table starts after its largest id
+    assert [storage.allocate_id('queries') for _ in range(12)] == list(range(42, 54))
+    assert storage.conn.execute('''SELECT next_id FROM id_blocks WHERE name = 'queries' ''').fetchone() == (62,)
+
+    # another process (storage) on the same database reserves the next block
+    other = SQLiteStorage(storage.path)
+    assert other.allocate_id('queries') == 62
+
+
+def test_allocate_ids_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, 'ID_BLOCK_SIZE', 7)
+    storage = _storage(tmp_path)
+    other = SQLiteStorage(storage.path)
+    ids = []
+
+    def allocate(storage):
+        allocated = [storage.allocate_id('queries') for _ in range(100)]
+        ids.extend(allocated)
+
+    threads = [threading.Thread(target=allocate, args=[storage if i % 2 else other]) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(ids) == len(set(ids)) == 800
+
+
+def test_log_query_uses_allocated_ids(tmp_path):
+    storage = _storage(tmp_path)
+    dm = DataManager(init=False, storage=storage)
+    query_ids = [dm.log_query(APP, f'ids-{i}', 'SELECT 1', 'SELECT 1', [[0, 'SELECT 1']]) for i in range(3)]
+    assert query_ids == [1, 2, 3]
+    cur = storage.conn.execute('''SELECT queries.id, rewriting_paths.query_id FROM queries JOIN rewriting_paths
+                                      ON queries.id = rewriting_paths.query_id ORDER BY queries.id''')
+    assert cur.fetchall() == [(1, 1), (2, 2), (3, 3)]
+
+
+def _table(path: str) -> None:
+    connection = sqlite3.connect(path)
+    connection.execute('''CREATE TABLE t (id INTEGER PRIMARY KEY, value TEXT)''')
+    connection.close()
+
+
+def _rows(path: str) -> list:
+    connection = sqlite3.connect(path)
+    rows = connection.execute('''SELECT id, value FROM t ORDER BY id''').fetchall()
+    connection.close()
+    return rows
+
+
+def test_sqlite_storage_append(tmp_path):
+    path = str(tmp_path / 'append.db')
+    _table(path)
+    storage = SQLiteStorage(path)
+    storage.append([('''INSERT INTO t (id, value) VALUES (?, ?)''', [[1, 'a'], [2, 'b']])])
+    # written as soon as append() returns
+    assert _rows(path) == [(1, 'a'), (2, 'b')]
+
+    # an append is one unit: nothing of a failed append is written
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.append([('''INSERT INTO t (id, value) VALUES (?, ?)''', [[3, 'c']]),
+                        ('''INSERT INTO t (id, value) VALUES (?, ?)''', [[1, 'duplicate']])])
+    assert _rows(path) == [(1, 'a'), (2, 'b')]
+    storage.close()
+
+
+def test_batched_storage_keeps_append_order(tmp_path):
+    path = str(tmp_path / 'batched.db')
+    _table(path)
+    storage = BatchedSQLiteStorage(path)
+    storage.append([('''INSERT OR REPLACE INTO t (id, value) VALUES (?, ?)''', [[1, 'a']])])
+    storage.append([('''REPLACE INTO t (id, value) VALUES (?, ?)''', [[1, 'b']])])
+    storage.append([('''INSERT OR REPLACE INTO t (id, value) VALUES (?, ?)''', [[1, 'c']])])
+    storage.flush()
+    assert _rows(path) == [(1, 'c')]
+    storage.close()
+
+
+def test_batched_storage_survives_a_bad_append(tmp_path):
+    path = str(tmp_path / 'batched.db')
+    _table(path)
+    storage = BatchedSQLiteStorage(path)
+    insert = '''INSERT INTO t (id, value) VALUES (?, ?)'''
+    dropped = []
+    storage.append([(insert, [[1, 'a']])], dropped=lambda: dropped.append(1))
+    storage.append([(insert, [[2, 'b']]), (insert, [[1, 'duplicate']])], dropped=lambda: dropped.append(2))
+    storage.append([(insert, [[3, 'c']])], dropped=lambda: dropped.append(3))
+    storage.flush()
+    # the bad append is dropped as a whole (and told so), the others are committed
+    assert _rows(path) == [(1, 'a'), (3, 'c')]
+    assert storage.failed == 1 and storage.writer.is_alive()
+    assert dropped == [2]
+
+    # and the writer keeps going
+    storage.append([(insert, [[4, 'd']])])
+    storage.flush()
+    assert _rows(path)[-1] == (4, 'd')
+    storage.close()
+
+
+def test_batched_storage_close_drains_the_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, 'FLUSH_INTERVAL', 10)
+    path = str(tmp_path / 'batched.db')
+    _table(path)
+    storage = BatchedSQLiteStorage(path)
+    for i in range(50):
+        storage.append([('''INSERT INTO t (id, value) VALUES (?, ?)''', [[i, str(i)]])])
+    storage.close()
+    assert len(_rows(path)) == 50
+    assert not storage.writer.is_alive()
+    with pytest.raises(sqlite3.ProgrammingError):
+        storage.append([('''INSERT INTO t (id, value) VALUES (?, ?)''', [[50, '50']])])
+
+
+def test_batched_storage_retries_a_locked_database(tmp_path, monkeypatch):
+    path = str(tmp_path / 'batched.db')
+    _table(path)
+    storage = BatchedSQLiteStorage(path)
+    commit_batch, attempts = BatchedSQLiteStorage.commit_batch, []
+
+    def locked_twice(conn, batch):
+        attempts.append(len(batch))
+        if len(attempts) <= 2:
+            return sqlite3.OperationalError('database is locked')
+        return commit_batch(conn, batch)
+    monkeypatch.setattr(BatchedSQLiteStorage, 'commit_batch', staticmethod(locked_twice))
+    for i in range(3):
+        storage.append([('''INSERT INTO t (id, value) VALUES (?, ?)''', [[i, str(i)]])])
+    storage.flush()
+    # nothing is dropped while the database is locked
+    assert _rows(path) == [(0, '0'), (1, '1'), (2, '2')]
+    assert storage.failed == 0 and len(attempts) >= 3
+    storage.close()
+
+
+def test_batched_storage_bounds_its_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, 'MAX_PENDING_ROWS', 3)
+    monkeypatch.setattr(storage_module, 'FLUSH_INTERVAL', 0.01)
+    path = str(tmp_path / 'batched.db')
+    _table(path)
+    storage = BatchedSQLiteStorage(path)
+    for i in range(20):
+        storage.append([('''INSERT INTO t (id, value) VALUES (?, ?)''', [[i, str(i)]])])
+        # an append waits for the writer rather than growing the queue
+        assert storage.pending_rows <= 3
+    storage.close()
+    assert len(_rows(path)) == 20